@@ -16,6 +16,8 @@ from tools import (
     handle_scheme_query,
 )
 from utils import setup_logger
+from utils.metrics import after_model_metrics, before_model_metrics, model_error_metrics
+from utils.stage_trace import strip_debug_payload
 from utils.secrets import get_secret
 logger = setup_logger(__name__)
 
@@ -52,6 +54,11 @@ root_agent = Agent(
         search_farmer_schemes,
         get_scheme_details,
     ],
+    before_model_callback=before_model_metrics,
+    after_model_callback=after_model_metrics,
+    on_model_error_callback=model_error_metrics,
+    # Search stage timings are persisted with the turn, never shown to the model
+    after_tool_callback=strip_debug_payload,
 )
 
 
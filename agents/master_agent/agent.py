@@ -16,6 +16,7 @@ from tools.routing import (
 )
 
 from utils import setup_logger
+from utils.metrics import after_model_metrics, before_model_metrics, model_error_metrics
 from utils.secrets import get_secret
 logger = setup_logger(__name__)
 
@@ -74,6 +75,9 @@ root_agent = Agent(
         farmer_agent,
         msme_agent,
     ],
+    before_model_callback=before_model_metrics,
+    after_model_callback=after_model_metrics,
+    on_model_error_callback=model_error_metrics,
 )
 
 if __name__ == "__main__":
@@ -17,6 +17,8 @@ from tools import (
 )
 # from tools.parallel_search import search_msme_schemes
 from utils import setup_logger
+from utils.metrics import after_model_metrics, before_model_metrics, model_error_metrics
+from utils.stage_trace import strip_debug_payload
 from utils.secrets import get_secret
 
 logger = setup_logger(__name__)
@@ -59,6 +61,11 @@ root_agent = Agent(
         handle_more_request,
         handle_scheme_query,
     ],
+    before_model_callback=before_model_metrics,
+    after_model_callback=after_model_metrics,
+    on_model_error_callback=model_error_metrics,
+    # Search stage timings are persisted with the turn, never shown to the model
+    after_tool_callback=strip_debug_payload,
 )
 
 
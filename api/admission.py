@@ -0,0 +1,305 @@
+"""
+Per-partner admission control for agent endpoints.
+
+Each partner (X-Partner-Code) gets a per-minute and a per-hour token bucket
+and a cap on concurrent agent runs; a global cap bounds total concurrent
+runs. Requests over a limit are rejected immediately with 429 and a
+Retry-After header rather than queued, so one partner's bulk traffic cannot
+push everyone else into timeouts.
+
+Partner state is bounded: at most settings.admission_max_partners codes get
+their own buckets, further codes share one 'other' bucket, and partners idle
+for an hour (when both buckets have refilled) are dropped to make room.
+
+Batch work (`try_acquire_batch`) never touches a partner's buckets or its
+interactive in-flight cap: it only counts toward the global in-flight total
+under a lower cap and toward a per-partner batch cap, so a large batch
+cannot exhaust the partner's interactive quota.
+"""
+
+import json
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional, Tuple
+
+from config.settings import settings
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+OVERFLOW_PARTNER = "other"
+
+# Idle time after which a partner's buckets are full again and its state can go
+_IDLE_EVICT_SECONDS = 3600.0
+
+
+@dataclass
+class TokenBucket:
+    """Classic token bucket; `rate` tokens per second up to `capacity`."""
+    capacity: float
+    rate: float
+    tokens: float = field(default=-1.0)
+    updated: float = field(default_factory=time.monotonic)
+
+    def __post_init__(self):
+        if self.tokens < 0:
+            self.tokens = self.capacity
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until one token is available (0 if available now)."""
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+@dataclass
+class _PartnerState:
+    minute: TokenBucket
+    hour: TokenBucket
+    in_flight: int = 0
+    last_seen: float = field(default_factory=time.monotonic)
+
+
+class AdmissionController:
+    """
+    Token buckets and in-flight counters per partner.
+
+    Args:
+        per_minute: Requests per minute per partner (also the burst size)
+        per_hour: Requests per hour per partner
+        max_in_flight_per_partner: Concurrent agent runs per partner
+        max_in_flight_global: Concurrent agent runs across all partners
+        max_partners: Partners tracked individually; others share OVERFLOW_PARTNER
+        max_batch_in_flight_per_partner: Concurrent batch runs per partner
+    """
+
+    def __init__(
+        self,
+        per_minute: int,
+        per_hour: int,
+        max_in_flight_per_partner: int,
+        max_in_flight_global: int,
+        max_partners: int = 100,
+        max_batch_in_flight_per_partner: int = 8
+    ):
+        self.per_minute = per_minute
+        self.per_hour = per_hour
+        self.max_in_flight_per_partner = max_in_flight_per_partner
+        self.max_in_flight_global = max_in_flight_global
+        self.max_partners = max_partners
+        self.max_batch_in_flight_per_partner = max_batch_in_flight_per_partner
+        # Least recently seen first, for idle eviction
+        self._partners: "OrderedDict[str, _PartnerState]" = OrderedDict()
+        self._overflow = self._new_state()
+        # Codes with runs admitted on the overflow bucket, so release matches
+        self._overflow_in_flight: Dict[str, int] = {}
+        # Batch runs per partner; entries go when they reach zero
+        self._batch_in_flight: Dict[str, int] = {}
+        self.in_flight = 0
+        self.rejected: Dict[str, int] = {}
+
+    def _new_state(self) -> _PartnerState:
+        return _PartnerState(
+            minute=TokenBucket(self.per_minute, self.per_minute / 60.0),
+            hour=TokenBucket(self.per_hour, self.per_hour / 3600.0),
+        )
+
+    def _evict_idle(self, now: float) -> None:
+        for code in list(self._partners):
+            state = self._partners[code]
+            if now - state.last_seen < _IDLE_EVICT_SECONDS:
+                break
+            if state.in_flight == 0:
+                del self._partners[code]
+                self.rejected.pop(code, None)
+
+    def _state(self, partner_code: str, now: float) -> Tuple[str, _PartnerState]:
+        """Bucket key and state for a partner, creating state if there is room."""
+        if partner_code in self._overflow_in_flight:
+            return OVERFLOW_PARTNER, self._overflow
+        state = self._partners.get(partner_code)
+        if state is None:
+            if len(self._partners) >= self.max_partners:
+                self._evict_idle(now)
+            if len(self._partners) >= self.max_partners:
+                return OVERFLOW_PARTNER, self._overflow
+            state = self._new_state()
+            self._partners[partner_code] = state
+        else:
+            self._partners.move_to_end(partner_code)
+        state.last_seen = now
+        return partner_code, state
+
+    def try_acquire(self, partner_code: str) -> Tuple[bool, float, str]:
+        """
+        Admit one agent run for a partner, or say why not.
+
+        Args:
+            partner_code: Partner identifier
+
+        Returns:
+            Tuple of (admitted, retry_after_seconds, reason)
+        """
+        now = time.monotonic()
+        key, state = self._state(partner_code, now)
+
+        if self.in_flight >= self.max_in_flight_global:
+            return self._reject(key, 1.0, "server busy")
+        if state.in_flight >= self.max_in_flight_per_partner:
+            return self._reject(key, 1.0, "too many concurrent requests for partner")
+
+        state.minute.refill(now)
+        state.hour.refill(now)
+        wait = max(state.minute.wait_time(), state.hour.wait_time())
+        if wait > 0:
+            return self._reject(key, wait, "rate limit exceeded")
+
+        state.minute.tokens -= 1
+        state.hour.tokens -= 1
+        state.in_flight += 1
+        self.in_flight += 1
+        if key == OVERFLOW_PARTNER:
+            self._overflow_in_flight[partner_code] = self._overflow_in_flight.get(partner_code, 0) + 1
+        return True, 0.0, ""
+
+    def release(self, partner_code: str) -> None:
+        """Mark one admitted run for the partner as finished."""
+        overflow_runs = self._overflow_in_flight.get(partner_code)
+        if overflow_runs is not None:
+            state = self._overflow
+            if overflow_runs > 1:
+                self._overflow_in_flight[partner_code] = overflow_runs - 1
+            else:
+                del self._overflow_in_flight[partner_code]
+        else:
+            state = self._partners.get(partner_code)
+        if state is not None and state.in_flight > 0:
+            state.in_flight -= 1
+        if self.in_flight > 0:
+            self.in_flight -= 1
+
+    def try_acquire_batch(self, partner_code: str, max_in_flight_global: int) -> bool:
+        """
+        Admit one batch run if there is spare capacity.
+
+        Only in-flight caps apply: the global total (under the lower batch
+        cap) and the partner's batch cap. Rate-limit buckets are left to
+        interactive traffic.
+
+        Args:
+            partner_code: Partner identifier
+            max_in_flight_global: Global in-flight cap for batch runs
+
+        Returns:
+            True if admitted; release with `release_batch`
+        """
+        if self.in_flight >= min(self.max_in_flight_global, max_in_flight_global):
+            return False
+        running = self._batch_in_flight.get(partner_code, 0)
+        if running >= self.max_batch_in_flight_per_partner:
+            return False
+        self._batch_in_flight[partner_code] = running + 1
+        self.in_flight += 1
+        return True
+
+    def release_batch(self, partner_code: str) -> None:
+        """Mark one batch run for the partner as finished."""
+        running = self._batch_in_flight.pop(partner_code, 0)
+        if running > 1:
+            self._batch_in_flight[partner_code] = running - 1
+        if self.in_flight > 0:
+            self.in_flight -= 1
+
+    def _reject(self, key: str, retry_after: float, reason: str) -> Tuple[bool, float, str]:
+        self.rejected[key] = self.rejected.get(key, 0) + 1
+        return False, retry_after, reason
+
+    def stats(self) -> Dict[str, object]:
+        """Gauges for admission control."""
+        in_flight_by_partner = {p: s.in_flight for p, s in self._partners.items() if s.in_flight}
+        if self._overflow.in_flight:
+            in_flight_by_partner[OVERFLOW_PARTNER] = self._overflow.in_flight
+        return {
+            'in_flight': self.in_flight,
+            'tracked_partners': len(self._partners),
+            'in_flight_by_partner': in_flight_by_partner,
+            'batch_in_flight_by_partner': dict(self._batch_in_flight),
+            'rejected': dict(self.rejected),
+        }
+
+
+def normalize_partner_code(header_value: Optional[str]) -> str:
+    """Same normalization as api.main.get_partner_code."""
+    return header_value.strip().lower() if header_value and header_value.strip() else "unknown"
+
+
+class AdmissionMiddleware:
+    """
+    Pure ASGI middleware applying an AdmissionController to agent paths.
+
+    The in-flight slot is held until the response body has been fully sent,
+    so streaming responses count for their whole duration.
+
+    Args:
+        app: ASGI application
+        controller: Shared AdmissionController
+        path_prefixes: Request paths that count as agent runs
+    """
+
+    def __init__(self, app, controller: AdmissionController, path_prefixes: Iterable[str] = ("/agent/search",)):
+        self.app = app
+        self.controller = controller
+        self.path_prefixes = tuple(path_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        header = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-partner-code":
+                header = value.decode("latin-1")
+                break
+        partner_code = normalize_partner_code(header)
+
+        admitted, retry_after, reason = self.controller.try_acquire(partner_code)
+        if not admitted:
+            logger.warning(f"Rejected request from partner {partner_code}: {reason}")
+            await _send_429(send, reason, retry_after)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(partner_code)
+
+
+async def _send_429(send, detail: str, retry_after: float) -> None:
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("ascii")),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode("ascii")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def create_admission_controller() -> AdmissionController:
+    """Controller configured from settings."""
+    return AdmissionController(
+        per_minute=settings.rate_limit_per_minute,
+        per_hour=settings.rate_limit_per_hour,
+        max_in_flight_per_partner=settings.max_in_flight_per_partner,
+        max_in_flight_global=settings.max_in_flight_global,
+        max_partners=settings.admission_max_partners,
+        max_batch_in_flight_per_partner=settings.batch_max_in_flight_per_partner,
+    )
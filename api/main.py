@@ -1,24 +1,24 @@
 import os
+import time
 import uuid
+import asyncio
+import hmac
 import json
 import logging
+from contextlib import asynccontextmanager
 from typing import Optional, AsyncGenerator, List, Dict, Any, Set
 from datetime import datetime
 
-from fastapi import FastAPI, HTTPException, Body, Header
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, HTTPException, Body, Header, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from fastapi import BackgroundTasks
 
 # Firestore imports
 from google.cloud import firestore
 from google.cloud.firestore import AsyncClient
 
-try:
-    from google.adk.runners import InMemoryRunner
-except ImportError:
-    from google.adk.runners.in_memory_runner import InMemoryRunner
+from google.adk.runners import Runner
 
 try:
     from google.genai import types
@@ -28,22 +28,71 @@ except ImportError:
     except ImportError:
         from types import SimpleNamespace as types
 
-try:
-    from google.adk.sessions import InMemorySessionService
-except ImportError:
-    from google.adk.sessions.in_memory_session_service import InMemorySessionService
-
 # Import Agent
 from agents.master_agent.agent import root_agent
 from google.adk.agents.run_config import RunConfig, StreamingMode
 
+from api.persistence import (
+    FirestoreWriteBehindQueue,
+    HistoryWatermarks,
+    TurnRecord,
+    stream_session_history,
+)
+from config.settings import settings
+from api.admission import AdmissionMiddleware, create_admission_controller
+from api.session_store import create_session_service
+from tools.datastore_tools import use_retrieval_cache
+from api.streaming import StreamDeltaTracker
+from utils.query_capture import finish_turn_capture, start_turn_capture
+from utils.stage_trace import start_turn_traces
+from api.profiling import list_profiles, profile_path, profile_turn, should_profile
+from utils.logger import configure_root_logging, get_sampled_logger, setup_logger
+from utils.loop_monitor import create_loop_monitor
+from utils.metrics import (
+    FIRESTORE_WRITE_LATENCY,
+    IN_FLIGHT_RUNS,
+    PERSISTENCE_QUEUE_DEPTH,
+    RESIDENT_SESSION_BYTES,
+    RESIDENT_SESSIONS,
+    TIME_TO_FIRST_TOKEN,
+    MetricsMiddleware,
+    metrics_payload,
+    partner_label,
+)
+from utils.tracing import TracingMiddleware, setup_tracing, span
+from api.rollups import build_rollup_writes, get_all_partner_rollups, get_partner_rollup
+from api.pagination import InvalidPageRequest, decode_page_token, fetch_page, iter_pages, parse_fields, parse_time
+
 
 # --- CONFIG ---
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+configure_root_logging(logging.INFO)
+logger = setup_logger(__name__)
+# Global tracer provider (also picks up ADK's agent/LLM/tool spans)
+setup_tracing()
+# Per-chunk stream logging is sampled
+stream_logger = get_sampled_logger(__name__)
 APP_NAME = "scheme_advisor"
 
-app = FastAPI(title="Scheme Advisor Agent API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background workers on startup and flush them on shutdown."""
+    await persistence.start()
+    if loop_monitor is not None:
+        loop_monitor.start()
+    yield
+    if loop_monitor is not None:
+        await loop_monitor.stop()
+    await persistence.stop()
+
+
+app = FastAPI(title="Scheme Advisor Agent API", lifespan=lifespan)
+
+# Per-partner rate limits and in-flight caps on agent runs (fast 429s).
+# Added before CORS so rejections still carry CORS headers.
+admission = create_admission_controller()
+if settings.enable_rate_limiting:
+    app.add_middleware(AdmissionMiddleware, controller=admission)
 
 # CORS middleware
 app.add_middleware(
@@ -55,15 +104,36 @@ app.add_middleware(
     expose_headers=["*"]  # Expose headers in response
 )
 
+# Request latency per route and partner (outermost, so 429s are measured too)
+app.add_middleware(MetricsMiddleware)
+
+# Root span per request; outermost so the whole request is inside it
+app.add_middleware(TracingMiddleware)
+
 # Initialize Firestore
 db = AsyncClient()
 
-# Initialize Runner
-runner = InMemoryRunner(
+# Turn records are persisted write-behind so users never wait on analytics writes
+persistence = FirestoreWriteBehindQueue(db)
+history_watermarks = HistoryWatermarks()
+
+# Event-loop lag metric and stall stack capture
+loop_monitor = create_loop_monitor()
+
+# Initialize Runner; the session service is shared across workers unless
+# settings.session_service is "inmemory"
+session_service = create_session_service(db)
+runner = Runner(
     agent=root_agent,
     app_name=APP_NAME,
+    session_service=session_service,
 )
-session_service = runner.session_service
+
+# Gauges sampled at scrape time
+PERSISTENCE_QUEUE_DEPTH.set_function(lambda: persistence.depth)
+RESIDENT_SESSIONS.set_function(lambda: session_service.stats().get('resident_sessions', 0))
+RESIDENT_SESSION_BYTES.set_function(lambda: session_service.stats().get('resident_bytes', 0))
+IN_FLIGHT_RUNS.set_function(lambda: admission.in_flight)
 
 # --- MODELS ---
 class CreateSessionRequest(BaseModel):
@@ -74,6 +144,15 @@ class CreateSessionRequest(BaseModel):
 class AgentQueryRequest(BaseModel):
     query: str
 
+class BatchQueryItem(BaseModel):
+    user_id: str
+    session_id: Optional[str] = None
+    query: str
+
+class BatchQueryRequest(BaseModel):
+    items: List[BatchQueryItem]
+    max_concurrency: Optional[int] = None
+
 
 # --- HELPER FUNCTIONS ---
 def get_partner_code(header_value: Optional[str] = None) -> str:
@@ -103,17 +182,21 @@ def get_partner_code(header_value: Optional[str] = None) -> str:
 
 
 # --- FIRESTORE HELPERS ---
-async def save_session_to_firestore(
+def save_session_to_firestore(
     session_id: str,
     user_id: str,
     query: str,
     response: str,
     state: str,
     partner_code: Optional[str] = None,  # NEW: Partner code parameter
-    session_history: list = None
-):
+    session_history: list = None,
+    search_traces: Optional[List[Dict[str, Any]]] = None
+) -> bool:
     """
-    Save session data to Firestore after completion with partner tracking.
+    Queue session data for write-behind persistence to Firestore.
+    
+    Returns immediately; the persistence worker coalesces turns per session
+    and commits them with batched, merged writes.
     
     Args:
         session_id: Unique session identifier
@@ -122,147 +205,337 @@ async def save_session_to_firestore(
         response: Agent response text
         state: Session state (COMPLETED, FAILED, etc.)
         partner_code: Partner identifier (e.g., 'flipkart_001')
-        session_history: Full conversation history
-    """
-    try:
-        # Reference to the session document
-        session_ref = db.collection('sessions').document(session_id)
+        session_history: Messages added since the previous turn (each with 'index')
+        search_traces: Stage timings of the searches run during the turn
         
-        # Get existing session data or create new
-        session_doc = await session_ref.get()
-        
-        if session_doc.exists:
-            # Update existing session
-            update_data = {
-                'updated_at': firestore.SERVER_TIMESTAMP,
-                'last_state': state,
-                'query_count': firestore.Increment(1)
-            }
-            
-            # Add partner_code only if not already set (preserve original partner)
-            existing_data = session_doc.to_dict()
-            if partner_code and not existing_data.get('partner_code'):
-                update_data['partner_code'] = partner_code
-            
-            await session_ref.update(update_data)
-        else:
-            # Create new session document
-            session_data = {
-                'user_id': user_id,
-                'session_id': session_id,
-                'created_at': firestore.SERVER_TIMESTAMP,
-                'updated_at': firestore.SERVER_TIMESTAMP,
-                'last_state': state,
-                'query_count': 1
-            }
-            
-            # NEW: Add partner code to session
-            if partner_code:
-                session_data['partner_code'] = partner_code
-            
-            await session_ref.set(session_data)
-        
-        # Save the query and response to queries subcollection
-        query_ref = session_ref.collection('queries').document()
-        query_data = {
-            'query': query,
-            'response': response,
-            'state': state,
-            'timestamp': firestore.SERVER_TIMESTAMP,
-            'created_at': datetime.utcnow().isoformat()
+    Returns:
+        False if the persistence queue was full and the turn was dropped
+    """
+    queued = persistence.enqueue(TurnRecord(
+        session_id=session_id,
+        user_id=user_id,
+        query=query,
+        response=response,
+        state=state,
+        partner_code=partner_code,
+        session_history=session_history,
+        history_start=session_history[0]['index'] if session_history else 0,
+        search_traces=search_traces or None,
+    ))
+    
+    # Only move the high-water mark once the new messages are actually queued
+    if queued and session_history:
+        history_watermarks.advance(session_id, session_history[-1]['index'] + 1)
+    return queued
+
+
+def _session_events(session) -> list:
+    """Events of a session; ADK sessions expose 'events', older objects used 'history'."""
+    messages = getattr(session, 'events', None)
+    if messages is None:
+        messages = getattr(session, 'history', None) or []
+    return messages
+
+
+def _has_unqueued_turns(messages: list, start_index: int) -> bool:
+    """
+    True if events from start_index on belong to more than the latest
+    invocation, i.e. to turns this worker did not queue (another worker
+    sharing the session ran them).
+    """
+    latest = getattr(messages[-1], 'invocation_id', None) if messages else None
+    return any(getattr(msg, 'invocation_id', None) != latest for msg in messages[start_index:])
+
+
+def _events_to_history(messages: list, start_index: int) -> List[Dict[str, Any]]:
+    """Convert text events from start_index on into serializable messages."""
+    # A session rebuilt with fewer events than the persisted watermark
+    # (e.g. in-memory sessions after a restart) is re-sent from the start
+    if start_index > len(messages):
+        start_index = 0
+    
+    # Convert new messages to serializable format
+    history = []
+    for index in range(start_index, len(messages)):
+        msg = messages[index]
+        timestamp = getattr(msg, 'timestamp', None)
+        msg_dict = {
+            'index': index,
+            'role': getattr(msg, 'author', None) or getattr(msg, 'role', 'unknown'),
+            'timestamp': (
+                datetime.utcfromtimestamp(timestamp).isoformat()
+                if isinstance(timestamp, (int, float)) else datetime.utcnow().isoformat()
+            )
         }
         
-        # NEW: Add partner code to each query for granular tracking
-        if partner_code:
-            query_data['partner_code'] = partner_code
+        # Extract text content
+        texts = []
+        if getattr(msg, 'text', None):
+            texts.append(msg.text)
+        elif getattr(msg, 'content', None) is not None and getattr(msg.content, 'parts', None):
+            texts = [part.text for part in msg.content.parts if getattr(part, 'text', None)]
+        elif getattr(msg, 'parts', None):
+            texts = [part.text for part in msg.parts if getattr(part, 'text', None)]
         
-        await query_ref.set(query_data)
+        # Tool-call and other non-text events are not part of the transcript
+        if not texts:
+            continue
+        msg_dict['text'] = ' '.join(texts)
+        history.append(msg_dict)
+
+    return history
+
+
+async def get_session_history_from_memory(session_id: str, user_id: str, start_index: int = 0):
+    """
+    Retrieve session messages from the session service, starting at start_index.
+    
+    Only events from start_index onward are converted, so each turn costs
+    O(new messages) instead of re-serializing the whole conversation.
+    Every message carries its session-wide 'index'.
+    """
+    try:
+        # Get the session from memory
+        session = await session_service.get_session(
+            app_name=APP_NAME,
+            user_id=user_id,
+            session_id=session_id
+        )
         
-        # Optionally save the full session history if provided
-        if session_history:
-            history_ref = session_ref.collection('history').document('full_history')
-            await history_ref.set({
-                'messages': session_history,
-                'updated_at': firestore.SERVER_TIMESTAMP
-            })
+        if not session:
+            return []
         
-        logger.info(f"Session {session_id} saved to Firestore for partner {partner_code}")
+        return _events_to_history(_session_events(session), start_index)
         
     except Exception as e:
-        logger.error(f"Error saving to Firestore: {str(e)}")
+        logger.error(f"Error retrieving session history: {str(e)}")
+        return []
 
 
-async def get_session_history_from_memory(session_id: str, user_id: str):
+async def get_new_session_history(session_id: str, user_id: str):
     """
-    Retrieve session history from InMemorySessionService.
+    Messages added since the session's history watermark.
+    
+    A cached watermark is refreshed from Firestore when the session holds
+    turns this worker did not queue, so history persisted by another
+    worker is not re-sent.
     """
     try:
-        # Get the session from memory
         session = await session_service.get_session(
             app_name=APP_NAME,
             user_id=user_id,
             session_id=session_id
         )
         
-        if session and hasattr(session, 'history'):
-            # Convert history to serializable format
-            history = []
-            for msg in session.history:
-                msg_dict = {
-                    'role': getattr(msg, 'role', 'unknown'),
-                    'timestamp': datetime.utcnow().isoformat()
-                }
-                
-                # Extract text content
-                if hasattr(msg, 'text'):
-                    msg_dict['text'] = msg.text
-                elif hasattr(msg, 'content'):
-                    if hasattr(msg.content, 'parts'):
-                        texts = []
-                        for part in msg.content.parts:
-                            if hasattr(part, 'text') and part.text:
-                                texts.append(part.text)
-                        msg_dict['text'] = ' '.join(texts)
-                elif hasattr(msg, 'parts'):
-                    texts = []
-                    for part in msg.parts:
-                        if hasattr(part, 'text') and part.text:
-                            texts.append(part.text)
-                    msg_dict['text'] = ' '.join(texts)
-                
-                history.append(msg_dict)
-            
-            return history
+        if not session:
+            return []
         
-        return []
+        messages = _session_events(session)
+        cached = session_id in history_watermarks
+        start_index = await history_watermarks.load(db, session_id)
+        if cached and _has_unqueued_turns(messages, start_index):
+            start_index = await history_watermarks.load(db, session_id, refresh=True)
+        return _events_to_history(messages, start_index)
         
     except Exception as e:
         logger.error(f"Error retrieving session history: {str(e)}")
         return []
 
 
-async def get_user_sessions(user_id: str, limit: int = 50):
+async def get_user_sessions(
+    user_id: str,
+    limit: int = 50,
+    page_token: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None
+):
     """
-    Retrieve all sessions for a specific user from Firestore.
+    Retrieve one page of a user's sessions from Firestore, newest first.
+    
+    Returns:
+        Tuple of (sessions, next_page_token)
     """
     try:
         sessions_ref = db.collection('sessions')
         
-        query = sessions_ref.where('user_id', '==', user_id).order_by(
-            'updated_at', direction=firestore.Query.DESCENDING
-        ).limit(limit)
+        query = sessions_ref.where('user_id', '==', user_id)
         
-        sessions = []
-        async for doc in query.stream():
-            session_data = doc.to_dict()
-            session_data['session_id'] = doc.id
-            sessions.append(session_data)
-        
-        return sessions
+        return await fetch_page(
+            query,
+            time_field='updated_at',
+            page_size=limit,
+            page_token=page_token,
+            fields=fields,
+            start_time=start_time,
+            end_time=end_time,
+            id_field='session_id'
+        )
         
+    except InvalidPageRequest:
+        raise
     except Exception as e:
         logger.error(f"Error retrieving user sessions: {str(e)}")
-        return []
+        return [], None
+
+
+def build_user_message(query: str):
+    """Wrap a query in whichever message type the installed ADK/genai exposes."""
+    if hasattr(types, "Content") and hasattr(types, "Part"):
+        return types.Content(role="user", parts=[types.Part(text=query)])
+    elif hasattr(types, "Message"):
+        return types.Message(role="user", text=query)
+    else:
+        from types import SimpleNamespace
+        part = SimpleNamespace(text=query)
+        return SimpleNamespace(role="user", parts=[part])
+
+
+def extract_event_text(event) -> str:
+    """Concatenate the text carried by an agent event."""
+    if hasattr(event, "text") and event.text:
+        return event.text
+    chunk_text = ""
+    if hasattr(event, "content") and event.content:
+        if hasattr(event.content, "parts") and event.content.parts:
+            for part in event.content.parts:
+                if hasattr(part, "text") and part.text:
+                    chunk_text += part.text
+    elif hasattr(event, "parts") and event.parts:
+        for part in event.parts:
+            if hasattr(part, "text") and part.text:
+                chunk_text += part.text
+    return chunk_text
+
+
+async def _run_agent_turn(user_id: str, session_id: str, query: str, partner_code: str) -> str:
+    """
+    Run one non-streaming agent turn and queue it for persistence.
+    
+    Failed turns are recorded as FAILED and the error is re-raised.
+    
+    Returns:
+        The agent's response text
+    """
+    search_traces = start_turn_traces()
+    capture = start_turn_capture(session_id, query)
+    try:
+        full_text = []
+        async for event in runner.run_async(
+            user_id=user_id,
+            session_id=session_id,
+            new_message=build_user_message(query)
+        ):
+            text = extract_event_text(event)
+            if text:
+                full_text.append(text)
+
+        response_text = "".join(full_text)
+        
+        if not response_text:
+            response_text = "Task completed (No text response generated)."
+        
+        # Save to Firestore with partner code
+        session_history = await get_new_session_history(session_id=session_id, user_id=user_id)
+        
+        save_session_to_firestore(
+            session_id=session_id,
+            user_id=user_id,
+            query=query,
+            response=response_text,
+            state="COMPLETED",
+            partner_code=partner_code,
+            session_history=session_history,
+            search_traces=search_traces
+        )
+        finish_turn_capture(capture, "COMPLETED")
+        
+        return response_text
+    
+    except Exception as e:
+        save_session_to_firestore(
+            session_id=session_id,
+            user_id=user_id,
+            query=query,
+            response=f"Error: {str(e)}",
+            state="FAILED",
+            partner_code=partner_code,  # Track failures by partner
+            session_history=[],
+            search_traces=search_traces
+        )
+        finish_turn_capture(capture, "FAILED")
+        raise
+
+
+async def _stream_agent_turn(
+    user_id: str,
+    session_id: str,
+    query: str,
+    partner_code: str
+) -> AsyncGenerator[str, None]:
+    """
+    Run one agent turn in SSE streaming mode, yielding only new text.
+    
+    The turn is queued for persistence when it finishes. A turn cancelled
+    mid-stream (client went away, or a newer message superseded it) is saved
+    as CANCELLED with the text produced so far.
+    """
+    tracker = StreamDeltaTracker()  # Tracks the text sent so far
+    search_traces = start_turn_traces()
+    capture = start_turn_capture(session_id, query)
+    state = "CANCELLED"
+    try:
+        # Create RunConfig with SSE streaming
+        run_config = RunConfig(
+            streaming_mode=StreamingMode.SSE,
+            max_llm_calls=50
+        )
+
+        async for event in runner.run_async(
+            user_id=user_id,
+            session_id=session_id,
+            new_message=build_user_message(query),
+            run_config=run_config
+        ):
+            chunk_text = extract_event_text(event)
+            
+            stream_logger.info("Streaming data*******: %s", chunk_text)
+            new_content = tracker.feed(chunk_text, getattr(event, "partial", None))
+            if new_content:
+                yield new_content
+        
+        state = "COMPLETED"
+    except Exception:
+        state = "FAILED"
+        raise
+    finally:
+        # Save to Firestore with partner code
+        session_history = []
+        if state == "COMPLETED":
+            session_history = await get_new_session_history(session_id=session_id, user_id=user_id)
+
+        save_session_to_firestore(
+            session_id,
+            user_id,
+            query,
+            tracker.text,
+            state,
+            partner_code,
+            session_history,
+            search_traces
+        )
+        finish_turn_capture(capture, state)
+
+
+async def _ensure_adk_session(user_id: str, session_id: str) -> None:
+    """Create the ADK session if this worker's session service does not have it."""
+    existing = await session_service.get_session(
+        app_name=APP_NAME, user_id=user_id, session_id=session_id
+    )
+    if existing is None:
+        await session_service.create_session(
+            app_name=APP_NAME, user_id=user_id, session_id=session_id
+        )
 
 
 # --- ENDPOINTS ---
@@ -316,7 +589,16 @@ async def create_session(
         if partner_code:
             session_data['partner_code'] = partner_code
         
-        await session_ref.set(session_data)
+        # Session record and the partner's session counter commit together
+        batch = db.batch()
+        batch.set(session_ref, session_data)
+        for ref, data, merge in build_rollup_writes(db, partner_code, sessions=1):
+            batch.set(ref, data, merge=merge)
+        commit_started = time.perf_counter()
+        with span("firestore.create_session"):
+            await batch.commit()
+        FIRESTORE_WRITE_LATENCY.labels("create_session", "ok").observe(time.perf_counter() - commit_started)
+        persistence.mark_session_known(session_id)
         
         # Log partner activity
         logger.info(f"Session {session_id} created for partner: {partner_code}")
@@ -340,7 +622,9 @@ async def agent_search_answer(
     user_id: str,
     session_id: str,
     request: AgentQueryRequest,
-    x_partner_code: Optional[str] = Header(None, alias="X-Partner-Code")  # NEW
+    response: Response,
+    x_partner_code: Optional[str] = Header(None, alias="X-Partner-Code"),  # NEW
+    x_profile_token: Optional[str] = Header(None, alias="X-Profile-Token")
 ):
     """
     Standard (Non-Streaming) Agent Answer Endpoint with partner tracking.
@@ -348,83 +632,25 @@ async def agent_search_answer(
     Headers:
         X-Partner-Code: Partner identifier (optional)
         Example: X-Partner-Code: flipkart_001
+        X-Profile-Token: Admin token to profile this request (optional);
+            the profile id comes back in X-Profile-Id
     """
+    # Extract partner code from header
+    partner_code = get_partner_code(x_partner_code)
+    profiling = should_profile(x_profile_token)
+    profile = profile_turn(session_id, "answer", profiling)
+    if profiling:
+        response.headers["X-Profile-Id"] = profile.profile_id
+    
     try:
-        # Extract partner code from header
-        partner_code = get_partner_code(x_partner_code)
-
-        # Message Creation
-        if hasattr(types, "Content") and hasattr(types, "Part"):
-             user_msg = types.Content(role="user", parts=[types.Part(text=request.query)])
-        elif hasattr(types, "Message"):
-             user_msg = types.Message(role="user", text=request.query)
-        else:
-            from types import SimpleNamespace
-            part = SimpleNamespace(text=request.query)
-            user_msg = SimpleNamespace(role="user", parts=[part])
-
-        # Execution
-        full_text = []
-        async for event in runner.run_async(
-            user_id=user_id,
-            session_id=session_id,
-            new_message=user_msg 
-        ):
-            if hasattr(event, "text") and event.text:
-                full_text.append(event.text)
-            elif hasattr(event, "content") and event.content:
-                 if hasattr(event.content, "parts") and event.content.parts:
-                      for part in event.content.parts:
-                           if hasattr(part, "text") and part.text:
-                                full_text.append(part.text)
-            elif hasattr(event, "parts") and event.parts:
-                for part in event.parts:
-                     if hasattr(part, "text") and part.text:
-                          full_text.append(part.text)
-
-        response_text = "".join(full_text)
-        
-        if not response_text:
-            response_text = "Task completed (No text response generated)."
-
-        state = "COMPLETED"
-        
-        # Save to Firestore with partner code
-        session_history = await get_session_history_from_memory(
-            session_id=session_id,
-            user_id=user_id
-        )
-        
-        await save_session_to_firestore(
-            session_id=session_id,
-            user_id=user_id,
-            query=request.query,
-            response=response_text,
-            state=state,
-            partner_code=partner_code,  # NEW: Pass partner code
-            session_history=session_history
-        )
-
+        with profile:
+            response_text = await _run_agent_turn(user_id, session_id, request.query, partner_code)
         return {
             "results": response_text
         }
 
     except Exception as e:
         logger.error(f"Error in agent search: {str(e)}")
-        
-        # Extract partner code for error logging
-        partner_code = get_partner_code(x_partner_code)
-        
-        await save_session_to_firestore(
-            session_id=session_id,
-            user_id=user_id,
-            query=request.query,
-            response=f"Error: {str(e)}",
-            state="FAILED",
-            partner_code=partner_code,  # NEW: Track failures by partner
-            session_history=[]
-        )
-        
         return {
             "results": {
                 "answer": f"Error: {str(e)}",
@@ -438,8 +664,8 @@ async def agent_search_answer_stream(
     user_id: str,
     session_id: str,
     request: AgentQueryRequest,
-    background_tasks: BackgroundTasks,
-    x_partner_code: Optional[str] = Header(None, alias="X-Partner-Code")  # NEW
+    x_partner_code: Optional[str] = Header(None, alias="X-Partner-Code"),  # NEW
+    x_profile_token: Optional[str] = Header(None, alias="X-Profile-Token")
 ):
     """
     True streaming using run_async() with StreamingMode.SSE and partner tracking.
@@ -447,130 +673,289 @@ async def agent_search_answer_stream(
     Headers:
         X-Partner-Code: Partner identifier (optional)
         Example: X-Partner-Code: flipkart_001
+        X-Profile-Token: Admin token to profile this request (optional);
+            the profile id comes back in X-Profile-Id
     """
     # Extract partner code from header (outside generator for logging)
     partner_code = get_partner_code(x_partner_code)
     logger.info(f"Streaming request from partner: {partner_code}")
 
+    started = time.perf_counter()
+    profiling = should_profile(x_profile_token)
+    profile = profile_turn(session_id, "stream", profiling)
+
     async def event_generator() -> AsyncGenerator[str, None]:
-        accumulated_text = ""  # Track total text sent so far
-        
+        sent_any = False
         try:
-            # Message Creation
-            if hasattr(types, "Content") and hasattr(types, "Part"):
-                user_msg = types.Content(role="user", parts=[types.Part(text=request.query)])
-            elif hasattr(types, "Message"):
-                user_msg = types.Message(role="user", text=request.query)
-            else:
-                from types import SimpleNamespace
-                part = SimpleNamespace(text=request.query)
-                user_msg = SimpleNamespace(role="user", parts=[part])
-
-            # Create RunConfig with SSE streaming
-            run_config = RunConfig(
-                streaming_mode=StreamingMode.SSE,
-                max_llm_calls=50
-            )
-
-            async for event in runner.run_async(
-                user_id=user_id,
-                session_id=session_id,
-                new_message=user_msg,
-                run_config=run_config
-            ):
-                chunk_text = ""
-                
-                if hasattr(event, "text") and event.text:
-                    chunk_text = event.text
-                elif hasattr(event, "content") and event.content:
-                    if hasattr(event.content, "parts") and event.content.parts:
-                        for part in event.content.parts:
-                            if hasattr(part, "text") and part.text:
-                                chunk_text += part.text
-                elif hasattr(event, "parts") and event.parts:
-                    for part in event.parts:
-                        if hasattr(part, "text") and part.text:
-                            chunk_text += part.text
-                
-                logger.info(f"Streaming data*******: {chunk_text}")
-                if chunk_text:
-                    # --- FIXED DEDUPLICATION LOGIC ---
-                    
-                    # 1. Exact Duplicate Check
-                    if chunk_text == accumulated_text:
-                        continue
-                    
-                    # 2. Perfect Snapshot Check
-                    # If new chunk strictly contains old chunk, send only difference.
-                    if len(chunk_text) > len(accumulated_text) and chunk_text.startswith(accumulated_text):
-                        new_content = chunk_text[len(accumulated_text):]
-                        accumulated_text = chunk_text
-                        if new_content:
-                            data = {"results": new_content}
-                            yield f"data: {json.dumps(data)}\n\n"
-                        continue
-
-                    # 3. Fuzzy Snapshot Guard (Blocks the "Double Output" bug)
-                    # If new chunk is huge and contains the end of our current text, it's likely a repeat.
-                    if len(accumulated_text) > 50 and accumulated_text[-50:] in chunk_text:
-                        overlap_idx = chunk_text.find(accumulated_text[-50:])
-                        if overlap_idx != -1:
-                            potential_new_start = overlap_idx + 50
-                            if potential_new_start < len(chunk_text):
-                                new_content = chunk_text[potential_new_start:]
-                                accumulated_text += new_content
-                                data = {"results": new_content}
-                                yield f"data: {json.dumps(data)}\n\n"
-                            else:
-                                continue # Pure duplicate found, skip it.
-                    
-                    # 4. Standard Delta (New text piece)
-                    else:
-                        accumulated_text += chunk_text
-                        data = {"results": chunk_text}
-                        yield f"data: {json.dumps(data)}\n\n"
+            # Entered inside the generator so the profiler runs in the
+            # task that streams the response
+            with profile:
+                async for delta in _stream_agent_turn(user_id, session_id, request.query, partner_code):
+                    if not sent_any:
+                        TIME_TO_FIRST_TOKEN.labels("sse", partner_label(partner_code)).observe(
+                            time.perf_counter() - started
+                        )
+                    sent_any = True
+                    data = {"results": delta}
+                    yield f"data: {json.dumps(data)}\n\n"
 
-            if accumulated_text:
+            if sent_any:
                 yield "data: [DONE]\n\n"
-            
-            # Save to Firestore with partner code
-            session_history = await get_session_history_from_memory(
-                session_id=session_id,
-                user_id=user_id
-            )
-
-            background_tasks.add_task(
-                save_session_to_firestore, 
-                session_id,
-                user_id,
-                request.query,
-                accumulated_text,
-                "COMPLETED",
-                partner_code,  # NEW: Pass partner code
-                session_history
-            )
 
         except Exception as e:
             logger.error(f"Stream Error for partner {partner_code}: {e}")
             error_data = {"error": str(e)}
             yield f"data: {json.dumps(error_data)}\n\n"
 
+    headers = {
+        "Cache-Control": "no-cache",
+        "Connection": "keep-alive",
+        "X-Accel-Buffering": "no",
+        "X-Partner-Code": partner_code  # NEW: Echo partner code back in response
+    }
+    if profiling:
+        headers["X-Profile-Id"] = profile.profile_id
+
     return StreamingResponse(
         event_generator(),
         media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-            "X-Partner-Code": partner_code  # NEW: Echo partner code back in response
+        headers=headers
+    )
+
+
+@app.websocket("/agent/ws/{user_id}/{session_id}")
+async def agent_conversation_ws(
+    websocket: WebSocket,
+    user_id: str,
+    session_id: str,
+    partner_code: Optional[str] = None
+):
+    """
+    One WebSocket per conversation: send successive queries over a single
+    connection and receive streamed deltas tagged with a turn id.
+    
+    Partner code comes from the X-Partner-Code header or, for browsers that
+    cannot set headers, the `partner_code` query parameter.
+    
+    Client messages:
+        {"type": "query", "query": "...", "turn_id": "optional client id"}
+        {"type": "cancel"}    cancel the in-flight turn
+        {"type": "ping"}
+    
+    Server messages:
+        {"type": "turn_start", "turn_id": "..."}
+        {"type": "delta", "turn_id": "...", "text": "..."}
+        {"type": "turn_end", "turn_id": "...", "state": "COMPLETED"}
+        {"type": "turn_cancelled", "turn_id": "..."}
+        {"type": "error", "turn_id": "...", "detail": "...", "retry_after": 3}
+        {"type": "pong"}
+    
+    A new query while a turn is still streaming cancels that turn first.
+    """
+    partner = get_partner_code(websocket.headers.get("x-partner-code") or partner_code)
+    await websocket.accept()
+    logger.info(f"WebSocket conversation {session_id} opened by partner: {partner}")
+    
+    send_lock = asyncio.Lock()
+    current_turn: Optional[asyncio.Task] = None
+    
+    async def send(message: Dict[str, Any]) -> None:
+        async with send_lock:
+            await websocket.send_text(json.dumps(message, ensure_ascii=False))
+    
+    async def run_turn(turn_id: str, query: str) -> None:
+        admitted = True
+        if settings.enable_rate_limiting:
+            admitted, retry_after, reason = admission.try_acquire(partner)
+            if not admitted:
+                await send({"type": "error", "turn_id": turn_id, "detail": reason,
+                            "retry_after": max(1, int(retry_after + 0.999))})
+                return
+        try:
+            started = time.perf_counter()
+            first = True
+            await send({"type": "turn_start", "turn_id": turn_id})
+            async for delta in _stream_agent_turn(user_id, session_id, query, partner):
+                if first:
+                    TIME_TO_FIRST_TOKEN.labels("websocket", partner_label(partner)).observe(
+                        time.perf_counter() - started
+                    )
+                    first = False
+                await send({"type": "delta", "turn_id": turn_id, "text": delta})
+            await send({"type": "turn_end", "turn_id": turn_id, "state": "COMPLETED"})
+        except asyncio.CancelledError:
+            try:
+                await send({"type": "turn_cancelled", "turn_id": turn_id})
+            except Exception:
+                pass
+            raise
+        except Exception as e:
+            logger.error(f"WebSocket turn {turn_id} failed for partner {partner}: {e}")
+            await send({"type": "error", "turn_id": turn_id, "detail": str(e)})
+        finally:
+            if settings.enable_rate_limiting:
+                admission.release(partner)
+    
+    async def cancel_current_turn() -> None:
+        if current_turn is not None and not current_turn.done():
+            current_turn.cancel()
+            try:
+                await current_turn
+            except asyncio.CancelledError:
+                pass
+    
+    try:
+        await _ensure_adk_session(user_id, session_id)
+        
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except ValueError:
+                await send({"type": "error", "detail": "Messages must be JSON"})
+                continue
+            
+            message_type = message.get("type", "query")
+            if message_type == "ping":
+                await send({"type": "pong"})
+            elif message_type == "cancel":
+                await cancel_current_turn()
+            elif message_type == "query" and message.get("query"):
+                # A newer message supersedes whatever is still streaming
+                await cancel_current_turn()
+                turn_id = str(message.get("turn_id") or uuid.uuid4())
+                current_turn = asyncio.create_task(run_turn(turn_id, message["query"]))
+            else:
+                await send({"type": "error", "detail": f"Unsupported message: {message_type}"})
+    
+    except WebSocketDisconnect:
+        logger.info(f"WebSocket conversation {session_id} closed")
+    finally:
+        await cancel_current_turn()
+
+
+@app.post("/agent/batch/answer")
+async def agent_batch_answer(
+    request: BatchQueryRequest,
+    x_partner_code: Optional[str] = Header(None, alias="X-Partner-Code")
+):
+    """
+    Answer many queries in one request, streaming NDJSON results as each completes.
+    
+    Items run through the agent with bounded concurrency and share one
+    retrieval cache, so repeated questions hit the datastore once. Batch
+    turns only use spare agent capacity: each waits for an admission slot
+    under a lower global cap than interactive requests get and a per-partner
+    batch cap, without spending the partner's interactive rate limit.
+    
+    Headers:
+        X-Partner-Code: Partner identifier (optional)
+    
+    Request Body:
+        {
+            "items": [{"user_id": "...", "session_id": "... (optional)", "query": "..."}],
+            "max_concurrency": 4   (optional, capped at settings.batch_max_concurrency)
         }
+    
+    Response lines:
+        {"index": 0, "user_id": "...", "session_id": "...", "state": "COMPLETED", "results": "..."}
+        {"index": 1, ..., "state": "FAILED", "error": "..."}
+        {"done": true, "completed": N, "failed": M}
+    """
+    partner_code = get_partner_code(x_partner_code)
+    
+    if len(request.items) > settings.batch_max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch has {len(request.items)} items; the limit is {settings.batch_max_items}"
+        )
+    
+    concurrency = min(request.max_concurrency or settings.batch_max_concurrency, settings.batch_max_concurrency)
+    concurrency = max(1, min(concurrency, len(request.items) or 1))
+    logger.info(f"Batch of {len(request.items)} items from partner {partner_code} (concurrency {concurrency})")
+    
+    async def acquire_slot():
+        # Batch work waits for spare capacity instead of getting a 429
+        if not settings.enable_rate_limiting:
+            return
+        while not admission.try_acquire_batch(partner_code, settings.batch_max_in_flight_global):
+            await asyncio.sleep(1.0)
+    
+    async def run_item(index: int, item: BatchQueryItem) -> Dict[str, Any]:
+        session_id = item.session_id or str(uuid.uuid4().int)[:19]
+        row = {"index": index, "user_id": item.user_id, "session_id": session_id}
+        await acquire_slot()
+        try:
+            await _ensure_adk_session(item.user_id, session_id)
+            row["results"] = await _run_agent_turn(item.user_id, session_id, item.query, partner_code)
+            row["state"] = "COMPLETED"
+        except Exception as e:
+            logger.error(f"Batch item {index} failed for partner {partner_code}: {str(e)}")
+            row["state"] = "FAILED"
+            row["error"] = str(e)
+        finally:
+            if settings.enable_rate_limiting:
+                admission.release_batch(partner_code)
+        return row
+    
+    async def batch_generator() -> AsyncGenerator[str, None]:
+        pending_items = asyncio.Queue()
+        for index, item in enumerate(request.items):
+            pending_items.put_nowait((index, item))
+        results: asyncio.Queue = asyncio.Queue()
+        retrieval_cache: Dict = {}
+        
+        async def worker():
+            use_retrieval_cache(retrieval_cache)
+            while True:
+                try:
+                    index, item = pending_items.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await results.put(await run_item(index, item))
+        
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        completed = failed = 0
+        try:
+            for _ in range(len(request.items)):
+                row = await results.get()
+                if row["state"] == "COMPLETED":
+                    completed += 1
+                else:
+                    failed += 1
+                yield json.dumps(row, ensure_ascii=False, default=str) + "\n"
+            yield json.dumps({"done": True, "completed": completed, "failed": failed}) + "\n"
+        finally:
+            # Client went away or we are done: stop any remaining work
+            for task in workers:
+                task.cancel()
+    
+    return StreamingResponse(
+        batch_generator(),
+        media_type="application/x-ndjson",
+        headers={"X-Partner-Code": partner_code}
     )
 
 
 @app.get("/sessions/{session_id}")
-async def get_session(session_id: str):
+async def get_session(
+    session_id: str,
+    page_size: int = 50,
+    page_token: Optional[str] = None,
+    fields: Optional[str] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    order: str = "desc"
+):
     """
-    Retrieve a specific session and all its queries from Firestore.
+    Retrieve a specific session and one page of its queries from Firestore.
+    
+    Query Params:
+        page_size: Queries per page (max 500)
+        page_token: next_page_token from the previous response
+        fields: Comma-separated query fields to return, e.g. "query,state,created_at"
+                (omit "response" to skip the answer bodies)
+        start_time / end_time: ISO-8601 window on the query timestamp
+        order: "desc" (newest first) or "asc"
     """
     try:
         session_ref = db.collection('sessions').document(session_id)
@@ -581,18 +966,24 @@ async def get_session(session_id: str):
         
         session_data = session_doc.to_dict()
         
-        # Get all queries in this session
-        queries = []
-        queries_ref = session_ref.collection('queries')
-        async for query_doc in queries_ref.stream():
-            query_data = query_doc.to_dict()
-            query_data['id'] = query_doc.id
-            queries.append(query_data)
+        # Get one page of queries in this session
+        queries, next_page_token = await fetch_page(
+            session_ref.collection('queries'),
+            time_field='timestamp',
+            page_size=page_size,
+            page_token=page_token,
+            fields=parse_fields(fields),
+            start_time=parse_time(start_time, 'start_time'),
+            end_time=parse_time(end_time, 'end_time'),
+            descending=order.lower() != "asc"
+        )
         
         session_data['queries'] = queries
         
-        return {"session": session_data}
+        return {"session": session_data, "next_page_token": next_page_token}
         
+    except InvalidPageRequest as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
@@ -600,14 +991,52 @@ async def get_session(session_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/sessions/{session_id}/history")
+async def get_session_history(session_id: str):
+    """
+    Stream a session's conversation history in order as NDJSON (one message per line).
+    """
+    async def history_generator() -> AsyncGenerator[str, None]:
+        try:
+            async for message in stream_session_history(db, session_id):
+                yield json.dumps(message, ensure_ascii=False, default=str) + "\n"
+        except Exception as e:
+            logger.error(f"Error streaming session history: {str(e)}")
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return StreamingResponse(history_generator(), media_type="application/x-ndjson")
+
+
 @app.get("/users/{user_id}/sessions")
-async def get_user_sessions_endpoint(user_id: str, limit: int = 50):
+async def get_user_sessions_endpoint(
+    user_id: str,
+    limit: int = 50,
+    page_token: Optional[str] = None,
+    fields: Optional[str] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None
+):
     """
-    Retrieve all sessions for a specific user.
+    Retrieve a user's sessions, one page at a time (newest first).
+    
+    Query Params:
+        limit: Sessions per page (max 500)
+        page_token: next_page_token from the previous response
+        fields: Comma-separated session fields to return
+        start_time / end_time: ISO-8601 window on updated_at
     """
     try:
-        sessions = await get_user_sessions(user_id, limit)
-        return {"sessions": sessions, "count": len(sessions)}
+        sessions, next_page_token = await get_user_sessions(
+            user_id,
+            limit,
+            page_token=page_token,
+            fields=parse_fields(fields),
+            start_time=parse_time(start_time, 'start_time'),
+            end_time=parse_time(end_time, 'end_time')
+        )
+        return {"sessions": sessions, "count": len(sessions), "next_page_token": next_page_token}
+    except InvalidPageRequest as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error retrieving user sessions: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -619,14 +1048,21 @@ async def get_user_sessions_endpoint(user_id: str, limit: int = 50):
 async def get_partner_sessions(
     partner_code: str,
     limit: int = 100,
+    page_token: Optional[str] = None,
+    fields: Optional[str] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
     x_partner_code: Optional[str] = Header(None, alias="X-Partner-Code")
 ):
     """
-    Get all sessions for a specific partner.
+    Get a partner's sessions, one page at a time (newest first).
     
     Args:
         partner_code: Partner identifier
-        limit: Maximum number of sessions to return
+        limit: Sessions per page (max 500)
+        page_token: next_page_token from the previous response
+        fields: Comma-separated session fields to return
+        start_time / end_time: ISO-8601 window on updated_at
         
     Headers:
         X-Partner-Code: Partner identifier for authentication (optional)
@@ -638,61 +1074,162 @@ async def get_partner_sessions(
         #     raise HTTPException(status_code=403, detail="Unauthorized")
         
         sessions_ref = db.collection('sessions')
-        query = sessions_ref.where('partner_code', '==', partner_code)\
-                           .order_by('updated_at', direction=firestore.Query.DESCENDING)\
-                           .limit(limit)
+        query = sessions_ref.where('partner_code', '==', partner_code)
         
-        sessions = []
-        async for doc in query.stream():
-            session_data = doc.to_dict()
-            session_data['session_id'] = doc.id
-            sessions.append(session_data)
+        sessions, next_page_token = await fetch_page(
+            query,
+            time_field='updated_at',
+            page_size=limit,
+            page_token=page_token,
+            fields=parse_fields(fields),
+            start_time=parse_time(start_time, 'start_time'),
+            end_time=parse_time(end_time, 'end_time'),
+            id_field='session_id'
+        )
         
         return {
             "partner_code": partner_code,
             "sessions": sessions,
-            "count": len(sessions)
+            "count": len(sessions),
+            "next_page_token": next_page_token
         }
         
+    except InvalidPageRequest as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error retrieving partner sessions: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/analytics/partner/{partner_code}/export")
+async def export_partner_sessions(
+    partner_code: str,
+    include_queries: bool = False,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    page_size: int = 500,
+    x_partner_code: Optional[str] = Header(None, alias="X-Partner-Code")
+):
+    """
+    Bulk-export a partner's sessions (and optionally their queries) as NDJSON.
+    
+    Sessions are read from Firestore one page at a time, oldest first, and
+    streamed as they arrive, so memory stays flat however large the export is.
+    
+    Each line is one of:
+        {"type": "session", ...session fields..., "session_id": "..."}
+        {"type": "query", "session_id": "...", ...query fields..., "query_id": "..."}
+        {"type": "cursor", "cursor": "..."}   after every page of sessions
+        {"type": "end", "sessions": N}        once the export is complete
+        {"type": "error", "detail": "...", "cursor": "..."}
+    
+    To resume an interrupted export, pass the last "cursor" value received.
+    
+    Query Params:
+        include_queries: Also emit every query of each session
+        cursor: Resume point from a previous export
+        fields: Comma-separated session fields to export
+        start_time / end_time: ISO-8601 window on the session's created_at
+        page_size: Sessions per Firestore page (max 500)
+    
+    Headers:
+        X-Partner-Code: Partner identifier for authentication (optional)
+    """
+    try:
+        page_kwargs = {
+            'fields': parse_fields(fields),
+            'start_time': parse_time(start_time, 'start_time'),
+            'end_time': parse_time(end_time, 'end_time'),
+            'descending': False,
+            'id_field': 'session_id',
+        }
+        if cursor:
+            # Reject a malformed cursor up front rather than mid-stream
+            decode_page_token(cursor)
+    except InvalidPageRequest as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    sessions_query = db.collection('sessions').where('partner_code', '==', partner_code)
+    
+    async def export_generator() -> AsyncGenerator[str, None]:
+        exported = 0
+        resume_cursor = cursor
+        try:
+            async for sessions, next_cursor in iter_pages(
+                sessions_query, 'created_at', page_size=page_size, page_token=cursor, **page_kwargs
+            ):
+                for session_data in sessions:
+                    yield json.dumps({"type": "session", **session_data}, ensure_ascii=False, default=str) + "\n"
+                    
+                    if include_queries:
+                        queries_ref = db.collection('sessions').document(session_data['session_id']).collection('queries')
+                        async for queries, _ in iter_pages(
+                            queries_ref, 'timestamp', descending=False, id_field='query_id'
+                        ):
+                            for query_data in queries:
+                                row = {"type": "query", "session_id": session_data['session_id'], **query_data}
+                                yield json.dumps(row, ensure_ascii=False, default=str) + "\n"
+                
+                exported += len(sessions)
+                if next_cursor:
+                    resume_cursor = next_cursor
+                    yield json.dumps({"type": "cursor", "cursor": next_cursor}) + "\n"
+            
+            logger.info(f"Exported {exported} sessions for partner: {partner_code}")
+            yield json.dumps({"type": "end", "sessions": exported}) + "\n"
+            
+        except Exception as e:
+            logger.error(f"Error exporting partner sessions: {str(e)}")
+            yield json.dumps({"type": "error", "detail": str(e), "cursor": resume_cursor}) + "\n"
+    
+    return StreamingResponse(
+        export_generator(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{partner_code}_sessions.ndjson"'}
+    )
+
+
 @app.get("/analytics/partner/{partner_code}/stats")
 async def get_partner_stats(
     partner_code: str,
+    days: int = 0,
     x_partner_code: Optional[str] = Header(None, alias="X-Partner-Code")
 ):
     """
     Get usage statistics for a partner.
     
+    Reads the partner's pre-aggregated rollup counters, so the cost does not
+    grow with the number of stored sessions.
+    
+    Args:
+        partner_code: Partner identifier
+        days: Optional number of trailing days to include as a daily breakdown
+    
     Returns:
         {
             "partner_code": "flipkart_001",
             "total_sessions": 150,
             "total_queries": 450,
-            "average_queries_per_session": 3.0
+            "average_queries_per_session": 3.0,
+            "daily": [{"date": "2026-10-18", "sessions": 5, "queries": 14}]  (only if days > 0)
         }
     """
     try:
-        sessions_ref = db.collection('sessions')
-        query = sessions_ref.where('partner_code', '==', partner_code)
-        
-        total_sessions = 0
-        total_queries = 0
-        
-        async for doc in query.stream():
-            total_sessions += 1
-            session_data = doc.to_dict()
-            total_queries += session_data.get('query_count', 0)
+        rollup = await get_partner_rollup(db, partner_code, days=min(max(days, 0), 366))
+        total_sessions = rollup['total_sessions']
+        total_queries = rollup['total_queries']
         
-        return {
+        result = {
             "partner_code": partner_code,
             "total_sessions": total_sessions,
             "total_queries": total_queries,
             "average_queries_per_session": total_queries / total_sessions if total_sessions > 0 else 0
         }
+        if 'daily' in rollup:
+            result['daily'] = rollup['daily']
+        return result
         
     except Exception as e:
         logger.error(f"Error calculating partner stats: {str(e)}")
@@ -707,6 +1244,8 @@ async def get_all_partners_stats(
     Get usage statistics for all partners.
     Useful for admin dashboard.
     
+    Reads the sharded rollup counters (O(partners)), not the sessions collection.
+    
     Returns:
         [
             {"partner_code": "flipkart_001", "sessions": 150, "queries": 450},
@@ -719,25 +1258,9 @@ async def get_all_partners_stats(
         # if requesting_partner != "admin":
         #     raise HTTPException(status_code=403, detail="Admin access required")
         
-        partners_stats = {}
-        
-        sessions_ref = db.collection('sessions')
-        async for doc in sessions_ref.stream():
-            session_data = doc.to_dict()
-            partner = session_data.get('partner_code', 'unknown')
-            
-            if partner not in partners_stats:
-                partners_stats[partner] = {
-                    'partner_code': partner,
-                    'sessions': 0,
-                    'queries': 0
-                }
-            
-            partners_stats[partner]['sessions'] += 1
-            partners_stats[partner]['queries'] += session_data.get('query_count', 0)
+        partners_list = await get_all_partner_rollups(db)
         
-        # Convert to list and sort by sessions
-        partners_list = list(partners_stats.values())
+        # Sort by sessions
         partners_list.sort(key=lambda x: x['sessions'], reverse=True)
         
         return {
@@ -750,6 +1273,75 @@ async def get_all_partners_stats(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# --- INTERNAL ENDPOINTS ---
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Prometheus scrape endpoint.
+    """
+    body, content_type = metrics_payload()
+    return Response(content=body, media_type=content_type)
+
+
+def _require_profile_admin(token: Optional[str]) -> None:
+    """Profile endpoints need profiling enabled and a configured admin token."""
+    if not settings.enable_profiling:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    admin_token = settings.profiling_admin_token
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="No profiling admin token configured")
+    if not (token and hmac.compare_digest(token, admin_token)):
+        raise HTTPException(status_code=403, detail="Invalid profile token")
+
+
+@app.get("/internal/profiles")
+async def get_profiles(
+    session_id: Optional[str] = None,
+    limit: int = 100,
+    x_profile_token: Optional[str] = Header(None, alias="X-Profile-Token")
+):
+    """
+    List stored request profiles, newest first.
+    
+    Query Parameters:
+        session_id: Only profiles for this session (optional)
+        limit: Maximum entries (default 100)
+    """
+    _require_profile_admin(x_profile_token)
+    return {"profiles": list_profiles(session_id, max(1, min(limit, 1000)))}
+
+
+@app.get("/internal/profiles/{session_id}/{turn_id}")
+async def get_profile(
+    session_id: str,
+    turn_id: str,
+    x_profile_token: Optional[str] = Header(None, alias="X-Profile-Token")
+):
+    """
+    Download one profile (speedscope JSON, open at https://www.speedscope.app).
+    """
+    _require_profile_admin(x_profile_token)
+    path = profile_path(session_id, turn_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", filename=os.path.basename(path))
+
+
+@app.get("/internal/stats")
+async def get_internal_stats():
+    """
+    Runtime gauges for background subsystems (e.g. persistence queue depth,
+    resident sessions and bytes, event-loop lag and recent stalls).
+    """
+    return {
+        "persistence": persistence.stats(),
+        "sessions": session_service.stats(),
+        "admission": admission.stats(),
+        "event_loop": loop_monitor.stats() if loop_monitor is not None else None
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
@@ -0,0 +1,165 @@
+"""
+Cursor pagination, field projection and time windows for Firestore listings.
+
+Page tokens are opaque to clients: URL-safe base64 of the last document's
+order-by value and id. Queries are ordered by (time field, document id), so
+the cursor stays stable when several documents share a timestamp.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from google.cloud import firestore
+
+MAX_PAGE_SIZE = 500
+
+
+class InvalidPageRequest(ValueError):
+    """Raised for malformed page tokens, field lists or time bounds."""
+
+
+def encode_page_token(time_value: Any, doc_id: str) -> str:
+    """Build the token that resumes after the given document."""
+    if isinstance(time_value, datetime):
+        time_value = time_value.isoformat()
+    payload = json.dumps({'t': time_value, 'id': doc_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_page_token(token: str) -> Tuple[Any, str]:
+    """
+    Decode a page token.
+
+    Returns:
+        Tuple of (time value, document id)
+
+    Raises:
+        InvalidPageRequest: If the token is malformed
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        time_value = data['t']
+        if isinstance(time_value, str):
+            time_value = datetime.fromisoformat(time_value)
+        return time_value, str(data['id'])
+    except Exception as e:
+        raise InvalidPageRequest(f"Invalid page_token: {e}")
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma-separated `fields=` value; None means all fields."""
+    if not fields:
+        return None
+    parsed = [f.strip() for f in fields.split(',') if f.strip()]
+    if not parsed:
+        return None
+    for field in parsed:
+        if field.startswith('__'):
+            raise InvalidPageRequest(f"Invalid field: {field}")
+    return parsed
+
+
+def parse_time(value: Optional[str], name: str) -> Optional[datetime]:
+    """Parse an ISO-8601 time bound."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise InvalidPageRequest(f"Invalid {name}: expected ISO-8601, got '{value}'")
+
+
+async def fetch_page(
+    query,
+    time_field: str,
+    page_size: int = 50,
+    page_token: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    descending: bool = True,
+    id_field: str = 'id'
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Fetch one page of documents ordered by time.
+
+    Args:
+        query: Collection reference or filtered query to page through
+        time_field: Timestamp field to order and window by
+        page_size: Documents per page (capped at MAX_PAGE_SIZE)
+        page_token: Token from the previous page, if any
+        fields: Field projection (the time field is always included)
+        start_time: Inclusive lower bound on time_field
+        end_time: Exclusive upper bound on time_field
+        descending: Newest first when True
+        id_field: Key under which each document's id is returned
+
+    Returns:
+        Tuple of (documents, next page token or None)
+    """
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    direction = firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING
+
+    if start_time is not None:
+        query = query.where(time_field, '>=', start_time)
+    if end_time is not None:
+        query = query.where(time_field, '<', end_time)
+
+    query = query.order_by(time_field, direction=direction).order_by(
+        firestore.FieldPath.document_id(), direction=direction
+    )
+
+    if fields:
+        projection = list(dict.fromkeys(fields + [time_field]))
+        query = query.select(projection)
+
+    if page_token:
+        time_value, doc_id = decode_page_token(page_token)
+        query = query.start_after({time_field: time_value, '__name__': doc_id})
+
+    # One extra document tells us whether another page exists
+    query = query.limit(page_size + 1)
+
+    documents: List[Dict[str, Any]] = []
+    last_time = None
+    last_id = None
+    has_more = False
+    async for doc in query.stream():
+        if len(documents) == page_size:
+            has_more = True
+            break
+        data = doc.to_dict() or {}
+        last_time = data.get(time_field)
+        last_id = doc.id
+        if fields:
+            data = {k: v for k, v in data.items() if k in fields}
+        data[id_field] = doc.id
+        documents.append(data)
+
+    next_token = encode_page_token(last_time, last_id) if has_more and last_id else None
+    return documents, next_token
+
+
+async def iter_pages(
+    query,
+    time_field: str,
+    page_size: int = MAX_PAGE_SIZE,
+    page_token: Optional[str] = None,
+    **kwargs
+) -> AsyncIterator[Tuple[List[Dict[str, Any]], Optional[str]]]:
+    """
+    Walk a query page by page, holding only one page in memory.
+
+    Yields:
+        Tuple of (documents, token that resumes after this page or None at the end)
+    """
+    while True:
+        documents, page_token = await fetch_page(
+            query, time_field, page_size=page_size, page_token=page_token, **kwargs
+        )
+        yield documents, page_token
+        if not page_token:
+            return
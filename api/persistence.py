@@ -0,0 +1,523 @@
+"""
+Write-behind persistence of conversation turns to Firestore.
+
+Endpoints enqueue a TurnRecord and return immediately. A single background
+worker drains the bounded queue, coalesces records per session and commits
+them with Firestore batched writes. Session documents are written with merge
+semantics and an Increment, so no read is needed before the write.
+
+The first turn of a session this process has not seen (e.g. a client-chosen
+session id that never went through /agent/sessions/create) first creates
+the session document with its partner_code and created_at, outside the
+batch; if the document already exists it is left untouched.
+
+Conversation history is append-only: each turn carries only the messages
+added since the session's high-water mark, stored as ordered segment
+documents under sessions/{session_id}/history_segments.
+"""
+
+import asyncio
+import json
+import random
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from google.api_core import exceptions as gcp_exceptions
+from google.cloud import firestore
+
+from api.rollups import build_rollup_writes
+from config.settings import settings
+from utils.logger import setup_logger
+from utils.metrics import FIRESTORE_WRITE_LATENCY
+from utils.tracing import current_span_context, linked_span
+
+logger = setup_logger(__name__)
+
+HISTORY_SEGMENTS_COLLECTION = 'history_segments'
+
+# Segments whose JSON exceeds this are stored zlib-compressed
+SEGMENT_COMPRESS_BYTES = 32 * 1024
+# Keep every segment document well below Firestore's 1 MiB limit
+SEGMENT_MAX_BYTES = 512 * 1024
+
+
+@dataclass
+class TurnRecord:
+    """One answered (or failed) turn waiting to be persisted."""
+
+    session_id: str
+    user_id: str
+    query: str
+    response: str
+    state: str
+    partner_code: Optional[str] = None
+    # Only the messages added since the previous turn, and the index of the first one
+    session_history: Optional[List[Dict[str, Any]]] = None
+    history_start: int = 0
+    # Stage timings of the searches run during the turn (utils.stage_trace)
+    search_traces: Optional[List[Dict[str, Any]]] = None
+    created_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+    # Span of the request that produced the turn; the batched commit links back to it
+    trace_context: Any = field(default_factory=current_span_context, repr=False)
+
+
+# A prepared write: (document reference, data, merge)
+_Write = Tuple[Any, Dict[str, Any], bool]
+
+
+class FirestoreWriteBehindQueue:
+    """Bounded in-process queue with a background worker committing batched writes."""
+
+    def __init__(self, db, max_queue_size: int = None, batch_max_turns: int = None):
+        """
+        Initialize the queue.
+
+        Args:
+            db: Firestore AsyncClient
+            max_queue_size: Records held before new ones are dropped
+            batch_max_turns: Records coalesced into one batched commit
+        """
+        self._db = db
+        self._max_queue_size = max_queue_size or settings.persistence_queue_size
+        self._batch_max_turns = batch_max_turns or settings.persistence_batch_max_turns
+        # Sessions whose document is known to exist (bounded LRU)
+        self._known_sessions: "OrderedDict[str, None]" = OrderedDict()
+        self._max_known_sessions = 100000
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=self._max_queue_size)
+        self._worker: Optional[asyncio.Task] = None
+
+        # Counters exposed through stats()
+        self._enqueued = 0
+        self._dropped = 0
+        self._committed = 0
+        self._failed = 0
+        self._commits = 0
+        self._last_commit_ms: Optional[float] = None
+
+    # --- LIFECYCLE ---
+    async def start(self) -> None:
+        """Start the background worker on the running loop."""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+            logger.info(f"Write-behind persistence started (queue size {self._max_queue_size})")
+
+    async def stop(self, timeout: float = None) -> None:
+        """
+        Flush everything still queued, then stop the worker.
+
+        Args:
+            timeout: Seconds to wait for the flush before giving up
+        """
+        timeout = timeout if timeout is not None else settings.persistence_shutdown_timeout_seconds
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Persistence flush timed out with {self.depth} records still queued")
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        logger.info(f"Write-behind persistence stopped: {self.stats()}")
+
+    # --- PRODUCER SIDE ---
+    def enqueue(self, record: TurnRecord) -> bool:
+        """
+        Queue a turn for persistence without waiting.
+
+        Returns:
+            False if the queue is full and the record was dropped
+        """
+        try:
+            self._queue.put_nowait(record)
+            self._enqueued += 1
+            return True
+        except asyncio.QueueFull:
+            self._dropped += 1
+            logger.error(
+                f"Persistence queue full ({self._max_queue_size}); dropped turn for session {record.session_id}"
+            )
+            return False
+
+    def mark_session_known(self, session_id: str) -> None:
+        """Record that a session document exists (e.g. written by create_session)."""
+        self._known_sessions[session_id] = None
+        self._known_sessions.move_to_end(session_id)
+        while len(self._known_sessions) > self._max_known_sessions:
+            self._known_sessions.popitem(last=False)
+
+    @property
+    def depth(self) -> int:
+        """Records currently waiting in the queue."""
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and throughput counters."""
+        return {
+            "queue_depth": self.depth,
+            "queue_capacity": self._max_queue_size,
+            "enqueued": self._enqueued,
+            "dropped": self._dropped,
+            "committed": self._committed,
+            "failed": self._failed,
+            "commits": self._commits,
+            "last_commit_ms": self._last_commit_ms,
+            "worker_running": self._worker is not None and not self._worker.done(),
+        }
+
+    # --- WORKER SIDE ---
+    async def _run(self) -> None:
+        """Drain the queue forever, committing one coalesced batch at a time."""
+        while True:
+            records = [await self._queue.get()]
+            # Give concurrent turns a moment to arrive so they share a commit
+            await asyncio.sleep(settings.persistence_flush_interval_seconds)
+            while len(records) < self._batch_max_turns:
+                try:
+                    records.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            try:
+                await self._commit_with_retry(records)
+            except Exception as e:
+                # Never let one bad batch kill the worker
+                self._failed += len(records)
+                logger.error(f"Unexpected persistence error: {e}")
+            finally:
+                for _ in records:
+                    self._queue.task_done()
+
+    async def _create_session_doc(self, record: TurnRecord) -> bool:
+        """
+        Create a session document with its first-write attribution.
+
+        Returns:
+            True if this call created the document
+        """
+        session_data = {
+            'user_id': record.user_id,
+            'session_id': record.session_id,
+            'created_at': firestore.SERVER_TIMESTAMP,
+            'query_count': 0,
+        }
+        if record.partner_code:
+            session_data['partner_code'] = record.partner_code
+        try:
+            await self._db.collection('sessions').document(record.session_id).create(session_data)
+            created = True
+        except gcp_exceptions.Conflict:
+            created = False
+        except Exception as e:
+            # Not marked known, so the next turn tries again
+            logger.warning(f"Could not create session document {record.session_id}: {e}")
+            return False
+        self.mark_session_known(record.session_id)
+        return created
+
+    async def _create_unknown_sessions(self, records: List[TurnRecord]) -> List[TurnRecord]:
+        """
+        Create the documents of sessions this process has not seen yet.
+
+        Returns:
+            The first record of each session whose document was created here
+        """
+        first_turns: Dict[str, TurnRecord] = {}
+        for record in records:
+            if record.session_id in self._known_sessions:
+                self._known_sessions.move_to_end(record.session_id)
+            else:
+                first_turns.setdefault(record.session_id, record)
+        if not first_turns:
+            return []
+        created = await asyncio.gather(*(self._create_session_doc(r) for r in first_turns.values()))
+        return [record for record, was_created in zip(first_turns.values(), created) if was_created]
+
+    async def _commit_with_retry(self, records: List[TurnRecord]) -> None:
+        """Commit the records, retrying with exponential backoff and jitter."""
+        new_sessions = await self._create_unknown_sessions(records)
+        writes = self._build_writes(records, new_sessions)
+        max_retries = settings.persistence_max_retries
+        delay = settings.persistence_retry_base_seconds
+
+        for attempt in range(max_retries + 1):
+            start_time = time.time()
+            try:
+                # A WriteBatch is single-use, so rebuild it for every attempt
+                batch = self._db.batch()
+                for ref, data, merge in writes:
+                    batch.set(ref, data, merge=merge)
+                with linked_span(
+                    "firestore.commit_turns",
+                    [r.trace_context for r in records],
+                    turns=len(records),
+                    writes=len(writes),
+                    attempt=attempt,
+                ):
+                    await batch.commit()
+
+                self._commits += 1
+                self._committed += len(records)
+                self._last_commit_ms = (time.time() - start_time) * 1000
+                FIRESTORE_WRITE_LATENCY.labels("turn_batch", "ok").observe(self._last_commit_ms / 1000)
+                logger.info(
+                    f"Persisted {len(records)} turns ({len(writes)} writes) "
+                    f"in {self._last_commit_ms:.0f}ms"
+                )
+                return
+            except Exception as e:
+                FIRESTORE_WRITE_LATENCY.labels("turn_batch", "error").observe(time.time() - start_time)
+                if attempt >= max_retries:
+                    self._failed += len(records)
+                    logger.error(
+                        f"Giving up persisting {len(records)} turns after {attempt + 1} attempts: {e}"
+                    )
+                    return
+                sleep_for = delay * (2 ** attempt) * (0.5 + random.random())
+                logger.warning(
+                    f"Persistence commit failed (attempt {attempt + 1}), retrying in {sleep_for:.2f}s: {e}"
+                )
+                await asyncio.sleep(sleep_for)
+
+    def _build_writes(
+        self,
+        records: List[TurnRecord],
+        new_sessions: Optional[List[TurnRecord]] = None
+    ) -> List[_Write]:
+        """
+        Coalesce records per session into the batch's writes.
+
+        Per session: one merged session-document update (query_count is an
+        Increment of the number of turns), one document per query, and one
+        history segment per turn holding only that turn's new messages.
+        Per partner and day: one increment of the sharded query counters,
+        plus the session counters of `new_sessions` (documents created by
+        this batch rather than by create_session).
+        """
+        by_session: Dict[str, List[TurnRecord]] = {}
+        for record in records:
+            by_session.setdefault(record.session_id, []).append(record)
+
+        writes: List[_Write] = []
+        for session_id, turns in by_session.items():
+            last = turns[-1]
+            session_ref = self._db.collection('sessions').document(session_id)
+
+            # Merge write: creates the document if missing, never needs a read.
+            # partner_code is set once, when the document is created, and never overwritten.
+            session_update = {
+                'user_id': last.user_id,
+                'session_id': session_id,
+                'updated_at': firestore.SERVER_TIMESTAMP,
+                'last_state': last.state,
+                'query_count': firestore.Increment(len(turns)),
+            }
+            # Messages skip non-text events, so the mark follows the last index, not the count
+            hwm = max(
+                (t.session_history[-1]['index'] + 1 for t in turns if t.session_history),
+                default=None
+            )
+            if hwm is not None:
+                session_update['history_hwm'] = firestore.Maximum(hwm)
+            writes.append((session_ref, session_update, True))
+
+            for turn in turns:
+                query_data = {
+                    'query': turn.query,
+                    'response': turn.response,
+                    'state': turn.state,
+                    'timestamp': firestore.SERVER_TIMESTAMP,
+                    'created_at': turn.created_at,
+                }
+                if turn.partner_code:
+                    query_data['partner_code'] = turn.partner_code
+                if turn.search_traces:
+                    query_data['search_traces'] = turn.search_traces
+                writes.append((session_ref.collection('queries').document(), query_data, False))
+
+            for turn in turns:
+                if not turn.session_history:
+                    continue
+                segments_ref = session_ref.collection(HISTORY_SEGMENTS_COLLECTION)
+                for start, data in build_history_segments(turn.history_start, turn.session_history):
+                    # Deterministic ids make retries and re-sends idempotent
+                    writes.append((segments_ref.document(f"{start:010d}"), data, False))
+
+        queries_per_partner_day: Dict[Tuple[str, str], int] = {}
+        for record in records:
+            key = (record.partner_code or 'unknown', record.created_at[:10])
+            queries_per_partner_day[key] = queries_per_partner_day.get(key, 0) + 1
+        sessions_per_partner_day: Dict[Tuple[str, str], int] = {}
+        for record in new_sessions or []:
+            key = (record.partner_code or 'unknown', record.created_at[:10])
+            sessions_per_partner_day[key] = sessions_per_partner_day.get(key, 0) + 1
+        for key in queries_per_partner_day.keys() | sessions_per_partner_day.keys():
+            partner_code, day = key
+            writes.extend(build_rollup_writes(
+                self._db,
+                partner_code,
+                sessions=sessions_per_partner_day.get(key, 0),
+                queries=queries_per_partner_day.get(key, 0),
+                day=day
+            ))
+
+        return writes
+
+
+# --- APPEND-ONLY HISTORY ---
+def _encode_segment(start: int, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build one segment document, compressing large payloads."""
+    data: Dict[str, Any] = {
+        'start': start,
+        'count': len(messages),
+        'updated_at': firestore.SERVER_TIMESTAMP,
+    }
+    payload = json.dumps(messages, ensure_ascii=False, default=str).encode('utf-8')
+    if len(payload) > SEGMENT_COMPRESS_BYTES:
+        data['messages_z'] = zlib.compress(payload, 6)
+    else:
+        data['messages'] = messages
+    return data
+
+
+def build_history_segments(
+    start: int,
+    messages: List[Dict[str, Any]]
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    Split a turn's new messages into segment documents.
+
+    Args:
+        start: Index of the first message within the session history
+        messages: New messages, in order; each segment starts at its first
+                  message's 'index' (indices skip non-text events)
+
+    Returns:
+        List of (segment start index, document data)
+    """
+    segments: List[Tuple[int, Dict[str, Any]]] = []
+    chunk: List[Dict[str, Any]] = []
+    chunk_start = start
+    chunk_bytes = 0
+
+    for message in messages:
+        size = len(json.dumps(message, ensure_ascii=False, default=str))
+        if chunk and chunk_bytes + size > SEGMENT_MAX_BYTES:
+            segments.append((chunk_start, _encode_segment(chunk_start, chunk)))
+            chunk, chunk_start, chunk_bytes = [], message.get('index', chunk_start), 0
+        chunk.append(message)
+        chunk_bytes += size
+
+    if chunk:
+        segments.append((chunk_start, _encode_segment(chunk_start, chunk)))
+    return segments
+
+
+def _decode_segment(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Messages stored in a segment document."""
+    if data.get('messages_z') is not None:
+        return json.loads(zlib.decompress(data['messages_z']).decode('utf-8'))
+    return data.get('messages', [])
+
+
+async def stream_session_history(db, session_id: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream a session's history back in order, one message at a time.
+
+    Segments are read in start order. Messages carry their session-wide
+    'index', so overlapping segments (e.g. re-sent after a restart) are
+    de-duplicated. Sessions persisted before segments existed fall back to
+    the legacy history/full_history document.
+
+    Args:
+        db: Firestore AsyncClient
+        session_id: Session identifier
+
+    Yields:
+        Message dictionaries
+    """
+    session_ref = db.collection('sessions').document(session_id)
+    segments = session_ref.collection(HISTORY_SEGMENTS_COLLECTION).order_by('start')
+
+    next_index = 0
+    found_segments = False
+    async for doc in segments.stream():
+        found_segments = True
+        data = doc.to_dict()
+        for position, message in enumerate(_decode_segment(data)):
+            index = message.get('index', data.get('start', 0) + position)
+            if index < next_index:
+                continue
+            next_index = index + 1
+            yield message
+
+    if not found_segments:
+        legacy = await session_ref.collection('history').document('full_history').get()
+        if legacy.exists:
+            for message in legacy.to_dict().get('messages', []):
+                yield message
+
+
+class HistoryWatermarks:
+    """
+    Per-session high-water marks: how many session events have been queued
+    for persistence. Bounded LRU so idle sessions do not accumulate.
+
+    A session this process does not know (restart, another worker, LRU
+    eviction) is seeded from the session document's history_hwm by `load`,
+    and a cached mark is refreshed the same way when the caller sees turns
+    it did not queue (see api.main.get_new_session_history); the persisted
+    mark never lowers a cached one. Turns queued elsewhere but not yet
+    committed may still be re-sent; the overlapping segments are
+    de-duplicated by message index on read.
+    """
+
+    def __init__(self, max_sessions: int = 100000):
+        self._marks: "OrderedDict[str, int]" = OrderedDict()
+        self._max_sessions = max_sessions
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._marks
+
+    def get(self, session_id: str) -> int:
+        mark = self._marks.get(session_id, 0)
+        if session_id in self._marks:
+            self._marks.move_to_end(session_id)
+        return mark
+
+    async def load(self, db, session_id: str, refresh: bool = False) -> int:
+        """
+        Mark for a session, read from the session document's history_hwm
+        when it is not cached or `refresh` is set.
+
+        Args:
+            db: Firestore AsyncClient
+            session_id: Session identifier
+            refresh: Re-read a cached mark (other workers may have moved it)
+        """
+        if session_id in self._marks and not refresh:
+            return self.get(session_id)
+        try:
+            doc = await db.collection('sessions').document(session_id).get(field_paths=['history_hwm'])
+            mark = int((doc.to_dict() or {}).get('history_hwm', 0)) if doc.exists else 0
+        except Exception as e:
+            logger.warning(f"Could not read history watermark of session {session_id}: {e}")
+            return self._marks.get(session_id, 0)
+        self._set(session_id, max(mark, self._marks.get(session_id, 0)))
+        return self._marks[session_id]
+
+    def advance(self, session_id: str, mark: int) -> None:
+        if mark <= self._marks.get(session_id, 0):
+            return
+        self._set(session_id, mark)
+
+    def _set(self, session_id: str, mark: int) -> None:
+        self._marks[session_id] = mark
+        self._marks.move_to_end(session_id)
+        while len(self._marks) > self._max_sessions:
+            self._marks.popitem(last=False)
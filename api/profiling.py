@@ -0,0 +1,196 @@
+"""
+Opt-in per-request profiling.
+
+With settings.enable_profiling on, an agent request is profiled when it
+carries an X-Profile-Token header matching settings.profiling_admin_token,
+or when it is picked by settings.profiling_sample_rate. The whole turn runs
+under pyinstrument's sampling profiler in async mode (awaits are attributed
+to the coroutine that awaited them) and the result is written as a
+speedscope JSON file:
+
+    {profiling_dir}/{session_id}/{turn_id}.speedscope.json
+
+Open the files at https://www.speedscope.app. pyinstrument is imported only
+when a request is actually profiled; with profiling off `profile_turn`
+returns a shared no-op context manager. Without pyinstrument installed no
+request is selected, so no X-Profile-Id is handed out for a missing profile.
+"""
+
+import contextlib
+import hmac
+import importlib.util
+import os
+import random
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from config.settings import settings
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+PROFILE_SUFFIX = ".speedscope.json"
+
+_NOOP_PROFILE = contextlib.nullcontext()
+_SAFE_KEY = re.compile(r"^[A-Za-z0-9_.-]{1,128}$")
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9_.-]")
+_pyinstrument_available: Optional[bool] = None
+
+
+def _safe_key(value: str) -> str:
+    """Path-safe form of a session id."""
+    return _UNSAFE_CHARS.sub("_", value)[:128].lstrip(".") or "_"
+
+
+def _profiler_available() -> bool:
+    """Whether pyinstrument is installed (checked once, without importing it)."""
+    global _pyinstrument_available
+    if _pyinstrument_available is None:
+        _pyinstrument_available = importlib.util.find_spec("pyinstrument") is not None
+        if not _pyinstrument_available and settings.enable_profiling:
+            logger.warning("Profiling is enabled but pyinstrument is not installed; no request will be profiled")
+    return _pyinstrument_available
+
+
+def should_profile(profile_token: Optional[str]) -> bool:
+    """
+    Decide whether to profile this request.
+
+    Args:
+        profile_token: Value of the X-Profile-Token header
+
+    Returns:
+        True if the request should run under the profiler
+    """
+    if not settings.enable_profiling or not _profiler_available():
+        return False
+    if profile_token and settings.profiling_admin_token and hmac.compare_digest(
+        profile_token, settings.profiling_admin_token
+    ):
+        return True
+    rate = settings.profiling_sample_rate
+    return rate > 0 and random.random() < rate
+
+
+class TurnProfile:
+    """
+    Profiles one agent turn and writes it as a speedscope file on exit.
+
+    Use as a (sync) context manager around the turn; it may span awaits and
+    yields of an async generator as long as enter and exit happen in the
+    same task.
+
+    Args:
+        session_id: Session the turn belongs to
+        endpoint: Short endpoint label stored in the turn id
+    """
+
+    def __init__(self, session_id: str, endpoint: str):
+        self.session_key = _safe_key(session_id)
+        self.turn_id = f"{int(time.time() * 1000)}-{endpoint}-{uuid.uuid4().hex[:6]}"
+        self.path: Optional[str] = None
+        self._profiler = None
+
+    @property
+    def profile_id(self) -> str:
+        """Identifier clients can use with the fetch endpoint."""
+        return f"{self.session_key}/{self.turn_id}"
+
+    def __enter__(self) -> "TurnProfile":
+        global _pyinstrument_available
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            _pyinstrument_available = False
+            logger.warning("Profiling requested but pyinstrument is not installed; profiling disabled")
+            return self
+        self._profiler = Profiler(
+            interval=settings.profiling_interval_ms / 1000,
+            async_mode="enabled",
+        )
+        self._profiler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if self._profiler is None:
+            return False
+        try:
+            from pyinstrument.renderers import SpeedscopeRenderer
+            self._profiler.stop()
+            directory = os.path.join(settings.profiling_dir, self.session_key)
+            os.makedirs(directory, exist_ok=True)
+            self.path = os.path.join(directory, self.turn_id + PROFILE_SUFFIX)
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.write(self._profiler.output(renderer=SpeedscopeRenderer()))
+            logger.info(f"Wrote profile {self.profile_id}")
+            _prune(settings.profiling_max_files)
+        except Exception as e:
+            # Never fail the request because of the profiler
+            logger.error(f"Failed to write profile {self.profile_id}: {e}")
+        return False
+
+
+def profile_turn(session_id: str, endpoint: str, enabled: bool):
+    """TurnProfile when `enabled`, otherwise a shared no-op context manager."""
+    return TurnProfile(session_id, endpoint) if enabled else _NOOP_PROFILE
+
+
+def _all_profiles() -> List[Dict[str, Any]]:
+    root = settings.profiling_dir
+    if not os.path.isdir(root):
+        return []
+    profiles = []
+    for session_key in os.listdir(root):
+        directory = os.path.join(root, session_key)
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            if not name.endswith(PROFILE_SUFFIX):
+                continue
+            stat = os.stat(os.path.join(directory, name))
+            profiles.append({
+                'session_id': session_key,
+                'turn_id': name[:-len(PROFILE_SUFFIX)],
+                'size_bytes': stat.st_size,
+                'created_at': stat.st_mtime,
+            })
+    return profiles
+
+
+def list_profiles(session_id: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+    """
+    Stored profiles, newest first.
+
+    Args:
+        session_id: Only profiles for this session
+        limit: Maximum entries returned
+    """
+    profiles = _all_profiles()
+    if session_id is not None:
+        session_key = _safe_key(session_id)
+        profiles = [p for p in profiles if p['session_id'] == session_key]
+    profiles.sort(key=lambda p: p['created_at'], reverse=True)
+    return profiles[:limit]
+
+
+def profile_path(session_id: str, turn_id: str) -> Optional[str]:
+    """Path of a stored profile, or None if it does not exist or the ids are not path-safe."""
+    if not _SAFE_KEY.match(session_id) or not _SAFE_KEY.match(turn_id):
+        return None
+    path = os.path.join(settings.profiling_dir, session_id, turn_id + PROFILE_SUFFIX)
+    return path if os.path.isfile(path) else None
+
+
+def _prune(max_files: int) -> None:
+    """Delete the oldest profiles beyond max_files."""
+    profiles = _all_profiles()
+    if len(profiles) <= max_files:
+        return
+    profiles.sort(key=lambda p: p['created_at'])
+    for p in profiles[:len(profiles) - max_files]:
+        try:
+            os.remove(os.path.join(settings.profiling_dir, p['session_id'], p['turn_id'] + PROFILE_SUFFIX))
+        except OSError:
+            pass
@@ -0,0 +1,183 @@
+"""
+Pre-aggregated partner usage counters.
+
+Session and query counts per partner are maintained at write time as sharded
+counters, so the analytics endpoints read a handful of small documents per
+partner instead of scanning every session.
+
+Layout:
+    partner_rollups/{partner}                          {partner_code, updated_at}
+    partner_rollups/{partner}/partner_shards/{n}       {sessions, queries}
+    partner_rollups/{partner}/partner_daily/{day}_{n}  {date, sessions, queries}
+
+Run `python -m api.rollups` once to seed the totals from existing sessions.
+"""
+
+import asyncio
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.cloud import firestore
+
+from config.settings import settings
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+PARTNER_ROLLUPS_COLLECTION = 'partner_rollups'
+SHARDS_COLLECTION = 'partner_shards'
+DAILY_COLLECTION = 'partner_daily'
+
+# A prepared write: (document reference, data, merge)
+_Write = Tuple[Any, Dict[str, Any], bool]
+
+
+def _partner_doc_id(partner_code: Optional[str]) -> str:
+    """Document id for a partner ('/' is not allowed in Firestore ids)."""
+    return (partner_code or 'unknown').replace('/', '_')
+
+
+def build_rollup_writes(
+    db,
+    partner_code: Optional[str],
+    sessions: int = 0,
+    queries: int = 0,
+    day: Optional[str] = None
+) -> List[_Write]:
+    """
+    Writes that add to a partner's counters; commit them in the same batch as
+    the session writes they describe.
+
+    Args:
+        db: Firestore AsyncClient
+        partner_code: Partner identifier
+        sessions: Sessions to add
+        queries: Queries to add
+        day: UTC day (YYYY-MM-DD) for the daily counter; defaults to today
+
+    Returns:
+        List of (reference, data, merge) writes
+    """
+    if not sessions and not queries:
+        return []
+
+    day = day or datetime.utcnow().strftime('%Y-%m-%d')
+    shard = random.randrange(settings.partner_rollup_shards)
+    partner_ref = db.collection(PARTNER_ROLLUPS_COLLECTION).document(_partner_doc_id(partner_code))
+
+    counters = {
+        'sessions': firestore.Increment(sessions),
+        'queries': firestore.Increment(queries),
+    }
+    return [
+        (partner_ref, {
+            'partner_code': partner_code or 'unknown',
+            'updated_at': firestore.SERVER_TIMESTAMP,
+        }, True),
+        (partner_ref.collection(SHARDS_COLLECTION).document(str(shard)), dict(counters), True),
+        (partner_ref.collection(DAILY_COLLECTION).document(f"{day}_{shard}"), {
+            'date': day,
+            **counters,
+        }, True),
+    ]
+
+
+async def get_partner_rollup(db, partner_code: str, days: int = 0) -> Dict[str, Any]:
+    """
+    Read one partner's totals (and optionally its last `days` days).
+
+    Args:
+        db: Firestore AsyncClient
+        partner_code: Partner identifier
+        days: Number of trailing UTC days to break down (0 = none)
+
+    Returns:
+        Dictionary with total_sessions, total_queries and optional daily list
+    """
+    partner_ref = db.collection(PARTNER_ROLLUPS_COLLECTION).document(_partner_doc_id(partner_code))
+
+    total_sessions = 0
+    total_queries = 0
+    async for shard in partner_ref.collection(SHARDS_COLLECTION).stream():
+        data = shard.to_dict()
+        total_sessions += data.get('sessions', 0)
+        total_queries += data.get('queries', 0)
+
+    result: Dict[str, Any] = {
+        'total_sessions': total_sessions,
+        'total_queries': total_queries,
+    }
+
+    if days > 0:
+        since = (datetime.utcnow() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+        daily: Dict[str, Dict[str, int]] = defaultdict(lambda: {'sessions': 0, 'queries': 0})
+        query = partner_ref.collection(DAILY_COLLECTION).where('date', '>=', since)
+        async for shard in query.stream():
+            data = shard.to_dict()
+            daily[data['date']]['sessions'] += data.get('sessions', 0)
+            daily[data['date']]['queries'] += data.get('queries', 0)
+        result['daily'] = [{'date': d, **daily[d]} for d in sorted(daily)]
+
+    return result
+
+
+async def get_all_partner_rollups(db) -> List[Dict[str, Any]]:
+    """
+    Read every partner's totals with one collection-group query over the shards.
+
+    Returns:
+        List of {partner_code, sessions, queries}
+    """
+    partners: Dict[str, Dict[str, Any]] = {}
+    async for shard in db.collection_group(SHARDS_COLLECTION).stream():
+        partner_id = shard.reference.parent.parent.id
+        stats = partners.setdefault(partner_id, {
+            'partner_code': partner_id,
+            'sessions': 0,
+            'queries': 0,
+        })
+        data = shard.to_dict()
+        stats['sessions'] += data.get('sessions', 0)
+        stats['queries'] += data.get('queries', 0)
+    return list(partners.values())
+
+
+async def rebuild_partner_rollups(db) -> Dict[str, Dict[str, int]]:
+    """
+    Recompute partner totals from the sessions collection (one full scan).
+
+    Totals are written to shard 0 and the other shards are cleared, so run it
+    while no traffic is being written. Daily counters are not backfilled.
+    """
+    totals: Dict[str, Dict[str, int]] = defaultdict(lambda: {'sessions': 0, 'queries': 0})
+    async for doc in db.collection('sessions').stream():
+        data = doc.to_dict()
+        partner_id = _partner_doc_id(data.get('partner_code'))
+        totals[partner_id]['sessions'] += 1
+        totals[partner_id]['queries'] += data.get('query_count', 0)
+
+    for partner_id, counts in totals.items():
+        batch = db.batch()
+        partner_ref = db.collection(PARTNER_ROLLUPS_COLLECTION).document(partner_id)
+        batch.set(partner_ref, {
+            'partner_code': partner_id,
+            'updated_at': firestore.SERVER_TIMESTAMP,
+        }, merge=True)
+        for shard in range(settings.partner_rollup_shards):
+            batch.set(
+                partner_ref.collection(SHARDS_COLLECTION).document(str(shard)),
+                counts if shard == 0 else {'sessions': 0, 'queries': 0}
+            )
+        await batch.commit()
+        logger.info(f"Rebuilt rollup for partner {partner_id}: {counts}")
+
+    return dict(totals)
+
+
+if __name__ == "__main__":
+    from google.cloud.firestore import AsyncClient
+
+    rebuilt = asyncio.run(rebuild_partner_rollups(AsyncClient()))
+    print(f"Rebuilt rollups for {len(rebuilt)} partners")
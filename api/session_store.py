@@ -0,0 +1,722 @@
+"""
+Shared, durable ADK session service.
+
+Sessions live in a store every worker can reach: Firestore in production and
+SQLite as the local stand-in. Each worker keeps recently used sessions in an
+LRU cache; a cache hit costs one small header read to confirm the session
+has not moved on elsewhere, and only events appended since are fetched.
+
+Appends use optimistic concurrency. Every session header carries a version
+(and, in Firestore, its update time); a write only succeeds if the header is
+unchanged since it was read. On a conflict the session is reloaded, the
+event is re-applied on top and the write retried.
+
+Layout (Firestore):
+    adk_sessions/{app}__{user}__{session}          {app_name, user_id, session_id, state,
+                                                    version, event_count, last_update_time}
+    adk_sessions/{app}__{user}__{session}/events/{index:08d}   {index, event}
+
+State is stored per session; `app:`/`user:` prefixed keys are not shared
+across sessions (no agent in this app uses them).
+
+For single-process deployments, BoundedInMemorySessionService keeps
+sessions in memory under a TTL and a byte budget, spilling the coldest to
+local disk.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+from google.api_core import exceptions as gcp_exceptions
+from google.cloud import firestore
+
+from config.settings import settings
+from utils.logger import setup_logger
+from utils.tracing import span
+
+logger = setup_logger(__name__)
+
+SESSIONS_COLLECTION = 'adk_sessions'
+EVENTS_COLLECTION = 'events'
+MAX_APPEND_ATTEMPTS = 3
+
+
+class SessionConflictError(Exception):
+    """The stored session changed since it was read (another writer appended)."""
+
+
+@dataclass
+class SessionHeader:
+    """Session metadata without its events."""
+    app_name: str
+    user_id: str
+    session_id: str
+    state: Dict[str, Any]
+    version: int
+    event_count: int
+    last_update_time: float
+    # Backend-specific precondition for the next write
+    token: Any = None
+
+
+@dataclass
+class _CachedSession:
+    session: Session
+    header: SessionHeader
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+def _session_doc_id(app_name: str, user_id: str, session_id: str) -> str:
+    """Document id for a session ('/' is not allowed in Firestore ids)."""
+    return f"{app_name}__{user_id}__{session_id}".replace('/', '_')
+
+
+def _apply_config(session: Session, config: Optional[GetSessionConfig]) -> Session:
+    """Return the session, or a copy with its events trimmed per `config`."""
+    if config is None:
+        return session
+    events = session.events
+    if config.after_timestamp:
+        events = [e for e in events if e.timestamp >= config.after_timestamp]
+    if config.num_recent_events:
+        events = events[-config.num_recent_events:]
+    return session.model_copy(update={'events': list(events)})
+
+
+# --- Backends ---
+
+class FirestoreSessionBackend:
+    """Sessions in Firestore; preconditions use the header's update time."""
+
+    def __init__(self, db):
+        self._db = db
+
+    def _ref(self, app_name: str, user_id: str, session_id: str):
+        return self._db.collection(SESSIONS_COLLECTION).document(
+            _session_doc_id(app_name, user_id, session_id)
+        )
+
+    @staticmethod
+    def _header(snapshot) -> SessionHeader:
+        data = snapshot.to_dict()
+        return SessionHeader(
+            app_name=data['app_name'],
+            user_id=data['user_id'],
+            session_id=data['session_id'],
+            state=data.get('state') or {},
+            version=data.get('version', 0),
+            event_count=data.get('event_count', 0),
+            last_update_time=data.get('last_update_time', 0.0),
+            token=snapshot.update_time,
+        )
+
+    async def create(self, header: SessionHeader) -> SessionHeader:
+        ref = self._ref(header.app_name, header.user_id, header.session_id)
+        try:
+            result = await ref.create({
+                'app_name': header.app_name,
+                'user_id': header.user_id,
+                'session_id': header.session_id,
+                'state': header.state,
+                'version': header.version,
+                'event_count': 0,
+                'last_update_time': header.last_update_time,
+            })
+        except gcp_exceptions.Conflict:
+            raise ValueError(f"Session {header.session_id} already exists")
+        header.token = result.update_time
+        return header
+
+    async def get_header(self, app_name: str, user_id: str, session_id: str) -> Optional[SessionHeader]:
+        snapshot = await self._ref(app_name, user_id, session_id).get()
+        return self._header(snapshot) if snapshot.exists else None
+
+    async def get_events(self, app_name: str, user_id: str, session_id: str, start: int = 0) -> List[str]:
+        query = self._ref(app_name, user_id, session_id).collection(EVENTS_COLLECTION)\
+                    .where('index', '>=', start).order_by('index')
+        return [doc.to_dict()['event'] async for doc in query.stream()]
+
+    async def append(self, header: SessionHeader, event_json: str, state: Dict[str, Any],
+                     last_update_time: float) -> SessionHeader:
+        ref = self._ref(header.app_name, header.user_id, header.session_id)
+        index = header.event_count
+        batch = self._db.batch()
+        batch.update(ref, {
+            'state': state,
+            'version': firestore.Increment(1),
+            'event_count': index + 1,
+            'last_update_time': last_update_time,
+        }, option=self._db.write_option(last_update_time=header.token))
+        batch.set(ref.collection(EVENTS_COLLECTION).document(f"{index:08d}"), {
+            'index': index,
+            'event': event_json,
+        })
+        try:
+            with span("firestore.append_session_event", event_index=index):
+                results = await batch.commit()
+        except gcp_exceptions.FailedPrecondition:
+            raise SessionConflictError(header.session_id)
+        return SessionHeader(
+            app_name=header.app_name,
+            user_id=header.user_id,
+            session_id=header.session_id,
+            state=state,
+            version=header.version + 1,
+            event_count=index + 1,
+            last_update_time=last_update_time,
+            token=results[0].update_time,
+        )
+
+    async def list_headers(self, app_name: str, user_id: Optional[str] = None) -> List[SessionHeader]:
+        query = self._db.collection(SESSIONS_COLLECTION).where('app_name', '==', app_name)
+        if user_id is not None:
+            query = query.where('user_id', '==', user_id)
+        return [self._header(doc) async for doc in query.stream()]
+
+    async def delete(self, app_name: str, user_id: str, session_id: str) -> None:
+        await self._db.recursive_delete(self._ref(app_name, user_id, session_id))
+
+
+class SqliteSessionBackend:
+    """
+    Sessions in a local SQLite file (WAL mode, so several local worker
+    processes can share it). Preconditions use the version column.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " app_name TEXT, user_id TEXT, session_id TEXT, state TEXT,"
+                " version INTEGER, event_count INTEGER, last_update_time REAL,"
+                " PRIMARY KEY (app_name, user_id, session_id))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                " app_name TEXT, user_id TEXT, session_id TEXT, idx INTEGER, event TEXT,"
+                " PRIMARY KEY (app_name, user_id, session_id, idx))"
+            )
+
+    async def _run(self, fn, *args):
+        def locked():
+            with self._lock:
+                return fn(*args)
+        return await asyncio.to_thread(locked)
+
+    @staticmethod
+    def _header(row) -> SessionHeader:
+        app_name, user_id, session_id, state, version, event_count, last_update_time = row
+        return SessionHeader(app_name, user_id, session_id, json.loads(state), version,
+                             event_count, last_update_time, token=version)
+
+    async def create(self, header: SessionHeader) -> SessionHeader:
+        def insert():
+            try:
+                self._conn.execute(
+                    "INSERT INTO sessions VALUES (?, ?, ?, ?, ?, 0, ?)",
+                    (header.app_name, header.user_id, header.session_id,
+                     json.dumps(header.state, default=str), header.version, header.last_update_time)
+                )
+            except sqlite3.IntegrityError:
+                raise ValueError(f"Session {header.session_id} already exists")
+        await self._run(insert)
+        header.token = header.version
+        return header
+
+    async def get_header(self, app_name: str, user_id: str, session_id: str) -> Optional[SessionHeader]:
+        row = await self._run(lambda: self._conn.execute(
+            "SELECT * FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?",
+            (app_name, user_id, session_id)
+        ).fetchone())
+        return self._header(row) if row else None
+
+    async def get_events(self, app_name: str, user_id: str, session_id: str, start: int = 0) -> List[str]:
+        rows = await self._run(lambda: self._conn.execute(
+            "SELECT event FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? AND idx >= ?"
+            " ORDER BY idx",
+            (app_name, user_id, session_id, start)
+        ).fetchall())
+        return [row[0] for row in rows]
+
+    async def append(self, header: SessionHeader, event_json: str, state: Dict[str, Any],
+                     last_update_time: float) -> SessionHeader:
+        key = (header.app_name, header.user_id, header.session_id)
+        index = header.event_count
+
+        def write():
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                updated = self._conn.execute(
+                    "UPDATE sessions SET state = ?, version = version + 1, event_count = ?,"
+                    " last_update_time = ?"
+                    " WHERE app_name = ? AND user_id = ? AND session_id = ? AND version = ?",
+                    (json.dumps(state, default=str), index + 1, last_update_time, *key, header.version)
+                ).rowcount
+                if not updated:
+                    self._conn.execute("ROLLBACK")
+                    return False
+                self._conn.execute("INSERT INTO events VALUES (?, ?, ?, ?, ?)", (*key, index, event_json))
+                self._conn.execute("COMMIT")
+                return True
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        if not await self._run(write):
+            raise SessionConflictError(header.session_id)
+        return SessionHeader(*key, state, header.version + 1, index + 1, last_update_time,
+                             token=header.version + 1)
+
+    async def list_headers(self, app_name: str, user_id: Optional[str] = None) -> List[SessionHeader]:
+        if user_id is None:
+            sql, args = "SELECT * FROM sessions WHERE app_name = ?", (app_name,)
+        else:
+            sql, args = "SELECT * FROM sessions WHERE app_name = ? AND user_id = ?", (app_name, user_id)
+        rows = await self._run(lambda: self._conn.execute(sql, args).fetchall())
+        return [self._header(row) for row in rows]
+
+    async def delete(self, app_name: str, user_id: str, session_id: str) -> None:
+        def remove():
+            self._conn.execute(
+                "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                (app_name, user_id, session_id)
+            )
+            self._conn.execute(
+                "DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                (app_name, user_id, session_id)
+            )
+        await self._run(remove)
+
+
+# --- Session service ---
+
+class SharedSessionService(BaseSessionService):
+    """
+    ADK session service over a shared backend with a local hot-session cache.
+
+    Args:
+        backend: FirestoreSessionBackend or SqliteSessionBackend
+        cache_size: Sessions kept in this worker's LRU cache
+    """
+
+    def __init__(self, backend, cache_size: int = 1000):
+        self._backend = backend
+        self._cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str, str], _CachedSession]" = OrderedDict()
+        self.conflicts = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Gauges for the session layer."""
+        return {
+            'resident_sessions': len(self._cache),
+            'conflicts': self.conflicts,
+        }
+
+    def _remember(self, key: Tuple[str, str, str], entry: _CachedSession) -> _CachedSession:
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def _build_session(header: SessionHeader, events: List[str]) -> Session:
+        return Session(
+            id=header.session_id,
+            app_name=header.app_name,
+            user_id=header.user_id,
+            state=dict(header.state),
+            events=[Event.model_validate_json(e) for e in events],
+            last_update_time=header.last_update_time,
+        )
+
+    async def _load(self, app_name: str, user_id: str, session_id: str) -> Optional[_CachedSession]:
+        """Return the cached session brought up to date with the store."""
+        key = (app_name, user_id, session_id)
+        header = await self._backend.get_header(app_name, user_id, session_id)
+        if header is None:
+            self._cache.pop(key, None)
+            return None
+
+        entry = self._cache.get(key)
+        if entry is not None and entry.header.version == header.version:
+            self._cache.move_to_end(key)
+            return entry
+
+        if entry is not None and header.event_count >= entry.header.event_count:
+            # Another worker appended: fetch only the new events
+            new_events = await self._backend.get_events(
+                app_name, user_id, session_id, start=entry.header.event_count
+            )
+            entry.session.events.extend(Event.model_validate_json(e) for e in new_events)
+            entry.session.state.clear()
+            entry.session.state.update(header.state)
+            entry.session.last_update_time = header.last_update_time
+            entry.header = header
+            self._cache.move_to_end(key)
+            return entry
+
+        events = await self._backend.get_events(app_name, user_id, session_id)
+        return self._remember(key, _CachedSession(self._build_session(header, events), header))
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = (session_id or "").strip() or str(uuid.uuid4())
+        header = await self._backend.create(SessionHeader(
+            app_name=app_name,
+            user_id=user_id,
+            session_id=session_id,
+            state=dict(state or {}),
+            version=0,
+            event_count=0,
+            last_update_time=time.time(),
+        ))
+        entry = self._remember((app_name, user_id, session_id),
+                               _CachedSession(self._build_session(header, []), header))
+        return entry.session
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        entry = await self._load(app_name, user_id, session_id)
+        if entry is None:
+            return None
+        return _apply_config(entry.session, config)
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        headers = await self._backend.list_headers(app_name, user_id)
+        return ListSessionsResponse(sessions=[self._build_session(h, []) for h in headers])
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        self._cache.pop((app_name, user_id, session_id), None)
+        await self._backend.delete(app_name, user_id, session_id)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+
+        key = (session.app_name, session.user_id, session.id)
+        entry = self._cache.get(key) or await self._load(*key)
+        if entry is None:
+            raise ValueError(f"Session {session.id} not found")
+
+        async with entry.lock:
+            event = await super().append_event(session, event)
+            session.last_update_time = event.timestamp
+            event_json = event.model_dump_json(exclude_none=True)
+
+            for attempt in range(MAX_APPEND_ATTEMPTS):
+                try:
+                    entry.header = await self._backend.append(
+                        entry.header, event_json, dict(session.state), session.last_update_time
+                    )
+                    break
+                except SessionConflictError:
+                    self.conflicts += 1
+                    logger.warning(f"Session {session.id} changed concurrently, retrying append (attempt {attempt + 1})")
+                    await self._rebase(entry, session, event)
+            else:
+                self._cache.pop(key, None)
+                raise SessionConflictError(f"Session {session.id}: append failed after {MAX_APPEND_ATTEMPTS} attempts")
+
+            if session is not entry.session:
+                entry.session.events.append(event)
+                entry.session.state.update(session.state)
+                entry.session.last_update_time = session.last_update_time
+
+        return event
+
+    async def _rebase(self, entry: _CachedSession, session: Session, event: Event) -> None:
+        """Reload the stored session and re-apply `event` on top of it."""
+        header = await self._backend.get_header(session.app_name, session.user_id, session.id)
+        if header is None:
+            raise ValueError(f"Session {session.id} not found")
+        stored = await self._backend.get_events(session.app_name, session.user_id, session.id)
+        fresh = self._build_session(header, stored)
+
+        session.events[:] = fresh.events
+        session.state.clear()
+        session.state.update(fresh.state)
+        if event.actions and event.actions.state_delta:
+            for key, value in event.actions.state_delta.items():
+                if not key.startswith('temp:'):
+                    session.state[key] = value
+        session.events.append(event)
+
+        if session is not entry.session:
+            entry.session = self._build_session(header, stored)
+        entry.header = header
+
+
+@dataclass
+class _ResidentSession:
+    session: Session
+    size_bytes: int
+    last_access: float
+
+
+class BoundedInMemorySessionService(BaseSessionService):
+    """
+    Single-process session service with a bounded memory footprint.
+
+    Sessions idle longer than `ttl_seconds` are dropped. When resident
+    sessions exceed `memory_budget_bytes`, the least recently used ones are
+    written zlib-compressed to `spill_dir` and read back on next access.
+    Sizes are tracked from each session's serialized JSON length, updated
+    per appended event.
+
+    Args:
+        ttl_seconds: Idle time after which a session is discarded
+        memory_budget_bytes: Resident size above which sessions are spilled
+        spill_dir: Directory for spilled sessions (a per-process subdirectory
+                   is used and cleared on startup)
+    """
+
+    def __init__(self, ttl_seconds: float, memory_budget_bytes: int, spill_dir: str):
+        self._ttl = ttl_seconds
+        self._budget = memory_budget_bytes
+        self._spill_dir = os.path.join(spill_dir, str(os.getpid()))
+        shutil.rmtree(self._spill_dir, ignore_errors=True)
+        os.makedirs(self._spill_dir, exist_ok=True)
+
+        # Both ordered by last access, oldest first
+        self._resident: "OrderedDict[Tuple[str, str, str], _ResidentSession]" = OrderedDict()
+        self._spilled: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+        self._resident_bytes = 0
+        self.evicted = 0
+        self.spills = 0
+        self.rehydrations = 0
+
+    def _spill_path(self, key: Tuple[str, str, str]) -> str:
+        digest = hashlib.sha1("\x00".join(key).encode('utf-8')).hexdigest()
+        return os.path.join(self._spill_dir, f"{digest}.json.z")
+
+    def stats(self) -> Dict[str, Any]:
+        """Gauges for the session layer."""
+        return {
+            'resident_sessions': len(self._resident),
+            'resident_bytes': self._resident_bytes,
+            'spilled_sessions': len(self._spilled),
+            'evicted': self.evicted,
+            'spills': self.spills,
+            'rehydrations': self.rehydrations,
+        }
+
+    def _admit(self, key: Tuple[str, str, str], session: Session, size_bytes: int) -> None:
+        previous = self._resident.pop(key, None)
+        if previous is not None:
+            self._resident_bytes -= previous.size_bytes
+        self._resident[key] = _ResidentSession(session, size_bytes, time.monotonic())
+        self._resident_bytes += size_bytes
+
+    def _touch(self, key: Tuple[str, str, str]) -> _ResidentSession:
+        entry = self._resident[key]
+        entry.last_access = time.monotonic()
+        self._resident.move_to_end(key)
+        return entry
+
+    async def _maintain(self) -> None:
+        """Drop idle sessions, then spill the coldest ones until under budget."""
+        cutoff = time.monotonic() - self._ttl
+        while self._resident:
+            key, entry = next(iter(self._resident.items()))
+            if entry.last_access >= cutoff:
+                break
+            self._resident.popitem(last=False)
+            self._resident_bytes -= entry.size_bytes
+            self.evicted += 1
+
+        expired = []
+        while self._spilled:
+            key, last_access = next(iter(self._spilled.items()))
+            if last_access >= cutoff:
+                break
+            self._spilled.popitem(last=False)
+            expired.append(self._spill_path(key))
+            self.evicted += 1
+        if expired:
+            await asyncio.to_thread(_remove_files, expired)
+
+        while self._resident_bytes > self._budget and len(self._resident) > 1:
+            key, entry = self._resident.popitem(last=False)
+            self._resident_bytes -= entry.size_bytes
+            payload = zlib.compress(entry.session.model_dump_json().encode('utf-8'))
+            await asyncio.to_thread(_write_file, self._spill_path(key), payload)
+            self._spilled[key] = entry.last_access
+            self.spills += 1
+
+    async def _get_resident(self, key: Tuple[str, str, str]) -> Optional[_ResidentSession]:
+        if key in self._resident:
+            return self._touch(key)
+        if key not in self._spilled:
+            return None
+
+        path = self._spill_path(key)
+        data = await asyncio.to_thread(_read_file, path)
+        del self._spilled[key]
+        if data is None:
+            return None
+        raw = zlib.decompress(data)
+        self._admit(key, Session.model_validate_json(raw), len(raw))
+        await asyncio.to_thread(_remove_files, [path])
+        self.rehydrations += 1
+        return self._resident[key]
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = (session_id or "").strip() or str(uuid.uuid4())
+        key = (app_name, user_id, session_id)
+        if key in self._resident or key in self._spilled:
+            raise ValueError(f"Session {session_id} already exists")
+
+        session = Session(
+            id=session_id,
+            app_name=app_name,
+            user_id=user_id,
+            state=dict(state or {}),
+            last_update_time=time.time(),
+        )
+        self._admit(key, session, len(session.model_dump_json()))
+        await self._maintain()
+        return session
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        entry = await self._get_resident((app_name, user_id, session_id))
+        await self._maintain()
+        if entry is None:
+            return None
+        return _apply_config(entry.session, config)
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        sessions = []
+        for (app, user, session_id), entry in self._resident.items():
+            if app == app_name and (user_id is None or user == user_id):
+                sessions.append(entry.session.model_copy(update={'events': []}))
+        for app, user, session_id in self._spilled:
+            if app == app_name and (user_id is None or user == user_id):
+                sessions.append(Session(id=session_id, app_name=app, user_id=user))
+        return ListSessionsResponse(sessions=sessions)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        key = (app_name, user_id, session_id)
+        entry = self._resident.pop(key, None)
+        if entry is not None:
+            self._resident_bytes -= entry.size_bytes
+        if self._spilled.pop(key, None) is not None:
+            await asyncio.to_thread(_remove_files, [self._spill_path(key)])
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+
+        key = (session.app_name, session.user_id, session.id)
+        event = await super().append_event(session, event)
+        session.last_update_time = event.timestamp
+        event_bytes = len(event.model_dump_json())
+
+        if key in self._resident and self._resident[key].session is session:
+            entry = self._touch(key)
+            entry.size_bytes += event_bytes
+            self._resident_bytes += event_bytes
+        else:
+            # The caller's copy was spilled or evicted mid-turn; it is the
+            # most recent version, so it becomes the resident one again
+            if self._spilled.pop(key, None) is not None:
+                await asyncio.to_thread(_remove_files, [self._spill_path(key)])
+            self._admit(key, session, len(session.model_dump_json()))
+
+        await self._maintain()
+        return event
+
+
+def _write_file(path: str, payload: bytes) -> None:
+    with open(path, 'wb') as f:
+        f.write(payload)
+
+
+def _read_file(path: str) -> Optional[bytes]:
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _remove_files(paths: List[str]) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def create_session_service(db=None) -> BaseSessionService:
+    """
+    Build the session service selected by settings.session_service.
+
+    Args:
+        db: Firestore AsyncClient to reuse for the "firestore" service
+
+    Returns:
+        "inmemory": BoundedInMemorySessionService (single process only)
+        "firestore": SharedSessionService over Firestore
+        "sqlite": SharedSessionService over settings.session_sqlite_path
+    """
+    kind = settings.session_service.lower()
+    if kind == "firestore":
+        backend = FirestoreSessionBackend(db or firestore.AsyncClient())
+    elif kind == "sqlite":
+        backend = SqliteSessionBackend(settings.session_sqlite_path)
+    else:
+        return BoundedInMemorySessionService(
+            ttl_seconds=settings.session_timeout_minutes * 60,
+            memory_budget_bytes=settings.session_memory_budget_mb * 1024 * 1024,
+            spill_dir=settings.session_spill_dir,
+        )
+
+    logger.info(f"Using shared {kind} session service")
+    return SharedSessionService(backend, cache_size=settings.session_cache_size)
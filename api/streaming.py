@@ -0,0 +1,104 @@
+"""
+Delta tracking for SSE answer streaming.
+
+In SSE mode ADK yields `partial=True` events carrying only the new text of the
+current model response, followed by one `partial=False` event with that
+response's full text. A turn can span several model responses (text before
+and after a tool call), so the tracker keeps per-response bookkeeping and
+only ever looks at the incoming chunk, never at the whole answer.
+"""
+
+from typing import List, Optional
+
+
+class StreamDeltaTracker:
+    """
+    Turns a sequence of partial/snapshot chunks into the text not yet sent.
+
+    The answer is kept as a list of pieces and joined once at the end, and
+    every `feed` costs O(len(chunk)).
+    """
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._length = 0
+        # Pieces emitted for the current model response
+        self._segment_parts: List[str] = []
+        self._segment_length = 0
+
+    @property
+    def length(self) -> int:
+        """Number of characters emitted so far."""
+        return self._length
+
+    @property
+    def text(self) -> str:
+        """Everything emitted so far."""
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    def _segment_is_prefix_of(self, chunk: str) -> bool:
+        """Compare the current response against the start of `chunk` piece by piece, without joining."""
+        offset = 0
+        for piece in self._segment_parts:
+            if not chunk.startswith(piece, offset):
+                return False
+            offset += len(piece)
+        return True
+
+    def _append(self, delta: str) -> str:
+        if delta:
+            self._parts.append(delta)
+            self._length += len(delta)
+            self._segment_parts.append(delta)
+            self._segment_length += len(delta)
+        return delta
+
+    def _end_segment(self):
+        self._segment_parts = []
+        self._segment_length = 0
+
+    def feed(self, chunk: str, partial: Optional[bool] = None) -> str:
+        """
+        Record a chunk and return the part of it that has not been sent yet.
+
+        Args:
+            chunk: Text carried by the event
+            partial: The event's `partial` flag; True for a streamed delta,
+                     False for the closing snapshot of a model response, None
+                     when the event does not say (falls back to length
+                     bookkeeping against the current response)
+
+        Returns:
+            New text to emit (empty string when there is none)
+        """
+        if not chunk:
+            return ""
+
+        if partial:
+            return self._append(chunk)
+
+        segment_length = self._segment_length
+
+        if partial is False:
+            # Closing snapshot: only its tail beyond what was streamed is new.
+            # The next event starts a new model response.
+            delta = chunk[segment_length:] if len(chunk) > segment_length else ""
+            self._append(delta)
+            self._end_segment()
+            return delta
+
+        # No metadata: a chunk at least as long as the current response that
+        # starts with it is a snapshot; anything else is a delta. The prefix
+        # check is bounded by len(chunk).
+        if segment_length and len(chunk) >= segment_length and self._segment_is_prefix_of(chunk):
+            delta = chunk[segment_length:]
+            if delta:
+                self._parts.append(delta)
+                self._length += len(delta)
+            # The snapshot now is the whole response so far
+            self._segment_parts = [chunk]
+            self._segment_length = len(chunk)
+            return delta
+        return self._append(chunk)
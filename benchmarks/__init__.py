@@ -0,0 +1 @@
+"""Micro-benchmarks for hot paths (run modules with `python -m benchmarks.<name>`)."""
@@ -0,0 +1,173 @@
+"""
+Benchmark the scheme filter and ranking pipeline on a synthetic corpus.
+
+Each stage runs on its own over the full candidate list (not cascaded), so
+its numbers do not depend on how much earlier stages dropped:
+
+    state_filter         _apply_strict_state_filter
+    support_intent       _apply_support_intent_filter
+    amount               filter_and_rank_by_amount
+    new_business_only    filter_new_business_only_schemes
+    relevance_ranking    rank_schemes_by_relevance
+    classify_type        classify_scheme_type (per scheme)
+
+Reported per stage and candidate count: best time per call, microseconds
+per candidate, candidates per second, and peak traced memory and allocated
+blocks for one call (tracemalloc, measured separately from the timings).
+
+Regression mode: `--save-baseline` records us/candidate and peak memory;
+`--check` compares a fresh run against it and exits with status 1 when
+any stage is slower or allocates more than `--threshold` (default 25%).
+Baselines are machine-specific, so record one on the machine you check on.
+
+Usage:
+    python -m benchmarks.bench_filter_pipeline [--sizes 30,300,3000,10000] [--repeat 5]
+    python -m benchmarks.bench_filter_pipeline --save-baseline benchmarks/filter_baseline.json
+    python -m benchmarks.bench_filter_pipeline --check benchmarks/filter_baseline.json [--threshold 0.25]
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks.corpus import make_profiles, make_schemes
+from tools.amount_filter import filter_and_rank_by_amount, filter_new_business_only_schemes
+from tools.datastore_tools import _apply_strict_state_filter, _apply_support_intent_filter
+from utils.scheme_ranking import classify_scheme_type, rank_schemes_by_relevance
+
+Stage = Callable[[List[Dict[str, Any]], str], Any]
+
+# Amount queries exercise both the filter and the supplementing path
+_AMOUNT_QUERY = "need loan above 25 lakh"
+
+STAGES: Dict[str, Stage] = {
+    "state_filter": lambda schemes, profile: _apply_strict_state_filter(schemes, "Maharashtra"),
+    "support_intent": lambda schemes, profile: _apply_support_intent_filter(schemes, "loan"),
+    "amount": lambda schemes, profile: filter_and_rank_by_amount(schemes, _AMOUNT_QUERY, min_results=3),
+    "new_business_only": lambda schemes, profile: filter_new_business_only_schemes(schemes),
+    "relevance_ranking": lambda schemes, profile: rank_schemes_by_relevance(
+        schemes, profile, {"query": "loan for textile unit", "state": "Maharashtra", "loan_amount": "25 lakh"}
+    ),
+    "classify_type": lambda schemes, profile: [classify_scheme_type(s) for s in schemes],
+}
+
+
+def time_stage(stage: Stage, schemes: List[Dict[str, Any]], profile: str, repeat: int,
+               min_batch_seconds: float = 0.05) -> float:
+    """Best seconds per call, batching fast calls so each sample lasts at least min_batch_seconds."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            stage(schemes, profile)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_batch_seconds or loops >= 1 << 16:
+            break
+        loops *= 2
+
+    best = elapsed / loops
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            stage(schemes, profile)
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+
+def measure_allocations(stage: Stage, schemes: List[Dict[str, Any]], profile: str) -> Tuple[int, int]:
+    """(peak bytes, allocated blocks still referenced after the call incl. result) for one call."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        result = stage(schemes, profile)
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # Ignore tracemalloc's own bookkeeping
+    own = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    after, before = after.filter_traces(own), before.filter_traces(own)
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    del result
+    return peak, blocks
+
+
+def run(sizes: List[int], repeat: int) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Results keyed by stage, then candidate count."""
+    profile = make_profiles(1)[0]
+    corpora = {n: make_schemes(n) for n in sizes}
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+
+    print(f"{'stage':<20} {'n':>6} {'ms/call':>9} {'us/cand':>8} {'cand/s':>11} {'peak KB':>9} {'blocks':>7}")
+    for name, stage in STAGES.items():
+        for n, schemes in corpora.items():
+            seconds = time_stage(stage, schemes, profile, repeat)
+            peak, blocks = measure_allocations(stage, schemes, profile)
+            entry = {
+                "us_per_candidate": seconds * 1e6 / n,
+                "candidates_per_second": n / seconds,
+                "peak_kb": peak / 1024,
+                "blocks": blocks,
+            }
+            results.setdefault(name, {})[str(n)] = entry
+            print(f"{name:<20} {n:>6} {seconds * 1000:>9.3f} {entry['us_per_candidate']:>8.2f} "
+                  f"{entry['candidates_per_second']:>11.0f} {entry['peak_kb']:>9.1f} {blocks:>7}")
+    return results
+
+
+def check(results: Dict[str, Dict[str, Dict[str, float]]], baseline_path: str, threshold: float) -> List[str]:
+    """Stage/size pairs that regressed beyond the threshold."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+
+    failures = []
+    for name, by_size in results.items():
+        for size, entry in by_size.items():
+            base = baseline.get(name, {}).get(size)
+            if base is None:
+                continue
+            for metric in ("us_per_candidate", "peak_kb"):
+                if base[metric] > 0 and entry[metric] > base[metric] * (1 + threshold):
+                    failures.append(
+                        f"{name} n={size} {metric}: {entry[metric]:.2f} vs baseline {base[metric]:.2f} "
+                        f"(+{(entry[metric] / base[metric] - 1) * 100:.0f}%)"
+                    )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="30,300,3000,10000", help="Comma-separated candidate counts")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--check", metavar="PATH")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown/growth as a fraction")
+    args = parser.parse_args()
+
+    # The stages log every call at INFO; keep logging out of the measurement
+    logging.disable(logging.CRITICAL)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results = run(sizes, args.repeat)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"created_at": time.time(), "python": sys.version.split()[0], "results": results}, f, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if args.check:
+        failures = check(results, args.check, args.threshold)
+        if failures:
+            print(f"\n{len(failures)} regression(s) beyond {args.threshold:.0%}:")
+            for failure in failures:
+                print(f"  {failure}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%} against {args.check}")
+
+
+if __name__ == "__main__":
+    main()
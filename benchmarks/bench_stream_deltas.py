@@ -0,0 +1,101 @@
+"""
+Benchmark SSE delta tracking on long synthetic streams.
+
+Compares StreamDeltaTracker against the previous accumulate-and-compare
+deduplication on a 10k-token answer, streamed both as ADK emits it
+(partial deltas plus a closing snapshot) and as growing snapshots with no
+metadata.
+
+Usage:
+    python -m benchmarks.bench_stream_deltas [--tokens 10000] [--repeat 3]
+"""
+
+import argparse
+import random
+import time
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from api.streaming import StreamDeltaTracker
+
+Chunk = Tuple[str, Optional[bool]]
+
+
+def make_tokens(count: int, seed: int = 7) -> List[str]:
+    """Synthetic answer tokens (words with the odd newline)."""
+    rng = random.Random(seed)
+    words = ["scheme", "loan", "subsidy", "MSME", "eligibility", "apply", "portal",
+             "interest", "collateral", "women", "entrepreneur", "Karnataka", "₹10 lakh"]
+    return [(" " if rng.random() > 0.05 else "\n") + rng.choice(words) for _ in range(count)]
+
+
+def partial_stream(tokens: List[str]) -> List[Chunk]:
+    """ADK SSE shape: one partial event per token, then the full snapshot."""
+    return [(t, True) for t in tokens] + [("".join(tokens), False)]
+
+
+def snapshot_stream(tokens: List[str], every: int = 50) -> List[Chunk]:
+    """Growing snapshots without metadata, interleaved with raw deltas."""
+    chunks: List[Chunk] = []
+    text = ""
+    for i, token in enumerate(tokens, 1):
+        text += token
+        chunks.append((token, None) if i % every else (text, None))
+    return chunks
+
+
+def run_tracker(chunks: Iterable[Chunk]) -> str:
+    tracker = StreamDeltaTracker()
+    for chunk, partial in chunks:
+        tracker.feed(chunk, partial)
+    return tracker.text
+
+
+def run_legacy(chunks: Iterable[Chunk]) -> str:
+    """The deduplication previously inlined in agent_search_answer_stream."""
+    accumulated_text = ""
+    for chunk_text, _ in chunks:
+        if chunk_text == accumulated_text:
+            continue
+        if len(chunk_text) > len(accumulated_text) and chunk_text.startswith(accumulated_text):
+            accumulated_text = chunk_text
+            continue
+        if len(accumulated_text) > 50 and accumulated_text[-50:] in chunk_text:
+            overlap_idx = chunk_text.find(accumulated_text[-50:])
+            if overlap_idx != -1:
+                potential_new_start = overlap_idx + 50
+                if potential_new_start < len(chunk_text):
+                    accumulated_text += chunk_text[potential_new_start:]
+        else:
+            accumulated_text += chunk_text
+    return accumulated_text
+
+
+def timed(fn: Callable[[List[Chunk]], str], chunks: List[Chunk], repeat: int) -> Tuple[float, str]:
+    best = float("inf")
+    result = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(chunks)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tokens = make_tokens(args.tokens)
+    expected = "".join(tokens)
+
+    print(f"{'stream':<10} {'impl':<8} {'chunks':>7} {'best ms':>9} {'us/chunk':>9}  correct")
+    for name, chunks in (("partial", partial_stream(tokens)), ("snapshot", snapshot_stream(tokens))):
+        for impl, fn in (("tracker", run_tracker), ("legacy", run_legacy)):
+            seconds, result = timed(fn, chunks, args.repeat)
+            print(f"{name:<10} {impl:<8} {len(chunks):>7} {seconds * 1000:>9.2f} "
+                  f"{seconds * 1e6 / len(chunks):>9.2f}  {result == expected}")
+
+
+if __name__ == "__main__":
+    main()
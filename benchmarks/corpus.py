@@ -0,0 +1,221 @@
+"""
+Synthetic scheme corpus and user profiles for benchmarks and harnesses.
+
+Records follow the shape DatastoreClient._parse_document produces for the
+MSME datastore (name, description, benefit_summary, benefit list,
+eligibility, scheme_type, nameOfState, serviceType, score), with a mix of
+loan/subsidy/training/marketing schemes, central and state schemes, amounts
+from thousands to crores, new-business-only schemes and the odd
+metadata/empty record, so every filter stage has something to keep and
+something to drop.
+"""
+
+import random
+from typing import Any, Dict, List, Optional
+
+STATES = [
+    "Maharashtra", "Karnataka", "Tamil Nadu", "Kerala", "Gujarat", "Rajasthan",
+    "Uttar Pradesh", "Madhya Pradesh", "Bihar", "West Bengal", "Odisha", "Punjab",
+]
+
+SECTORS = ["textile", "food processing", "handicraft", "leather", "electronics", "auto components",
+           "dairy", "bakery", "printing", "furniture", "garment export", "pottery"]
+
+# (service type, name stems, benefit templates)
+_KINDS = {
+    "loan": (
+        "Credit Support",
+        ["Credit Guarantee", "Term Loan", "Working Capital Loan", "Mudra Loan", "Subordinate Debt"],
+        ["Collateral-free term loan up to Rs {amount} for {sector} units",
+         "Working capital credit up to ₹{amount} with guarantee cover",
+         "Loans from Rs 50,000 to Rs {amount} at concessional interest"],
+    ),
+    "subsidy": (
+        "Subsidy",
+        ["Capital Subsidy", "Interest Subvention", "Technology Upgradation Fund", "Incentive Scheme"],
+        ["Capital subsidy of 25% on machinery, maximum ₹{amount}",
+         "Interest subsidy reimbursement up to Rs {amount} per year",
+         "Grant of up to {amount} for technology upgradation"],
+    ),
+    "training": (
+        "Skill Development",
+        ["Entrepreneurship Development", "Skill Upgradation", "Incubation Support"],
+        ["Free training and mentoring for {sector} entrepreneurs",
+         "Capacity building workshops with stipend of Rs {amount}"],
+    ),
+    "marketing": (
+        "Marketing Assistance",
+        ["Market Access", "Export Promotion", "Trade Fair Assistance", "Packaging Support"],
+        ["Reimbursement of trade fair and export costs up to ₹{amount}",
+         "Branding and packaging support for e-commerce listing"],
+    ),
+}
+
+_AMOUNTS = ["50,000", "2 lakh", "5 lakh", "10 lakh", "15 lakh", "25 lakh", "50 lakh",
+            "1 crore", "2 crore", "5 crore"]
+_AMOUNT_LAKH = {"50,000": 0.5, "2 lakh": 2, "5 lakh": 5, "10 lakh": 10, "15 lakh": 15, "25 lakh": 25,
+                "50 lakh": 50, "1 crore": 100, "2 crore": 200, "5 crore": 500}
+
+_GOLDEN_QUERIES = {
+    "loan": "loan for {sector} business",
+    "subsidy": "subsidy for {sector} machinery",
+    "training": "training for {sector}",
+    "marketing": "export marketing support for {sector}",
+}
+
+
+def make_schemes(count: int, seed: int = 11) -> List[Dict[str, Any]]:
+    """
+    Generate `count` scheme records.
+
+    Args:
+        count: Number of records
+        seed: RNG seed (same seed, same corpus)
+    """
+    rng = random.Random(seed)
+    schemes = []
+    for i in range(count):
+        kind = rng.choice(list(_KINDS))
+        service_type, stems, templates = _KINDS[kind]
+        sector = rng.choice(SECTORS)
+        amount = rng.choice(_AMOUNTS)
+        is_central = rng.random() < 0.5
+
+        if is_central:
+            prefix = rng.choice(["Pradhan Mantri", "National", "PM", "Central"])
+            states: Any = "All India" if rng.random() < 0.8 else rng.sample(STATES, 3)
+            scheme_type = rng.choice(["Central Sector Scheme", "Centrally Sponsored Scheme"])
+        else:
+            state = rng.choice(STATES)
+            prefix = state
+            states = [state] if rng.random() < 0.7 else ", ".join(rng.sample(STATES, 2) + [state])
+            scheme_type = rng.choice(["State Sector Scheme", "State Scheme", ""])
+
+        name = f"{prefix} {rng.choice(stems)} for {sector.title()} {i}"
+        benefit = rng.choice(templates).format(amount=amount, sector=sector)
+        eligibility = "Existing micro and small enterprises with Udyam registration"
+        if rng.random() < 0.15:
+            eligibility = "First generation entrepreneurs setting up new enterprise (greenfield)"
+        if kind == "loan" and rng.random() < 0.1:
+            name = f"PMEGP Employment Generation Programme {i}"
+
+        scheme = {
+            "id": f"scheme-{i:05d}",
+            "name": name,
+            "description": f"{benefit}. Supports {sector} businesses in {prefix}.",
+            "benefit_summary": benefit,
+            "benefit": [benefit, f"Handholding support for {sector} units"],
+            "eligibility": eligibility,
+            "scheme_type": scheme_type,
+            "nameOfState": states,
+            "serviceType": service_type,
+            "score": round(rng.uniform(0.1, 1.0), 3),
+        }
+        # A few records the invalid-record filter must drop
+        if rng.random() < 0.02:
+            scheme["name"] = ""
+        schemes.append(scheme)
+    return schemes
+
+
+def make_profiles(count: int = 8, seed: int = 5) -> List[str]:
+    """User profile texts in the shape the MSME agent passes as user_profile."""
+    rng = random.Random(seed)
+    constitutions = ["private limited company", "proprietorship", "partnership", "LLP", "one person company"]
+    profiles = []
+    for i in range(count):
+        state = rng.choice(STATES)
+        activities = ", ".join(rng.sample(SECTORS, 2))
+        parts = [
+            f"The user is a {rng.choice(constitutions)} based in {state} engaged in {activities} and offering services.",
+            f"Business name Unit {i} Enterprises.",
+        ]
+        if rng.random() < 0.6:
+            parts.append("GSTIN: 27ABCDE1234F1Z5.")
+        if rng.random() < 0.6:
+            parts.append("Udyam: UDYAM-MH-12-0012345, existing business operating since 2015.")
+        if rng.random() < 0.4:
+            parts.append("The owner is a woman entrepreneur.")
+        if rng.random() < 0.3:
+            parts.append("Has availed a Mudra loan earlier.")
+        parts.append(f"Sells products across categories such as {activities}.")
+        profiles.append(" ".join(parts))
+    return profiles
+
+
+def make_queries(count: int = 8, seed: int = 3) -> List[str]:
+    """Short user queries, half of them with an amount requirement."""
+    rng = random.Random(seed)
+    templates = ["loan for {sector} business", "need {amount} loan for {sector} unit",
+                 "subsidy for {sector} machinery", "loan above {amount}",
+                 "training for {sector}", "export marketing support for {sector}",
+                 "working capital up to {amount}", "schemes for women in {sector}"]
+    return [rng.choice(templates).format(sector=rng.choice(SECTORS), amount=rng.choice(_AMOUNTS))
+            for _ in range(count)]
+
+
+def _max_amount_lakh(scheme: Dict[str, Any]) -> Optional[float]:
+    """Largest amount (in lakh) named in a generated scheme's benefit, if any."""
+    text = scheme.get("benefit_summary", "")
+    found = [(text.rfind(a), a) for a in _AMOUNTS if a in text]
+    return _AMOUNT_LAKH[max(found)[1]] if found else None
+
+
+def _applies_to_state(scheme: Dict[str, Any], state: str) -> bool:
+    states = scheme.get("nameOfState")
+    if isinstance(states, list):
+        return state in states
+    return states == "All India" or state in str(states)
+
+
+def make_golden_set(schemes: List[Dict[str, Any]], count: int = 40, seed: int = 7) -> List[Dict[str, Any]]:
+    """
+    Golden (profile, query, expected schemes) cases for a generated corpus.
+
+    A case asks for one support type in one sector and state, as an existing
+    business; the expected schemes are every valid scheme of that type and
+    sector available in the state (cases with 1-3 such schemes are kept).
+    About a third of the loan cases also ask for an amount 15% above the
+    smallest expected scheme's maximum, which the amount filter passes only
+    with a tolerance of 15% or more.
+
+    Args:
+        schemes: Corpus from make_schemes
+        count: Maximum number of cases
+        seed: RNG seed for case selection
+    """
+    rng = random.Random(seed)
+    kind_by_service = {service_type: kind for kind, (service_type, _, _) in _KINDS.items()}
+    cases = []
+    for kind, template in _GOLDEN_QUERIES.items():
+        for sector in SECTORS:
+            for state in STATES:
+                expected = [
+                    sc for sc in schemes
+                    if sc["name"]
+                    and kind_by_service.get(sc["serviceType"]) == kind
+                    and sector.title() in sc["name"]
+                    and _applies_to_state(sc, state)
+                    # The profile is an existing business, so new-business-only schemes never qualify
+                    and not sc["name"].startswith("PMEGP")
+                    and "greenfield" not in sc["eligibility"]
+                ]
+                if not 1 <= len(expected) <= 3:
+                    continue
+                args: Dict[str, Any] = {"state": state}
+                amounts = [_max_amount_lakh(sc) for sc in expected]
+                if kind == "loan" and None not in amounts and rng.random() < 0.35:
+                    args["loan_amount"] = f"{round(min(amounts) * 1.15, 2)} lakh"
+                cases.append({
+                    "id": f"{kind}-{sector.replace(' ', '-')}-{state.replace(' ', '-')}".lower(),
+                    "tool": "search_msme_schemes",
+                    "query": template.format(sector=sector),
+                    "profile": (
+                        f"The user is a proprietorship based in {state} engaged in {sector}. "
+                        f"Udyam: UDYAM-XX-00-0000001, existing business operating since 2016."
+                    ),
+                    "args": args,
+                    "expected": [sc["id"] for sc in expected],
+                })
+    rng.shuffle(cases)
+    return sorted(cases[:count], key=lambda c: c["id"])
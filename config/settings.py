@@ -52,13 +52,70 @@ class Settings(BaseSettings):
     msme_datastore_id: str = Field(..., description="MSME schemes datastore ID")
     msme_unstructured_id: str = Field(..., description="MSME schemes unstructured ID")
     datastore_location: str = Field(default="global", description="Datastore location")
+    hybrid_search_timeout_seconds: float = Field(
+        default=10.0,
+        gt=0,
+        le=60.0,
+        description="Overall deadline for the parallel structured/unstructured MSME search"
+    )
+    
+    # Scheme-name index used by the Master Agent's routing step
+    enable_scheme_index: bool = Field(default=True)
+    scheme_index_snapshot_path: Optional[str] = Field(
+        default=None,
+        description="Optional JSON file {agent_name: [scheme names]} used instead of listing the datastores"
+    )
+    scheme_index_refresh_minutes: int = Field(default=360, ge=5, le=10080)
+    routing_timeout_seconds: float = Field(
+        default=8.0,
+        gt=0,
+        le=60.0,
+        description="Deadline for the datastore fallback in check_scheme_and_route"
+    )
     
     # Session Configuration
     session_service: str = Field(
         default="inmemory",
-        description="Session service type: inmemory or firestore"
+        description="Session service type: inmemory, firestore (shared across workers) or sqlite (local shared file)"
     )
     session_timeout_minutes: int = Field(default=30, ge=5, le=1440)
+    session_memory_budget_mb: int = Field(
+        default=256,
+        ge=1,
+        description="In-memory sessions above this size are spilled to disk (inmemory service)"
+    )
+    session_spill_dir: str = Field(
+        default=".sessions/spill",
+        description="Directory for spilled in-memory sessions"
+    )
+    session_sqlite_path: str = Field(
+        default=".sessions/adk_sessions.db",
+        description="SQLite file used when session_service is sqlite"
+    )
+    session_cache_size: int = Field(
+        default=1000,
+        ge=0,
+        description="Hot sessions cached per worker by the shared session service"
+    )
+    
+    # Write-behind Firestore persistence
+    persistence_queue_size: int = Field(default=10000, ge=100)
+    persistence_batch_max_turns: int = Field(
+        default=50,
+        ge=1,
+        le=150,
+        description="Turns coalesced into one batched commit (keeps a batch under Firestore's 500-write limit)"
+    )
+    persistence_flush_interval_seconds: float = Field(default=0.05, ge=0.0, le=5.0)
+    persistence_max_retries: int = Field(default=5, ge=0, le=20)
+    persistence_retry_base_seconds: float = Field(default=0.5, gt=0, le=30.0)
+    persistence_shutdown_timeout_seconds: float = Field(default=10.0, gt=0, le=120.0)
+    partner_rollup_shards: int = Field(
+        default=10,
+        ge=1,
+        le=100,
+        description="Shards per partner counter (each shard sustains ~1 write/s)"
+    )
     
     # API Server Configuration
     api_host: str = Field(default="0.0.0.0")
@@ -79,6 +136,16 @@ class Settings(BaseSettings):
         default="json",
         description="Log format: json or text"
     )
+    log_queue_size: int = Field(
+        default=10000,
+        ge=0,
+        description="Max log records buffered for the background writer (0 = unbounded); records beyond it are dropped"
+    )
+    log_sample_every: int = Field(
+        default=100,
+        ge=1,
+        description="Keep 1 in N records from sampled high-volume loggers (per stream chunk, per scheme)"
+    )
     
     # Feature Flags
     enable_context_enrichment: bool = Field(default=True)
@@ -94,6 +161,16 @@ class Settings(BaseSettings):
     # Example: user asks 15L, tolerance 0.20 => accept schemes >= 12L.
     loan_amount_lower_tolerance: float = Field(default=0.20, ge=0.0, le=0.50)
 
+    # Candidates fetched from the MSME datastore before filtering
+    # ("more schemes" requests size their fetch from the excluded list instead).
+    msme_fetch_count: int = Field(default=15, ge=1, le=100)
+    msme_amount_fetch_count: int = Field(default=25, ge=1, le=100)
+
+    # Discovery Engine query expansion (AUTO) improves recall for short queries like "loan".
+    enable_query_expansion: bool = Field(default=True)
+    # Drop schemes whose support type (loan/subsidy/training/marketing) contradicts the query's.
+    enable_support_intent_filter: bool = Field(default=True)
+
     # Progressive Disclosure Settings
     schemes_per_page: int = Field(default=3, ge=1, le=10)
     max_scheme_pages: int = Field(default=5, ge=1, le=20)
@@ -107,10 +184,123 @@ class Settings(BaseSettings):
     # Rate Limiting
     rate_limit_per_minute: int = Field(default=60, ge=1)
     rate_limit_per_hour: int = Field(default=500, ge=1)
+    enable_rate_limiting: bool = Field(
+        default=True,
+        description="Enforce per-partner rate limits and in-flight caps on agent endpoints"
+    )
+    max_in_flight_per_partner: int = Field(
+        default=8,
+        ge=1,
+        description="Concurrent agent runs allowed per partner"
+    )
+    max_in_flight_global: int = Field(
+        default=64,
+        ge=1,
+        description="Concurrent agent runs allowed per worker across all partners"
+    )
+    admission_max_partners: int = Field(
+        default=100,
+        ge=1,
+        description="Partners with their own rate-limit buckets before further partners share an 'other' bucket"
+    )
+    
+    # Batch answers
+    batch_max_items: int = Field(default=1000, ge=1)
+    batch_max_concurrency: int = Field(
+        default=4,
+        ge=1,
+        le=32,
+        description="Items of one batch request run concurrently"
+    )
+    batch_max_in_flight_global: int = Field(
+        default=32,
+        ge=1,
+        description="Batch turns only start while total in-flight runs are below this (headroom for interactive traffic)"
+    )
+    batch_max_in_flight_per_partner: int = Field(
+        default=8,
+        ge=1,
+        description="Concurrent batch turns per partner across its batch requests (separate from interactive limits)"
+    )
     
     # Monitoring
     enable_cloud_trace: bool = Field(default=False)
+    trace_exporter: str = Field(
+        default="cloud",
+        description="Span exporter when tracing is enabled: cloud, otlp, console or file"
+    )
+    trace_file_path: str = Field(
+        default="traces/spans.jsonl",
+        description="Output file for the 'file' trace exporter"
+    )
+    trace_sample_ratio: float = Field(
+        default=1.0,
+        ge=0.0,
+        le=1.0,
+        description="Fraction of new traces recorded (incoming sampled traceparents are always followed)"
+    )
+    enable_loop_monitor: bool = Field(
+        default=True,
+        description="Measure event-loop lag and log the loop thread's stack when it stalls"
+    )
+    loop_monitor_interval_ms: float = Field(
+        default=100.0,
+        gt=0.0,
+        description="Loop heartbeat interval"
+    )
+    loop_stall_threshold_ms: float = Field(
+        default=250.0,
+        gt=0.0,
+        description="Loop lag beyond which a stall is reported with a stack trace"
+    )
+    enable_profiling: bool = Field(
+        default=False,
+        description="Allow per-request profiling (admin header or sampling); requires pyinstrument"
+    )
+    profiling_admin_token: str = Field(
+        default="",
+        description="X-Profile-Token value that forces profiling and guards the profile endpoints (refused while unset)"
+    )
+    profiling_sample_rate: float = Field(
+        default=0.0,
+        ge=0.0,
+        le=1.0,
+        description="Fraction of agent requests profiled without the admin header"
+    )
+    profiling_interval_ms: float = Field(
+        default=1.0,
+        gt=0.0,
+        description="Sampling interval of the profiler"
+    )
+    profiling_dir: str = Field(
+        default="profiles",
+        description="Directory for speedscope profiles (one subdirectory per session)"
+    )
+    profiling_max_files: int = Field(
+        default=500,
+        ge=1,
+        description="Profiles kept on disk; the oldest are deleted beyond this"
+    )
+    enable_query_capture: bool = Field(
+        default=False,
+        description="Record search tool calls and raw datastore responses per turn for offline replay"
+    )
+    query_capture_sample_rate: float = Field(
+        default=1.0,
+        ge=0.0,
+        le=1.0,
+        description="Fraction of agent turns captured when query capture is enabled"
+    )
+    query_capture_path: str = Field(
+        default="captures/queries.jsonl",
+        description="JSON-lines file captured turns are appended to (contains user queries and profiles)"
+    )
     enable_cloud_monitoring: bool = Field(default=False)
+    metrics_max_partners: int = Field(
+        default=100,
+        ge=1,
+        description="Distinct partner labels on metrics before further partners are grouped as 'other'"
+    )
     
     # Development Settings
     debug: bool = Field(default=False)
@@ -0,0 +1,71 @@
+"""
+Local load-testing harness: fake Discovery Engine, scripted models and a
+load generator, so api/main.py can be driven end to end without Vertex
+quota.
+
+    python -m harness.serve      API with the fakes installed
+    python -m harness.loadgen    concurrent sessions against a running API
+    python -m harness.replay     captured production searches, offline
+    python -m harness.evaluate   retrieval quality per settings variant
+
+`install()` swaps the fakes into an already-imported app: the datastore
+client singleton gets a FakeSearchServiceAsyncClient and the master, MSME
+and farmer agents get ScriptedLlm models. Firestore still needs a backend;
+point the app at the emulator (see harness.serve).
+"""
+
+from typing import List, Optional
+
+DEFAULT_SEARCH_LATENCY = "lognormal:250,0.4"
+DEFAULT_FIRST_TOKEN_LATENCY = "lognormal:400,0.3"
+DEFAULT_TOKEN_LATENCY = "uniform:5,25"
+
+
+def install(
+    catalog_path: Optional[str] = None,
+    catalog_size: int = 500,
+    search_latency: str = DEFAULT_SEARCH_LATENCY,
+    first_token_latency: str = DEFAULT_FIRST_TOKEN_LATENCY,
+    token_latency: str = DEFAULT_TOKEN_LATENCY,
+    answer_tokens: int = 60,
+    farmer_keywords: Optional[List[str]] = None,
+):
+    """
+    Install the fake search client and scripted models.
+
+    Args:
+        catalog_path: JSON catalog snapshot (synthetic catalog if omitted)
+        catalog_size: Synthetic catalog size
+        search_latency: Latency spec for each datastore search
+        first_token_latency: Latency spec before each model response
+        token_latency: Latency spec between streamed chunks
+        answer_tokens: Words per scripted answer
+        farmer_keywords: Query keywords routed to the farmer agent
+
+    Returns:
+        The installed FakeSearchServiceAsyncClient
+    """
+    import tools.datastore_tools as datastore_tools
+    from agents.master_agent.agent import root_agent
+    from harness.catalog import load_catalog
+    from harness.fake_llm import ScriptedLlm
+    from harness.fake_search import FakeSearchServiceAsyncClient
+    from harness.latency import LatencyModel
+
+    catalog = load_catalog(catalog_path, catalog_size)
+    fake_search = FakeSearchServiceAsyncClient(default_catalog=catalog, latency=LatencyModel(search_latency))
+    datastore_tools._datastore_client = datastore_tools.DatastoreClient(search_client=fake_search)
+
+    timing = dict(first_token_latency=first_token_latency, token_latency=token_latency, answer_tokens=answer_tokens)
+    keywords = farmer_keywords if farmer_keywords is not None else ["farm", "crop", "kisan", "livestock"]
+    root_agent.model = ScriptedLlm(
+        model="scripted-master",
+        transfer_to="msme_agent",
+        transfer_rules={k: "farmer_agent" for k in keywords},
+        **timing,
+    )
+    tools_by_agent = {"msme_agent": "search_msme_schemes", "farmer_agent": "search_farmer_schemes"}
+    for agent in root_agent.sub_agents:
+        if agent.name in tools_by_agent:
+            agent.model = ScriptedLlm(model=f"scripted-{agent.name}", tool_call=tools_by_agent[agent.name], **timing)
+    return fake_search
@@ -0,0 +1,82 @@
+"""
+Local scheme catalogs for the fake Discovery Engine.
+
+A catalog is a list of schemes in the shape DatastoreClient._parse_document
+returns. It comes either from a JSON snapshot (a list of such dicts, e.g.
+exported from the real datastore) or from the synthetic generator in
+benchmarks.corpus. `to_document` turns a scheme back into the
+struct_data document the real search API returns, so the production
+parsing code runs unchanged against the fake.
+"""
+
+import json
+import re
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from benchmarks.corpus import make_schemes
+
+# Parsed field -> datastore field (inverse of DatastoreClient._parse_document)
+_DOCUMENT_FIELDS = {
+    "guid": "guid",
+    "name": "name",
+    "description": "description",
+    "benefit_summary": "benefitSummary",
+    "benefit": "benefit",
+    "eligibility": "eligibility",
+    "eligibility_criteria": "eligibilityCriteria",
+    "process": "process",
+    "document_checklist": "documentChecklist",
+    "scheme_type": "schemeType",
+    "department_agency": "departmentAgency",
+    "service_type": "serviceType",
+    "serviceType": "serviceType",
+    "beneficiary_type": "beneficiaryType",
+    "name_of_state": "nameOfState",
+    "nameOfState": "nameOfState",
+    "sdg_impacted": "sdgImpactedList",
+}
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def load_catalog(path: Optional[str] = None, size: int = 500, seed: int = 11) -> List[Dict[str, Any]]:
+    """
+    Load a catalog snapshot, or generate a synthetic one.
+
+    Args:
+        path: JSON file with a list of parsed scheme dicts
+        size: Number of synthetic schemes when no path is given
+        seed: Seed for the synthetic catalog
+    """
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return make_schemes(size, seed=seed)
+
+
+def to_document(scheme: Dict[str, Any]) -> SimpleNamespace:
+    """Document object with `id` and `struct_data` as the search API returns it."""
+    data = {}
+    for key, value in scheme.items():
+        field = _DOCUMENT_FIELDS.get(key)
+        if field is not None:
+            data[field] = value
+    return SimpleNamespace(id=scheme.get("id", ""), struct_data={"data": data})
+
+
+def searchable_text(scheme: Dict[str, Any]) -> str:
+    """Lower-cased text the fake search matches queries against."""
+    parts = []
+    for key in ("name", "description", "benefit_summary", "benefit", "eligibility", "scheme_type",
+                "serviceType", "service_type", "nameOfState", "name_of_state"):
+        value = scheme.get(key)
+        if isinstance(value, list):
+            parts.extend(str(v) for v in value)
+        elif value:
+            parts.append(str(value))
+    return " ".join(parts).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
@@ -0,0 +1,258 @@
+"""
+Retrieval quality and latency evaluation over a golden set.
+
+Runs each golden case (profile, query, expected schemes) through the search
+tool against a local catalog served by the fake Discovery Engine, once per
+configuration variant, and reports per variant:
+
+    recall@k / precision@k   expected schemes among the first k results
+    empty rate               fraction of cases returning no scheme
+    fetched                  mean candidates requested (fetch_count) and returned
+    wall time                total and p50/p95 per case
+
+Variants override settings for their run, e.g. fetch sizes
+(msme_fetch_count, msme_amount_fetch_count), enable_query_expansion,
+enable_support_intent_filter or loan_amount_lower_tolerance. The first
+variant is the baseline; cases where another variant finds fewer expected
+schemes are listed, so over-fetching can be trimmed without silently
+losing relevant schemes.
+
+Golden set: a JSON list (or JSON lines) of cases:
+
+    {"id": "textile-loan-mh", "tool": "search_msme_schemes",
+     "query": "loan for textile business", "profile": "<user profile text>",
+     "args": {"state": "Maharashtra", "loan_amount": "25 lakh"},
+     "expected": ["<scheme id or name>", ...]}
+
+Without --golden a synthetic catalog and matching golden set are generated
+(benchmarks.corpus); with a --catalog snapshot a golden set is required.
+
+Usage:
+    python -m harness.evaluate [--golden golden.json --catalog snapshot.json]
+        [--variant name:key=value,key=value ...] [--k 3]
+        [--search-latency 0] [--show 5] [--json eval.json]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from harness.latency import LatencyModel, percentile
+
+# Name -> settings overrides; the first entry is the baseline
+DEFAULT_VARIANTS: List[Tuple[str, Dict[str, Any]]] = [
+    ("baseline", {}),
+    ("fetch-10/15", {"msme_fetch_count": 10, "msme_amount_fetch_count": 15}),
+    ("fetch-6/10", {"msme_fetch_count": 6, "msme_amount_fetch_count": 10}),
+    ("no-expansion", {"enable_query_expansion": False}),
+    ("no-intent-filter", {"enable_support_intent_filter": False}),
+    ("tolerance-0.10", {"loan_amount_lower_tolerance": 0.10}),
+    ("tolerance-0.30", {"loan_amount_lower_tolerance": 0.30}),
+]
+
+
+def load_golden(path: str) -> List[Dict[str, Any]]:
+    """Read golden cases from a JSON list or a JSON-lines file."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def parse_variant(spec: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Parse "name:key=value,key=value" into a variant.
+
+    Values are coerced to the type of the current setting.
+    """
+    from config.settings import settings
+
+    name, _, assignments = spec.partition(":")
+    overrides: Dict[str, Any] = {}
+    for assignment in filter(None, (a.strip() for a in assignments.split(","))):
+        key, _, raw = assignment.partition("=")
+        key = key.strip()
+        if not hasattr(settings, key):
+            raise ValueError(f"Unknown setting '{key}' in variant '{name}'")
+        current = getattr(settings, key)
+        if isinstance(current, bool):
+            value: Any = raw.strip().lower() in ("1", "true", "yes", "on")
+        elif isinstance(current, (int, float)):
+            value = type(current)(raw)
+        else:
+            value = raw
+        overrides[key] = value
+    return name.strip(), overrides
+
+
+@contextlib.contextmanager
+def override_settings(overrides: Dict[str, Any]) -> Iterator[None]:
+    """Apply settings overrides for the duration of the block."""
+    from config.settings import settings
+
+    original = {key: getattr(settings, key) for key in overrides}
+    try:
+        for key, value in overrides.items():
+            setattr(settings, key, value)
+        yield
+    finally:
+        for key, value in original.items():
+            setattr(settings, key, value)
+
+
+def _matches(expected: str, scheme: Dict[str, Any]) -> bool:
+    expected = expected.strip().lower()
+    return expected in (str(scheme.get("id", "")).lower(), str(scheme.get("name", "")).strip().lower())
+
+
+async def run_case(datastore_tools, case: Dict[str, Any], k: int) -> Dict[str, Any]:
+    """Run one golden case and score its first k results."""
+    tool = getattr(datastore_tools, case.get("tool", "search_msme_schemes"))
+    started = time.perf_counter()
+    error = ""
+    schemes: List[Dict[str, Any]] = []
+    debug: Dict[str, Any] = {}
+    try:
+        result = await tool(query=case["query"], user_profile=case.get("profile", ""), **case.get("args", {}))
+        if isinstance(result, dict):
+            schemes = result.get("schemes", [])
+            debug = result.get("_debug", {}).get("stage_trace", {})
+    except Exception as e:
+        error = repr(e)
+    ms = (time.perf_counter() - started) * 1000
+
+    expected = case.get("expected", [])
+    top = schemes[:k]
+    hits = sum(1 for e in expected if any(_matches(e, s) for s in top))
+    fetched = sum(st.get("out", 0) for st in debug.get("stages", []) if st.get("stage") == "datastore.fetch")
+    return {
+        "id": case.get("id", case["query"]),
+        "hits": hits,
+        "recall": hits / len(expected) if expected else 1.0,
+        "precision": hits / k,
+        "empty": not schemes,
+        "fetch_count": debug.get("fetch_count", 0),
+        "fetched": fetched,
+        "ms": ms,
+        "top": [s.get("id", "") for s in top],
+        "error": error,
+    }
+
+
+async def evaluate_variant(datastore_tools, cases: List[Dict[str, Any]], overrides: Dict[str, Any],
+                           k: int) -> List[Dict[str, Any]]:
+    """Run every case under one variant's settings overrides."""
+    with override_settings(overrides):
+        return [await run_case(datastore_tools, case, k) for case in cases]
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Aggregate per-case results of one variant."""
+    n = max(len(results), 1)
+    times = [r["ms"] for r in results]
+    return {
+        "cases": len(results),
+        "errors": sum(1 for r in results if r["error"]),
+        "recall": round(sum(r["recall"] for r in results) / n, 4),
+        "precision": round(sum(r["precision"] for r in results) / n, 4),
+        "empty_rate": round(sum(1 for r in results if r["empty"]) / n, 4),
+        "mean_fetch_count": round(sum(r["fetch_count"] for r in results) / n, 2),
+        "mean_fetched": round(sum(r["fetched"] for r in results) / n, 2),
+        "wall_ms": round(sum(times), 1),
+        "p50_ms": round(percentile(times, 50), 2) if times else 0.0,
+        "p95_ms": round(percentile(times, 95), 2) if times else 0.0,
+    }
+
+
+def losses(baseline: List[Dict[str, Any]], variant: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Cases where the variant finds fewer expected schemes than the baseline."""
+    return [
+        {"id": b["id"], "baseline_hits": b["hits"], "hits": v["hits"], "top": v["top"]}
+        for b, v in zip(baseline, variant) if v["hits"] < b["hits"]
+    ]
+
+
+async def evaluate(cases: List[Dict[str, Any]], catalog: List[Dict[str, Any]],
+                   variants: List[Tuple[str, Dict[str, Any]]], k: int = 3,
+                   search_latency: str = "0") -> Dict[str, Any]:
+    """
+    Evaluate every variant on the golden set against a local catalog.
+
+    Returns:
+        Report with a summary per variant and the cases each loses vs the first
+    """
+    import tools.datastore_tools as datastore_tools
+    from harness.fake_search import FakeSearchServiceAsyncClient
+
+    fake_search = FakeSearchServiceAsyncClient(default_catalog=catalog, latency=LatencyModel(search_latency, seed=1))
+    original_client = datastore_tools._datastore_client
+    datastore_tools._datastore_client = datastore_tools.DatastoreClient(search_client=fake_search)
+    report: Dict[str, Any] = {"k": k, "cases": len(cases), "catalog_size": len(catalog), "variants": {}}
+    try:
+        baseline: Optional[List[Dict[str, Any]]] = None
+        for name, overrides in variants:
+            results = await evaluate_variant(datastore_tools, cases, overrides, k)
+            entry = {"overrides": overrides, **summarize(results)}
+            if baseline is None:
+                baseline = results
+            else:
+                entry["lost"] = losses(baseline, results)
+            entry["results"] = results
+            report["variants"][name] = entry
+    finally:
+        datastore_tools._datastore_client = original_client
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--golden", help="Golden set (JSON list or JSON lines)")
+    parser.add_argument("--catalog", help="Catalog snapshot the golden set refers to (JSON list of parsed schemes)")
+    parser.add_argument("--catalog-size", type=int, default=500, help="Synthetic catalog size without --golden")
+    parser.add_argument("--cases", type=int, default=60, help="Synthetic golden cases without --golden")
+    parser.add_argument("--variant", action="append", metavar="NAME:KEY=VALUE,...",
+                        help="Settings variant (repeatable; the first is the baseline). Default: built-in set")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--search-latency", default="0", help="Fake datastore latency spec (harness.latency)")
+    parser.add_argument("--show", type=int, default=5, help="Lost cases listed per variant")
+    parser.add_argument("--json", metavar="PATH", help="Also write the full report as JSON")
+    args = parser.parse_args()
+
+    if args.catalog and not args.golden:
+        parser.error("--catalog needs a --golden set that refers to it")
+
+    logging.disable(logging.WARNING)
+    from benchmarks.corpus import make_golden_set
+    from harness.catalog import load_catalog
+
+    catalog = load_catalog(args.catalog, args.catalog_size)
+    cases = load_golden(args.golden) if args.golden else make_golden_set(catalog, args.cases)
+    variants = [parse_variant(v) for v in args.variant] if args.variant else DEFAULT_VARIANTS
+
+    report = asyncio.run(evaluate(cases, catalog, variants, args.k, args.search_latency))
+
+    k = args.k
+    print(f"{report['cases']} cases, catalog of {report['catalog_size']} schemes")
+    print(f"{'variant':<18} {'recall@' + str(k):>9} {'prec@' + str(k):>7} {'empty':>6} "
+          f"{'fetch':>6} {'fetched':>8} {'wall ms':>9} {'p50':>7} {'p95':>7} {'lost':>5} {'errors':>6}")
+    for name, entry in report["variants"].items():
+        lost = len(entry.get("lost", []))
+        print(f"{name:<18} {entry['recall']:>9.3f} {entry['precision']:>7.3f} {entry['empty_rate']:>6.1%} "
+              f"{entry['mean_fetch_count']:>6.1f} {entry['mean_fetched']:>8.1f} {entry['wall_ms']:>9.1f} "
+              f"{entry['p50_ms']:>7.2f} {entry['p95_ms']:>7.2f} {lost:>5} {entry['errors']:>6}")
+    for name, entry in report["variants"].items():
+        for case in entry.get("lost", [])[:args.show]:
+            print(f"  {name}: lost {case['id']} ({case['baseline_hits']} -> {case['hits']} hits)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
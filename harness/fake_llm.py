@@ -0,0 +1,131 @@
+"""
+Scripted stand-in for the Gemini models behind the ADK agents.
+
+ScriptedLlm follows the same two-step shape the real agents do:
+
+1. When the latest content does not carry a function response, it emits a
+   function call: `transfer_to_agent` for the orchestrator (target chosen
+   by keyword rules) or the agent's search tool with the user's query.
+2. When the latest content carries function responses, it answers with
+   text built from them (scheme names from a search result), streamed as
+   partial chunks followed by the full snapshot when ADK asks for a stream,
+   exactly like the SSE flow StreamDeltaTracker expects.
+
+Latency before the first token and between tokens is drawn from
+harness.latency specs.
+"""
+
+import asyncio
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from harness.latency import LatencyModel
+
+# ADK prefixes other agents' turns replayed into a sub-agent's context with this
+_CONTEXT_PREFIX = "For context:"
+
+_FILLER = ("These schemes match your business profile and state. Check eligibility, keep your "
+           "Udyam registration and bank statements ready, and apply through the official portal. ").split()
+
+
+class ScriptedLlm(BaseLlm):
+    """
+    Fake model for one agent.
+
+    Attributes:
+        tool_call: Tool to call with {"query": <user text>} before answering
+        transfer_to: Agent to transfer to before answering
+        transfer_rules: Keyword (lower-case) -> agent, checked before transfer_to
+        first_token_latency: Latency spec before the first chunk of each call
+        token_latency: Latency spec between streamed chunks
+        answer_tokens: Words in each text answer
+    """
+
+    model: str = "scripted"
+    tool_call: Optional[str] = None
+    transfer_to: Optional[str] = None
+    transfer_rules: Dict[str, str] = {}
+    first_token_latency: str = "fixed:300"
+    token_latency: str = "fixed:15"
+    answer_tokens: int = 60
+
+    @classmethod
+    def supported_models(cls) -> List[str]:
+        return [r"scripted(-.*)?"]
+
+    def _latency(self, spec: str) -> LatencyModel:
+        # Parsed per call; pydantic fields stay plain strings
+        return LatencyModel(spec)
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        contents = llm_request.contents or []
+        last = contents[-1] if contents else None
+        responses = [p.function_response for p in (last.parts or []) if p.function_response] if last else []
+
+        await asyncio.sleep(self._latency(self.first_token_latency).sample())
+
+        if not responses:
+            call = self._next_call(_latest_user_text(contents))
+            if call is not None:
+                yield LlmResponse(content=types.Content(role="model", parts=[types.Part(function_call=call)]))
+                return
+
+        words = self._answer_words(responses)
+        token_latency = self._latency(self.token_latency)
+        if stream:
+            for i, word in enumerate(words):
+                if i:
+                    await asyncio.sleep(token_latency.sample())
+                chunk = word if i == 0 else " " + word
+                yield LlmResponse(
+                    content=types.Content(role="model", parts=[types.Part(text=chunk)]),
+                    partial=True,
+                )
+        else:
+            await asyncio.sleep(sum(token_latency.sample() for _ in words[1:]))
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=" ".join(words))]),
+            partial=False,
+            turn_complete=True,
+        )
+
+    def _next_call(self, user_text: str) -> Optional[types.FunctionCall]:
+        text = user_text.lower()
+        for keyword, agent in self.transfer_rules.items():
+            if keyword in text:
+                return types.FunctionCall(name="transfer_to_agent", args={"agent_name": agent})
+        if self.transfer_to:
+            return types.FunctionCall(name="transfer_to_agent", args={"agent_name": self.transfer_to})
+        if self.tool_call:
+            return types.FunctionCall(name=self.tool_call, args={"query": user_text or "schemes"})
+        return None
+
+    def _answer_words(self, responses: List[types.FunctionResponse]) -> List[str]:
+        names: List[str] = []
+        for response in responses:
+            payload: Any = response.response or {}
+            for scheme in payload.get("schemes", [])[:3] if isinstance(payload, dict) else []:
+                if isinstance(scheme, dict) and scheme.get("name"):
+                    names.append(scheme["name"])
+        lead = f"I found {len(names)} schemes: {'; '.join(names)}." if names else "I could not find a matching scheme."
+        words = lead.split()
+        while len(words) < self.answer_tokens:
+            words.extend(_FILLER[:self.answer_tokens - len(words)])
+        return words
+
+
+def _latest_user_text(contents: List[types.Content]) -> str:
+    """Text of the latest real user message (skipping replayed agent context)."""
+    for content in reversed(contents):
+        if content.role != "user":
+            continue
+        text = " ".join(p.text for p in (content.parts or []) if p.text).strip()
+        if text and not text.startswith(_CONTEXT_PREFIX):
+            return text
+    return ""
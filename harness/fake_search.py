@@ -0,0 +1,108 @@
+"""
+In-process stand-in for discoveryengine.SearchServiceAsyncClient.
+
+Serves a local catalog per datastore with simple term-overlap ranking and a
+configurable latency distribution, returning objects shaped like the real
+search response (results[].document.struct_data and a relevance score), so
+DatastoreClient and everything downstream of it run unchanged.
+
+Query expansion is approximated: without it only documents containing
+every known query term match; with AUTO expansion (the request's
+query_expansion_spec) a short page is topped up with partial matches.
+"""
+
+import asyncio
+import math
+import random
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from harness.catalog import searchable_text, to_document, tokenize
+from harness.latency import LatencyModel
+
+
+class _IndexedCatalog:
+    """Token index over one datastore's schemes (BM25-lite scoring)."""
+
+    def __init__(self, schemes: List[Dict[str, Any]]):
+        self.schemes = schemes
+        self.documents = [to_document(s) for s in schemes]
+        self.term_counts = [Counter(tokenize(searchable_text(s))) for s in schemes]
+        doc_freq: Counter = Counter()
+        for counts in self.term_counts:
+            doc_freq.update(counts.keys())
+        n = max(len(schemes), 1)
+        self.idf = {term: math.log(1 + n / df) for term, df in doc_freq.items()}
+
+    def search(self, query: str, page_size: int, expand: bool = True) -> List[SimpleNamespace]:
+        # Terms no document contains cannot match either way
+        terms = {t for t in tokenize(query) if t in self.idf}
+        full, partial = [], []
+        for i, counts in enumerate(self.term_counts):
+            matched = [t for t in terms if t in counts]
+            if not matched:
+                continue
+            score = sum(self.idf[t] * (1 + math.log(counts[t])) for t in matched)
+            (full if len(matched) == len(terms) else partial).append((score, i))
+        full.sort(key=lambda item: (-item[0], item[1]))
+        top = full[:page_size]
+        if expand and len(top) < page_size:
+            partial.sort(key=lambda item: (-item[0], item[1]))
+            top += partial[:page_size - len(top)]
+        best = max((score for score, _ in top), default=1.0)
+        return [
+            SimpleNamespace(document=self.documents[i], metadata=SimpleNamespace(score=round(score / best, 4)))
+            for score, i in top
+        ]
+
+
+class FakeSearchServiceAsyncClient:
+    """
+    Fake search client.
+
+    Args:
+        catalogs: Schemes per datastore id
+        default_catalog: Schemes served for datastore ids not in `catalogs`
+        latency: Delay per search call
+        error_rate: Fraction of calls that raise (to exercise error paths)
+        seed: RNG seed for injected errors
+    """
+
+    def __init__(
+        self,
+        catalogs: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+        default_catalog: Optional[List[Dict[str, Any]]] = None,
+        latency: Optional[LatencyModel] = None,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self._catalogs = {ds: _IndexedCatalog(s) for ds, s in (catalogs or {}).items()}
+        self._default = _IndexedCatalog(default_catalog or [])
+        self.latency = latency or LatencyModel("0")
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self.calls = 0
+
+    @staticmethod
+    def _expansion_enabled(request) -> bool:
+        spec = getattr(request, "query_expansion_spec", None)
+        condition = getattr(spec, "condition", None)
+        return getattr(condition, "name", str(condition)) == "AUTO"
+
+    @staticmethod
+    def _datastore_id(serving_config: str) -> str:
+        parts = serving_config.split("/")
+        return parts[parts.index("dataStores") + 1] if "dataStores" in parts else ""
+
+    async def search(self, request=None, **kwargs) -> SimpleNamespace:
+        self.calls += 1
+        delay = self.latency.sample()
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self._rng.random() < self.error_rate:
+            raise RuntimeError("Injected fake search failure")
+
+        catalog = self._catalogs.get(self._datastore_id(request.serving_config), self._default)
+        results = catalog.search(request.query, request.page_size or 10, self._expansion_enabled(request))
+        return SimpleNamespace(results=results)
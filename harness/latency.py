@@ -0,0 +1,69 @@
+"""
+Latency distributions for the fakes.
+
+Specs are strings so they can come from the command line:
+
+    fixed:120                      always 120ms
+    uniform:50,250                 uniform between 50 and 250ms
+    lognormal:300,0.5              median 300ms, sigma 0.5 (long right tail)
+    0                              no delay
+"""
+
+import math
+import random
+from typing import List, Optional
+
+
+class LatencyModel:
+    """
+    Samples delays in seconds from a parsed spec.
+
+    Args:
+        spec: Distribution spec (see module docstring)
+        seed: RNG seed for reproducible runs
+    """
+
+    def __init__(self, spec: str = "0", seed: Optional[int] = None):
+        self.spec = spec
+        self._rng = random.Random(seed)
+        kind, _, params = spec.partition(":")
+        values = [float(v) for v in params.split(",") if v.strip()] if params else []
+        kind = kind.strip().lower()
+
+        if not params and _is_number(kind):
+            kind, values = "fixed", [float(kind)]
+        if kind == "fixed" and len(values) == 1:
+            self._sample = lambda: values[0]
+        elif kind == "uniform" and len(values) == 2:
+            low, high = values
+            self._sample = lambda: self._rng.uniform(low, high)
+        elif kind == "lognormal" and len(values) == 2:
+            median, sigma = values
+            mu = math.log(max(median, 1e-6))
+            self._sample = lambda: self._rng.lognormvariate(mu, sigma)
+        else:
+            raise ValueError(f"Invalid latency spec '{spec}'")
+
+    def sample(self) -> float:
+        """One delay in seconds."""
+        return max(0.0, self._sample()) / 1000
+
+    def __repr__(self) -> str:
+        return f"LatencyModel({self.spec!r})"
+
+
+def _is_number(value: str) -> bool:
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (values need not be sorted)."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
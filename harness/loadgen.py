@@ -0,0 +1,181 @@
+"""
+Load generator for the agent API.
+
+Drives N concurrent sessions; each creates a session and runs a number of
+turns against the streaming (SSE) and/or non-streaming answer endpoint.
+Reports throughput, latency percentiles per endpoint and, for streams,
+time to first token (first SSE data line carrying text).
+
+Run it against `python -m harness.serve` for a quota-free end-to-end test,
+or against any deployed instance.
+
+Usage:
+    python -m harness.loadgen [--url http://127.0.0.1:8000] [--sessions 20] [--turns 3]
+        [--mode stream|answer|mixed] [--partner loadtest] [--timeout 120] [--json out.json]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.corpus import make_queries
+from harness.latency import percentile
+
+
+@dataclass
+class TurnResult:
+    endpoint: str
+    ok: bool
+    latency: float
+    ttft: Optional[float] = None
+    error: str = ""
+
+
+@dataclass
+class LoadReport:
+    results: List[TurnResult] = field(default_factory=list)
+    session_errors: int = 0
+    wall_seconds: float = 0.0
+
+
+async def _stream_turn(client: httpx.AsyncClient, user_id: str, session_id: str, query: str) -> TurnResult:
+    started = time.perf_counter()
+    ttft = None
+    error = ""
+    async with client.stream(
+        "POST", f"/agent/search/answer/stream/{user_id}/{session_id}", json={"query": query}
+    ) as response:
+        if response.status_code != 200:
+            await response.aread()
+            return TurnResult("stream", False, time.perf_counter() - started, error=f"HTTP {response.status_code}")
+        async for line in response.aiter_lines():
+            if not line.startswith("data: ") or line == "data: [DONE]":
+                continue
+            payload = json.loads(line[6:])
+            if "error" in payload:
+                error = str(payload["error"])
+            elif ttft is None and payload.get("results"):
+                ttft = time.perf_counter() - started
+    return TurnResult("stream", not error, time.perf_counter() - started, ttft, error)
+
+
+async def _answer_turn(client: httpx.AsyncClient, user_id: str, session_id: str, query: str) -> TurnResult:
+    started = time.perf_counter()
+    response = await client.post(f"/agent/search/answer/{user_id}/{session_id}", json={"query": query})
+    latency = time.perf_counter() - started
+    if response.status_code != 200:
+        return TurnResult("answer", False, latency, error=f"HTTP {response.status_code}")
+    results = response.json().get("results")
+    if isinstance(results, dict) and results.get("state") == "FAILED":
+        return TurnResult("answer", False, latency, error=str(results.get("answer")))
+    return TurnResult("answer", True, latency)
+
+
+async def _run_session(client: httpx.AsyncClient, index: int, turns: int, mode: str,
+                       queries: List[str], report: LoadReport) -> None:
+    user_id = f"load-{index}-{uuid.uuid4().hex[:6]}"
+    try:
+        response = await client.post("/agent/sessions/create", json={"user_id": user_id})
+        response.raise_for_status()
+        session_id = response.json()["results"]["session_id"]
+    except Exception:
+        report.session_errors += 1
+        return
+
+    for turn in range(turns):
+        query = queries[(index + turn) % len(queries)]
+        use_stream = mode == "stream" or (mode == "mixed" and (index + turn) % 2 == 0)
+        try:
+            if use_stream:
+                result = await _stream_turn(client, user_id, session_id, query)
+            else:
+                result = await _answer_turn(client, user_id, session_id, query)
+        except Exception as e:
+            result = TurnResult("stream" if use_stream else "answer", False, 0.0, error=repr(e))
+        report.results.append(result)
+
+
+async def run_load(url: str, sessions: int, turns: int, mode: str, partner: str, timeout: float) -> LoadReport:
+    """Run all sessions concurrently and collect per-turn results."""
+    report = LoadReport()
+    queries = make_queries(max(sessions, 8))
+    limits = httpx.Limits(max_connections=sessions + 4, max_keepalive_connections=sessions + 4)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits,
+                                 headers={"X-Partner-Code": partner}) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            _run_session(client, i, turns, mode, queries, report) for i in range(sessions)
+        ))
+        report.wall_seconds = time.perf_counter() - started
+    return report
+
+
+def summarize(report: LoadReport) -> Dict[str, object]:
+    """Throughput, error counts and latency/TTFT percentiles (ms) per endpoint."""
+    summary: Dict[str, object] = {
+        "turns": len(report.results),
+        "session_errors": report.session_errors,
+        "wall_seconds": round(report.wall_seconds, 2),
+        "turns_per_second": round(len(report.results) / report.wall_seconds, 2) if report.wall_seconds else 0.0,
+        "endpoints": {},
+    }
+    for endpoint in ("stream", "answer"):
+        results = [r for r in report.results if r.endpoint == endpoint]
+        if not results:
+            continue
+        ok = [r for r in results if r.ok]
+        entry: Dict[str, object] = {
+            "turns": len(results),
+            "errors": len(results) - len(ok),
+            "latency_ms": {f"p{p}": round(percentile([r.latency for r in ok], p) * 1000, 1) for p in (50, 95, 99)},
+        }
+        ttfts = [r.ttft for r in ok if r.ttft is not None]
+        if ttfts:
+            entry["ttft_ms"] = {f"p{p}": round(percentile(ttfts, p) * 1000, 1) for p in (50, 95, 99)}
+        errors = sorted({r.error for r in results if r.error})
+        if errors:
+            entry["sample_errors"] = errors[:5]
+        summary["endpoints"][endpoint] = entry
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--sessions", type=int, default=20, help="Concurrent sessions")
+    parser.add_argument("--turns", type=int, default=3, help="Turns per session")
+    parser.add_argument("--mode", choices=("stream", "answer", "mixed"), default="mixed")
+    parser.add_argument("--partner", default="loadtest", help="X-Partner-Code sent with every request")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--json", metavar="PATH", help="Also write the summary as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(args.url, args.sessions, args.turns, args.mode, args.partner, args.timeout))
+    summary = summarize(report)
+
+    print(f"{summary['turns']} turns in {summary['wall_seconds']}s "
+          f"({summary['turns_per_second']} turns/s), session errors: {summary['session_errors']}")
+    for endpoint, entry in summary["endpoints"].items():
+        latency = entry["latency_ms"]
+        line = (f"{endpoint:<7} turns={entry['turns']:<5} errors={entry['errors']:<4} "
+                f"latency p50/p95/p99 = {latency['p50']}/{latency['p95']}/{latency['p99']} ms")
+        if "ttft_ms" in entry:
+            ttft = entry["ttft_ms"]
+            line += f"  ttft p50/p95/p99 = {ttft['p50']}/{ttft['p95']}/{ttft['p99']} ms"
+        print(line)
+        for error in entry.get("sample_errors", []):
+            print(f"        error: {error}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Replay captured production turns against the current build.
+
+Reads a query capture file (see utils.query_capture) and re-runs every
+recorded search tool call through search_msme_schemes / search_farmer_schemes
+with its recorded arguments. The datastore is replaced by a client that
+answers from the recorded raw responses, so the run is deterministic and
+needs no network; the production parsing, filtering and ranking code runs
+unchanged.
+
+For each call the result ids are compared with what production returned
+when the turn was captured, and optionally with a previous replay report
+(--baseline), together with the tool's wall time. A search the current
+build issues but the capture does not hold (e.g. after a query-building or
+fetch_count change) is answered empty and reported as a miss.
+
+Usage:
+    python -m harness.replay captures/queries.jsonl [--label candidate]
+        [--save replay.json] [--baseline previous.json] [--repeat 3]
+        [--with-latency] [--limit 500] [--show 10] [--fail-on-diff]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+from harness.latency import percentile
+
+REPLAYED_TOOLS = ("search_msme_schemes", "search_farmer_schemes")
+
+
+def load_turns(path: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Read captured turns, skipping lines that are not valid JSON."""
+    turns = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                turns.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+            if limit and len(turns) >= limit:
+                break
+    return turns
+
+
+class ReplaySearchClient:
+    """
+    Search client answering from recorded datastore responses.
+
+    Responses are matched on (query, page_size); a recording with the same
+    query and a larger page size is truncated to the requested size.
+
+    Args:
+        searches: Recorded searches of one turn (utils.query_capture format)
+        with_latency: Sleep for each search's recorded fetch time
+    """
+
+    def __init__(self, searches: List[Dict[str, Any]], with_latency: bool = False):
+        self._by_query: Dict[str, List[Dict[str, Any]]] = {}
+        for search in searches:
+            self._by_query.setdefault(search["query"], []).append(search)
+        self.with_latency = with_latency
+        self.misses: List[Tuple[str, int]] = []
+
+    def _lookup(self, query: str, page_size: int) -> Optional[Dict[str, Any]]:
+        candidates = [s for s in self._by_query.get(query, []) if s["page_size"] >= page_size]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda s: s["page_size"])
+
+    async def search(self, request=None, **kwargs) -> SimpleNamespace:
+        page_size = request.page_size or 10
+        search = self._lookup(request.query, page_size)
+        if search is None:
+            self.misses.append((request.query, page_size))
+            return SimpleNamespace(results=[])
+        if self.with_latency:
+            await asyncio.sleep(search.get("fetch_ms", 0.0) / 1000)
+        return SimpleNamespace(results=[
+            SimpleNamespace(
+                document=SimpleNamespace(id=r["id"], struct_data=r["struct_data"]),
+                metadata=SimpleNamespace(score=r.get("score", 0.0)),
+            )
+            for r in search["results"][:page_size]
+        ])
+
+
+async def _replay_call(datastore_tools, call: Dict[str, Any], searches: List[Dict[str, Any]],
+                       repeat: int, with_latency: bool) -> Dict[str, Any]:
+    """Run one recorded tool call `repeat` times; keep the median wall time."""
+    tool = getattr(datastore_tools, call["tool"])
+    timings = []
+    result_ids: List[str] = []
+    error = ""
+    misses: List[Tuple[str, int]] = []
+    for _ in range(repeat):
+        client = ReplaySearchClient(searches, with_latency)
+        datastore_tools._datastore_client = datastore_tools.DatastoreClient(search_client=client)
+        started = time.perf_counter()
+        try:
+            result = await tool(**call["args"])
+            schemes = result.get("schemes", []) if isinstance(result, dict) else []
+            result_ids = [s.get("id", "") for s in schemes]
+        except Exception as e:
+            error = repr(e)
+        timings.append((time.perf_counter() - started) * 1000)
+        misses = client.misses
+    return {
+        "ms": round(statistics.median(timings), 3),
+        "result_ids": result_ids,
+        "error": error,
+        "misses": [list(m) for m in misses],
+    }
+
+
+async def replay(turns: List[Dict[str, Any]], repeat: int = 1, with_latency: bool = False) -> List[Dict[str, Any]]:
+    """
+    Replay every recorded search tool call in `turns`.
+
+    Returns:
+        One entry per call with its key, tool, recorded ids and replayed outcome
+    """
+    import tools.datastore_tools as datastore_tools
+
+    original_client = datastore_tools._datastore_client
+    calls = []
+    try:
+        for turn in turns:
+            # Searches of the whole turn: a cached fetch is recorded under the first call
+            searches = [s for c in turn.get("tool_calls", []) for s in c.get("searches", [])]
+            for index, call in enumerate(turn.get("tool_calls", [])):
+                if call.get("tool") not in REPLAYED_TOOLS:
+                    continue
+                outcome = await _replay_call(datastore_tools, call, searches, repeat, with_latency)
+                fetch_ms = sum(s.get("fetch_ms", 0.0) for s in call.get("searches", []))
+                calls.append({
+                    "key": f"{turn.get('session_id', '')}|{turn.get('captured_at', '')}|{index}",
+                    "tool": call["tool"],
+                    "query": call.get("args", {}).get("query", ""),
+                    "recorded_ids": call.get("result_ids", []),
+                    "recorded_ms": call.get("ms"),
+                    "recorded_fetch_ms": round(fetch_ms, 2),
+                    **outcome,
+                })
+    finally:
+        datastore_tools._datastore_client = original_client
+    return calls
+
+
+def diff_results(expected: List[str], actual: List[str]) -> str:
+    """'same', 'reordered' or 'changed' for two ordered result id lists."""
+    if expected == actual:
+        return "same"
+    if sorted(expected) == sorted(actual):
+        return "reordered"
+    return "changed"
+
+
+def compare(calls: List[Dict[str, Any]], reference: Dict[str, List[str]]) -> Dict[str, Any]:
+    """Count result-list differences against reference ids per call key."""
+    counts = {"same": 0, "reordered": 0, "changed": 0, "unmatched": 0}
+    changed = []
+    for call in calls:
+        if call["key"] not in reference:
+            counts["unmatched"] += 1
+            continue
+        expected = reference[call["key"]]
+        outcome = diff_results(expected, call["result_ids"])
+        counts[outcome] += 1
+        if outcome == "changed":
+            changed.append({
+                "key": call["key"],
+                "query": call["query"],
+                "removed": [i for i in expected if i not in call["result_ids"]],
+                "added": [i for i in call["result_ids"] if i not in expected],
+            })
+    return {"counts": counts, "changed": changed}
+
+
+def latency_summary(values: List[float]) -> Dict[str, float]:
+    return {f"p{p}": round(percentile(values, p), 2) for p in (50, 95, 99)} if values else {}
+
+
+def build_report(calls: List[Dict[str, Any]], label: str, source: str, with_latency: bool,
+                 baseline: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Replay report: per-call outcomes plus comparisons with production and the baseline."""
+    ok = [c for c in calls if not c["error"]]
+    # Production wall time minus datastore fetch time, comparable with a no-latency replay
+    recorded = [
+        c["recorded_ms"] - (0.0 if with_latency else c["recorded_fetch_ms"])
+        for c in ok if c["recorded_ms"] is not None
+    ]
+    report: Dict[str, Any] = {
+        "label": label,
+        "source": source,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "with_latency": with_latency,
+        "summary": {
+            "calls": len(calls),
+            "errors": len(calls) - len(ok),
+            "calls_with_misses": sum(1 for c in calls if c["misses"]),
+            "latency_ms": latency_summary([c["ms"] for c in ok]),
+            "recorded_latency_ms": latency_summary(recorded),
+            "vs_recorded": compare(ok, {c["key"]: c["recorded_ids"] for c in ok}),
+        },
+        "calls": calls,
+    }
+    if baseline is not None:
+        baseline_calls = {c["key"]: c for c in baseline.get("calls", []) if not c.get("error")}
+        matched = [c for c in ok if c["key"] in baseline_calls]
+        report["summary"]["vs_baseline"] = {
+            "label": baseline.get("label", ""),
+            **compare(ok, {k: c["result_ids"] for k, c in baseline_calls.items()}),
+            "latency_ms": latency_summary([c["ms"] for c in matched]),
+            "baseline_latency_ms": latency_summary([baseline_calls[c["key"]]["ms"] for c in matched]),
+        }
+    return report
+
+
+def _print_comparison(title: str, comparison: Dict[str, Any], show: int) -> None:
+    counts = comparison["counts"]
+    print(f"{title}: same={counts['same']} reordered={counts['reordered']} "
+          f"changed={counts['changed']} unmatched={counts['unmatched']}")
+    for entry in comparison["changed"][:show]:
+        print(f"  {entry['query'][:60]!r}: -{entry['removed']} +{entry['added']}")
+
+
+def _format_latency(latency: Dict[str, float]) -> str:
+    if not latency:
+        return "n/a"
+    return f"{latency['p50']}/{latency['p95']}/{latency['p99']} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="Query capture file (JSON lines)")
+    parser.add_argument("--label", default="current", help="Name of this build in the report")
+    parser.add_argument("--save", metavar="PATH", help="Write the replay report as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="Previous replay report to compare with")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per call; the median time is kept")
+    parser.add_argument("--with-latency", action="store_true", help="Sleep for each recorded fetch time")
+    parser.add_argument("--limit", type=int, help="Replay at most this many turns")
+    parser.add_argument("--show", type=int, default=10, help="Changed calls listed per comparison")
+    parser.add_argument("--fail-on-diff", action="store_true",
+                        help="Exit with status 1 if any result list changed")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    turns = load_turns(args.capture, args.limit)
+    calls = asyncio.run(replay(turns, max(1, args.repeat), args.with_latency))
+    report = build_report(calls, args.label, args.capture, args.with_latency, baseline)
+    summary = report["summary"]
+
+    print(f"Replayed {summary['calls']} calls from {len(turns)} turns "
+          f"({summary['errors']} errors, {summary['calls_with_misses']} with unrecorded searches)")
+    print(f"latency p50/p95/p99: {_format_latency(summary['latency_ms'])} "
+          f"(recorded: {_format_latency(summary['recorded_latency_ms'])})")
+    _print_comparison("vs recorded", summary["vs_recorded"], args.show)
+    if "vs_baseline" in summary:
+        vs_baseline = summary["vs_baseline"]
+        _print_comparison(f"vs baseline {vs_baseline['label']!r}", vs_baseline, args.show)
+        print(f"latency p50/p95/p99 on matched calls: {_format_latency(vs_baseline['latency_ms'])} "
+              f"(baseline: {_format_latency(vs_baseline['baseline_latency_ms'])})")
+    for call in [c for c in calls if c["error"]][:args.show]:
+        print(f"  error {call['tool']} {call['query'][:60]!r}: {call['error']}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    # With a baseline, only changes between the two builds count
+    comparison = summary.get("vs_baseline", summary["vs_recorded"])
+    if args.fail_on_diff and comparison["counts"]["changed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
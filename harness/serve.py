@@ -0,0 +1,76 @@
+"""
+Run the API with the fake search client and scripted models.
+
+Firestore is still real code, so run it against the emulator:
+
+    gcloud emulators firestore start --host-port=localhost:8681
+    export FIRESTORE_EMULATOR_HOST=localhost:8681
+
+With FIRESTORE_EMULATOR_HOST set the Firestore client needs no credentials.
+Without it the server refuses to start, since load-test sessions and turns
+would be written to the real project; pass --allow-real-firestore to do
+that on purpose.
+TESTING=true is set so the agents load their prompts from config/ instead
+of Secret Manager, rate limiting is off unless --rate-limit is given, and
+sessions stay in memory unless SESSION_SERVICE says otherwise.
+
+Usage:
+    python -m harness.serve [--port 8000] [--catalog snapshot.json | --catalog-size 500]
+        [--search-latency lognormal:250,0.4] [--first-token-latency lognormal:400,0.3]
+        [--token-latency uniform:5,25] [--answer-tokens 60] [--rate-limit]
+        [--allow-real-firestore]
+"""
+
+import argparse
+import os
+
+import harness
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--catalog", help="JSON catalog snapshot (list of parsed scheme dicts)")
+    parser.add_argument("--catalog-size", type=int, default=500)
+    parser.add_argument("--search-latency", default=harness.DEFAULT_SEARCH_LATENCY)
+    parser.add_argument("--first-token-latency", default=harness.DEFAULT_FIRST_TOKEN_LATENCY)
+    parser.add_argument("--token-latency", default=harness.DEFAULT_TOKEN_LATENCY)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--rate-limit", action="store_true", help="Keep per-partner admission control on")
+    parser.add_argument("--allow-real-firestore", action="store_true",
+                        help="Run without FIRESTORE_EMULATOR_HOST, writing to the real Firestore project")
+    args = parser.parse_args()
+
+    if not os.environ.get("FIRESTORE_EMULATOR_HOST") and not args.allow_real_firestore:
+        parser.error("FIRESTORE_EMULATOR_HOST is not set; start the Firestore emulator "
+                     "or pass --allow-real-firestore to write to the real project")
+
+    # Must be in place before config.settings and the agents are imported
+    os.environ["TESTING"] = "true"
+    os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "harness-local")
+    os.environ.setdefault("SESSION_SERVICE", "inmemory")
+    if not args.rate_limit:
+        os.environ["ENABLE_RATE_LIMITING"] = "false"
+    if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        print("Warning: FIRESTORE_EMULATOR_HOST is not set; Firestore writes go to the real project")
+
+    from api.main import app
+
+    fake_search = harness.install(
+        catalog_path=args.catalog,
+        catalog_size=args.catalog_size,
+        search_latency=args.search_latency,
+        first_token_latency=args.first_token_latency,
+        token_latency=args.token_latency,
+        answer_tokens=args.answer_tokens,
+    )
+    print(f"Fakes installed: search latency {fake_search.latency.spec}, "
+          f"model first token {args.first_token_latency}, per token {args.token_latency}")
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
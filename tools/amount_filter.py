@@ -4,11 +4,17 @@ This module handles parsing loan/benefit amounts from user queries and scheme da
 and filters/re-ranks search results based on amount requirements.
 """
 
+import logging
 import re
 from typing import Dict, List, Optional, Tuple
-from utils.logger import setup_logger
+from utils.logger import get_sampled_logger, setup_logger
 
 logger = setup_logger(__name__)
+# Per-scheme decisions are logged for a sample of calls only
+scheme_logger = get_sampled_logger(__name__)
+# Own counter for the per-scheme include/exclude decisions: sharing scheme_logger's
+# with the amount parsing (which ticks it for every scheme too) aliases the 1-in-N sampling
+decision_logger = get_sampled_logger(__name__)
 
 
 # Amount conversion constants (all in lakhs for easier comparison)
@@ -67,7 +73,7 @@ def parse_amount_from_text(text: str) -> Optional[float]:
         
         if amounts:
             max_amount = max(amounts)
-            logger.info(f"Parsed amount from '{text}': {max_amount} lakhs (pattern: with_unit)")
+            scheme_logger.info("Parsed amount from '%s': %s lakhs (pattern: with_unit)", text, max_amount)
             return max_amount
     
     # Pattern 2: Indian format with commas (e.g., "Rs.20,00,000" or "₹50,00,000")
@@ -90,7 +96,7 @@ def parse_amount_from_text(text: str) -> Optional[float]:
         
         if amounts:
             max_amount = max(amounts)
-            logger.info(f"Parsed amount from '{text}': {max_amount} lakhs (pattern: indian_format)")
+            scheme_logger.info("Parsed amount from '%s': %s lakhs (pattern: indian_format)", text, max_amount)
             return max_amount
     
     # Pattern 3: Plain number (interpret based on magnitude)
@@ -121,7 +127,7 @@ def parse_amount_from_text(text: str) -> Optional[float]:
         
         if amounts:
             max_amount = max(amounts)
-            logger.info(f"Parsed amount from '{text}': {max_amount} lakhs (pattern: plain_number)")
+            scheme_logger.info("Parsed amount from '%s': %s lakhs (pattern: plain_number)", text, max_amount)
             return max_amount
     
     return None
@@ -259,7 +265,7 @@ def filter_schemes_by_amount(
         
         if scheme_max is None:
             # If we can't parse the amount, include the scheme (benefit of doubt)
-            logger.debug(f"Scheme '{scheme_name}': No amount found, including by default")
+            logger.debug("Scheme '%s': No amount found, including by default", scheme_name)
             filtered.append(scheme)
             continue
         
@@ -280,20 +286,22 @@ def filter_schemes_by_amount(
             include = scheme_max >= effective_min
         
         if include:
-            if comparison_type in ["exact", "range"] and effective_min != user_amount:
-                logger.info(
-                    f"✅ Scheme '{scheme_name}' INCLUDED: offers {scheme_max}L, user needs {user_amount}L (tolerance allows >= {effective_min:.2f}L)"
-                )
-            else:
-                logger.info(f"✅ Scheme '{scheme_name}' INCLUDED: offers {scheme_max}L, user needs {user_amount}L ({comparison_type})")
             filtered.append(scheme)
-        else:
+        
+        # Sampled: the guard takes the sample, so log through the underlying logger
+        if decision_logger.isEnabledFor(logging.INFO):
             if comparison_type in ["exact", "range"] and effective_min != user_amount:
-                logger.info(
-                    f"❌ Scheme '{scheme_name}' EXCLUDED: offers {scheme_max}L, user needs {user_amount}L (tolerance allows >= {effective_min:.2f}L)"
+                decision_logger.logger.info(
+                    "%s Scheme '%s' %s: offers %sL, user needs %sL (tolerance allows >= %.2fL)",
+                    "✅" if include else "❌", scheme_name, "INCLUDED" if include else "EXCLUDED",
+                    scheme_max, user_amount, effective_min
                 )
             else:
-                logger.info(f"❌ Scheme '{scheme_name}' EXCLUDED: offers {scheme_max}L, user needs {user_amount}L ({comparison_type})")
+                decision_logger.logger.info(
+                    "%s Scheme '%s' %s: offers %sL, user needs %sL (%s)",
+                    "✅" if include else "❌", scheme_name, "INCLUDED" if include else "EXCLUDED",
+                    scheme_max, user_amount, comparison_type
+                )
     
     return filtered
 
@@ -366,11 +374,12 @@ def rank_schemes_by_amount_relevance(
     # Sort by relevance score (ascending)
     ranked = sorted(schemes, key=get_relevance_score)
     
-    # Log the ranking
-    for i, scheme in enumerate(ranked[:5]):
-        scheme_name = scheme.get('name', 'Unknown')
-        scheme_max = parse_scheme_max_amount(scheme)
-        logger.info(f"Rank {i+1}: {scheme_name} (offers: {scheme_max}L)")
+    # Log the ranking (sampled; re-parsing amounts is only done when logged)
+    if scheme_logger.isEnabledFor(logging.INFO):
+        for i, scheme in enumerate(ranked[:5]):
+            scheme_logger.logger.info(
+                "Rank %d: %s (offers: %sL)", i + 1, scheme.get('name', 'Unknown'), parse_scheme_max_amount(scheme)
+            )
     
     return ranked
 
@@ -490,7 +499,7 @@ def filter_new_business_only_schemes(schemes: List[Dict]) -> List[Dict]:
         is_new_business_only = any(keyword in all_text for keyword in new_business_keywords)
         
         if is_new_business_only:
-            logger.info(f"❌ Excluded scheme (new business only): {scheme.get('name')}")
+            scheme_logger.info("❌ Excluded scheme (new business only): %s", scheme.get('name'))
         else:
             filtered.append(scheme)
     
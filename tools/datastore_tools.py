@@ -3,18 +3,58 @@ Tools for interacting with Vertex AI Datastores.
 These tools are used by agents to search for schemes with intelligent filtering.
 """
 
+import asyncio
 import time
 import re
+from contextvars import ContextVar
 from typing import Dict, List, Any, Optional, Tuple
 from google.cloud import discoveryengine_v1 as discoveryengine
 from google.api_core.exceptions import GoogleAPIError
 
 from config.settings import settings
 from utils.logger import setup_logger, log_datastore_query
+from utils.metrics import DATASTORE_LATENCY, record_cache, record_filter_stage
+from utils.query_capture import capture_active, captured_tool, record_search_response
+from utils.stage_trace import annotate, stage, traced_tool
 from collections.abc import Mapping
 
 logger = setup_logger(__name__)
 
+# Optional retrieval cache shared by every search in the current context
+# (set per batch request, see use_retrieval_cache). Maps a search key to the
+# task fetching it, so concurrent identical searches share one call.
+_retrieval_cache: ContextVar[Optional[Dict[Tuple, "asyncio.Task"]]] = ContextVar(
+    "retrieval_cache", default=None
+)
+
+
+def use_retrieval_cache(cache: Optional[Dict[Tuple, "asyncio.Task"]]) -> None:
+    """
+    Share DatastoreClient.search results through `cache` for the rest of the
+    current context (task). Pass the same dict to several tasks to share it
+    between them; pass None to turn caching off.
+    """
+    _retrieval_cache.set(cache)
+
+
+def _make_json_safe(obj):
+    """Recursively convert protobuf objects to JSON-serializable Python types."""
+    if obj is None:
+        return None
+    elif isinstance(obj, (str, int, float, bool)):
+        return obj
+    # FIX: Check for Mapping (includes dict, Proto Maps, Structs)
+    elif isinstance(obj, Mapping):
+        return {k: _make_json_safe(v) for k, v in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return [_make_json_safe(item) for item in obj]
+    else:
+        try:
+            # This handles RepeatedComposite (lists)
+            return [_make_json_safe(item) for item in obj]
+        except TypeError:
+            return str(obj)
+
 
 def _norm_state(s: str) -> str:
     """Normalize state string for comparison."""
@@ -150,15 +190,23 @@ def _apply_support_intent_filter(schemes: List[Dict[str, Any]], intent: str) ->
 class DatastoreClient:
     """Client for interacting with Vertex AI Datastores."""
     
-    def __init__(self):
-        """Initialize datastore client."""
+    def __init__(self, search_client=None):
+        """
+        Initialize datastore client.
+        
+        Args:
+            search_client: SearchServiceAsyncClient to use (e.g. the local fake
+                           in harness.fake_search); a real one by default
+        """
         self.project_id = settings.google_cloud_project
         self.location = settings.datastore_location
         self.farmer_datastore_id = settings.farmer_datastore_id
         self.msme_datastore_id = settings.msme_datastore_id
         
         # Initialize search client
-        self.client = discoveryengine.SearchServiceAsyncClient()
+        self.client = search_client or discoveryengine.SearchServiceAsyncClient()
+        # Document client is only needed for catalog listing (scheme index)
+        self._document_client = None
     
     def _get_serving_config(self, datastore_id: str) -> str:
         """
@@ -186,12 +234,51 @@ class DatastoreClient:
         """
         Search datastore for schemes.
         
+        When a retrieval cache is active (use_retrieval_cache), identical
+        searches are served from it, and concurrent ones wait on a single call.
+        
         Args:
             query: Search query
             datastore_id: Datastore to search
             filters: Optional filters (NOT USED - datastore doesn't support field filters)
             max_results: Maximum number of results
             
+        Returns:
+            List of scheme documents
+        """
+        cache = _retrieval_cache.get()
+        if cache is None:
+            return await self._search_uncached(query, datastore_id, max_results)
+        
+        key = (datastore_id, query, max_results)
+        task = cache.get(key)
+        record_cache("retrieval", task is not None)
+        annotate("retrieval_cache", "hit" if task is not None else "miss")
+        if task is None:
+            task = asyncio.ensure_future(self._search_uncached(query, datastore_id, max_results))
+            cache[key] = task
+        
+        results = await asyncio.shield(task)
+        if not results:
+            # Errors come back empty; let the next caller retry
+            cache.pop(key, None)
+        # Callers annotate results in place, so each gets its own dicts
+        return [dict(r) for r in results]
+    
+    async def _search_uncached(
+        self,
+        query: str,
+        datastore_id: str,
+        max_results: int = 3
+    ) -> List[Dict[str, Any]]:
+        """
+        Search datastore for schemes.
+        
+        Args:
+            query: Search query
+            datastore_id: Datastore to search
+            max_results: Maximum number of results
+            
         Returns:
             List of scheme documents
         """
@@ -200,13 +287,14 @@ class DatastoreClient:
         try:
             serving_config = self._get_serving_config(datastore_id)
 
+            expansion = discoveryengine.SearchRequest.QueryExpansionSpec.Condition
             request = discoveryengine.SearchRequest(
                 serving_config=serving_config,
                 query=query,
                 page_size=max_results,
                 # Enable query expansion to improve recall for short queries like "loan".
                 query_expansion_spec=discoveryengine.SearchRequest.QueryExpansionSpec(
-                    condition=discoveryengine.SearchRequest.QueryExpansionSpec.Condition.AUTO
+                    condition=expansion.AUTO if settings.enable_query_expansion else expansion.DISABLED
                 ),
                 spell_correction_spec=discoveryengine.SearchRequest.SpellCorrectionSpec(
                     mode=discoveryengine.SearchRequest.SpellCorrectionSpec.Mode.AUTO
@@ -214,21 +302,38 @@ class DatastoreClient:
             )
             
             # Execute search
-            response = await self.client.search(request)
+            with stage("datastore.fetch") as fetch_stage:
+                response = await self.client.search(request)
+                fetch_stage.out = len(response.results)
+            
+            if capture_active():
+                try:
+                    record_search_response(
+                        datastore_id,
+                        query,
+                        max_results,
+                        fetch_stage.ms,
+                        [self._raw_result(result) for result in response.results]
+                    )
+                except Exception as e:
+                    logger.warning(f"Query capture failed: {e}")
             
             # Parse results
             results = []
-            for result in response.results:
-                doc_data = self._parse_document(result.document)
-                if doc_data:
-                    # Attach retrieval score (0.0 if unavailable)
-                    try:
-                        doc_data["score"] = float(getattr(getattr(result, "metadata", None), "score", 0.0) or 0.0)
-                    except Exception:
-                        doc_data["score"] = 0.0
-                    results.append(doc_data)
+            with stage("datastore.parse", len(response.results)) as parse_stage:
+                for result in response.results:
+                    doc_data = self._parse_document(result.document)
+                    if doc_data:
+                        # Attach retrieval score (0.0 if unavailable)
+                        try:
+                            doc_data["score"] = float(getattr(getattr(result, "metadata", None), "score", 0.0) or 0.0)
+                        except Exception:
+                            doc_data["score"] = 0.0
+                        results.append(doc_data)
+                parse_stage.out = len(results)
             
             duration_ms = (time.time() - start_time) * 1000
+            DATASTORE_LATENCY.labels(datastore_id, "ok").observe(duration_ms / 1000)
             log_datastore_query(
                 logger,
                 datastore_id,
@@ -240,12 +345,59 @@ class DatastoreClient:
             return results
             
         except GoogleAPIError as e:
+            DATASTORE_LATENCY.labels(datastore_id, "error").observe(time.time() - start_time)
             logger.error(f"Datastore search error: {e}")
             return []
         except Exception as e:
+            DATASTORE_LATENCY.labels(datastore_id, "error").observe(time.time() - start_time)
             logger.error(f"Unexpected error in datastore search: {e}")
             return []
     
+    async def list_scheme_names(self, datastore_id: str, page_size: int = 1000) -> List[str]:
+        """
+        List the names of every scheme document in a datastore.
+        
+        Used to build the local scheme-name index for routing; this pages through
+        the datastore's default branch instead of running a search.
+        
+        Args:
+            datastore_id: Datastore to list
+            page_size: Documents fetched per page
+            
+        Returns:
+            List of non-empty scheme names
+        """
+        if self._document_client is None:
+            self._document_client = discoveryengine.DocumentServiceAsyncClient()
+
+        parent = (
+            f"projects/{self.project_id}/locations/{self.location}/"
+            f"collections/default_collection/dataStores/{datastore_id}/"
+            f"branches/default_branch"
+        )
+        start_time = time.time()
+        names: List[str] = []
+
+        try:
+            pager = await self._document_client.list_documents(
+                request=discoveryengine.ListDocumentsRequest(parent=parent, page_size=page_size)
+            )
+            async for document in pager:
+                doc_data = self._parse_document(document)
+                name = str((doc_data or {}).get("name") or "").strip()
+                if name:
+                    names.append(name)
+        except GoogleAPIError as e:
+            logger.error(f"Datastore listing error: {e}")
+        except Exception as e:
+            logger.error(f"Unexpected error listing datastore: {e}")
+
+        logger.info(
+            f"Listed {len(names)} scheme names from {datastore_id} "
+            f"in {(time.time() - start_time) * 1000:.0f}ms"
+        )
+        return names
+
     def _build_filter_string(self, filters: Dict[str, Any]) -> str:
         """
         Build filter string for datastore query.
@@ -276,6 +428,16 @@ class DatastoreClient:
         
         return " AND ".join(filter_parts)
     
+    @staticmethod
+    def _raw_result(result) -> Dict[str, Any]:
+        """JSON-safe copy of one search result as returned (for query capture)."""
+        document = result.document
+        return {
+            "id": document.id,
+            "struct_data": _make_json_safe(document.struct_data),
+            "score": float(getattr(getattr(result, "metadata", None), "score", 0.0) or 0.0),
+        }
+    
     def _parse_document(self, document) -> Optional[Dict[str, Any]]:
         """
         Parse document from search result.
@@ -292,42 +454,23 @@ class DatastoreClient:
             # Extract data from your schema structure
             data = struct_data.get("data", {})
             
-            # Deep conversion function to handle all protobuf types
-            def make_json_safe(obj):
-                """Recursively convert protobuf objects to JSON-serializable Python types."""
-                if obj is None:
-                    return None
-                elif isinstance(obj, (str, int, float, bool)):
-                    return obj
-                # FIX: Check for Mapping (includes dict, Proto Maps, Structs)
-                elif isinstance(obj, Mapping):
-                    return {k: make_json_safe(v) for k, v in obj.items()}
-                elif isinstance(obj, (list, tuple)):
-                    return [make_json_safe(item) for item in obj]
-                else:
-                    try:
-                        # This handles RepeatedComposite (lists)
-                        return [make_json_safe(item) for item in obj]
-                    except TypeError:
-                        return str(obj)  
-            
             return {
                 "id": document.id,
-                "guid": make_json_safe(data.get("guid", "")),
-                "name": make_json_safe(data.get("name", "")),
-                "description": make_json_safe(data.get("description", "")),
-                "benefit_summary": make_json_safe(data.get("benefitSummary", "")),
-                "benefit": make_json_safe(data.get("benefit", [])),
-                "eligibility": make_json_safe(data.get("eligibility", [])),
-                "eligibility_criteria": make_json_safe(data.get("eligibilityCriteria", {})),
-                "process": make_json_safe(data.get("process", [])),
-                "document_checklist": make_json_safe(data.get("documentChecklist", [])),
-                "scheme_type": make_json_safe(data.get("schemeType", "")),
-                "department_agency": make_json_safe(data.get("departmentAgency", [])),
-                "service_type": make_json_safe(data.get("serviceType", [])),
-                "beneficiary_type": make_json_safe(data.get("beneficiaryType", [])),
-                "name_of_state": make_json_safe(data.get("nameOfState", [])),
-                "sdg_impacted": make_json_safe(data.get("sdgImpactedList", [])),
+                "guid": _make_json_safe(data.get("guid", "")),
+                "name": _make_json_safe(data.get("name", "")),
+                "description": _make_json_safe(data.get("description", "")),
+                "benefit_summary": _make_json_safe(data.get("benefitSummary", "")),
+                "benefit": _make_json_safe(data.get("benefit", [])),
+                "eligibility": _make_json_safe(data.get("eligibility", [])),
+                "eligibility_criteria": _make_json_safe(data.get("eligibilityCriteria", {})),
+                "process": _make_json_safe(data.get("process", [])),
+                "document_checklist": _make_json_safe(data.get("documentChecklist", [])),
+                "scheme_type": _make_json_safe(data.get("schemeType", "")),
+                "department_agency": _make_json_safe(data.get("departmentAgency", [])),
+                "service_type": _make_json_safe(data.get("serviceType", [])),
+                "beneficiary_type": _make_json_safe(data.get("beneficiaryType", [])),
+                "name_of_state": _make_json_safe(data.get("nameOfState", [])),
+                "sdg_impacted": _make_json_safe(data.get("sdgImpactedList", [])),
             }
         except Exception as e:
             logger.error(f"Error parsing document: {e}")
@@ -347,6 +490,8 @@ def get_datastore_client() -> DatastoreClient:
 
 
 # Tool functions for agents
+@captured_tool("search_farmer_schemes")
+@traced_tool("search_farmer_schemes")
 async def search_farmer_schemes(
     query: str,
     state: str = "",
@@ -415,6 +560,7 @@ async def search_farmer_schemes(
         logger.info(f"'More schemes' request: fetching {fetch_count} results")
     else:
         fetch_count = 8  # First search - fetch extra for invalid records
+    annotate("fetch_count", fetch_count)
     
     # Search without filters (include context in query instead)
     schemes = await client.search(
@@ -486,14 +632,18 @@ async def search_farmer_schemes(
             else:
                 logger.info(f"Filtered out already-shown scheme: {scheme.get('name')}")
         
+        record_filter_stage("search_farmer_schemes", "exclude_shown", len(schemes), len(filtered_schemes))
         schemes = filtered_schemes
         logger.info(f"After excluding shown schemes: {len(schemes)} remaining")
 
     # Filter by the support intent (loan/subsidy/training/marketing) to avoid cross-category results.
-    intent = _infer_support_intent(query=query, loan_amount=loan_amount)
+    intent = _infer_support_intent(query=query) if settings.enable_support_intent_filter else ""
     if schemes and intent:
         before_intent = len(schemes)
-        schemes, dropped = _apply_support_intent_filter(schemes, intent)
+        with stage("filter.support_intent", before_intent) as st:
+            schemes, dropped = _apply_support_intent_filter(schemes, intent)
+            st.out = len(schemes)
+        record_filter_stage("search_farmer_schemes", "support_intent", before_intent, len(schemes))
         logger.info(
             f"After support-intent filter (intent={intent}): {len(schemes)} schemes (was {before_intent}). Dropped: {dropped}"
         )
@@ -501,7 +651,11 @@ async def search_farmer_schemes(
 
     # Strict state filter: show only schemes applicable to the user's state (nameOfState)
     if schemes and state:
-        schemes = _apply_strict_state_filter(schemes, state)
+        before_state = len(schemes)
+        with stage("filter.state", before_state) as st:
+            schemes = _apply_strict_state_filter(schemes, state)
+            st.out = len(schemes)
+        record_filter_stage("search_farmer_schemes", "state", before_state, len(schemes))
     
     # Always limit to top 3 schemes
     schemes = schemes[:3] if schemes else []
@@ -524,6 +678,8 @@ async def search_farmer_schemes(
     return result
 
 
+@captured_tool("search_msme_schemes")
+@traced_tool("search_msme_schemes")
 async def search_msme_schemes(
     query: str,
     state: str = "",
@@ -619,11 +775,12 @@ async def search_msme_schemes(
         logger.info(f"'More schemes' request: fetching {fetch_count} results to find new schemes")
     elif has_amount_requirement:
         # For amount-based queries, fetch many more to filter properly
-        fetch_count = 25  # Fetch 25 to have good pool for amount filtering
+        fetch_count = settings.msme_amount_fetch_count  # Good pool for amount filtering
         logger.info(f"Amount-based query: fetching {fetch_count} results for filtering")
     else:
         # First search without amount - fetch extra for invalid records
-        fetch_count = 15  # Increased from 8 to 15 for better coverage
+        fetch_count = settings.msme_fetch_count
+    annotate("fetch_count", fetch_count)
     schemes = await client.search(
         query=enhanced_query,
         datastore_id=settings.msme_datastore_id,
@@ -633,23 +790,25 @@ async def search_msme_schemes(
     
     # CRITICAL: Filter out invalid/empty scheme records first
     if schemes:
-        valid_schemes = []
-        for scheme in schemes:
-            scheme_name = scheme.get("name", "").strip()
-            scheme_id = scheme.get("id", "").strip()
+        with stage("filter.invalid_records", len(schemes)) as st:
+            valid_schemes = []
+            for scheme in schemes:
+                scheme_name = scheme.get("name", "").strip()
+                scheme_id = scheme.get("id", "").strip()
             
-            # Skip empty or invalid records
-            if not scheme_name:
-                logger.warning(f"Filtered out empty scheme record: id={scheme_id}")
-                continue
-            if scheme_id in ["msme-schemes-list", "farmer-schemes-list", ""]:
-                logger.warning(f"Filtered out metadata record: {scheme_id}")
-                continue
+                # Skip empty or invalid records
+                if not scheme_name:
+                    logger.warning(f"Filtered out empty scheme record: id={scheme_id}")
+                    continue
+                if scheme_id in ["msme-schemes-list", "farmer-schemes-list", ""]:
+                    logger.warning(f"Filtered out metadata record: {scheme_id}")
+                    continue
             
-            valid_schemes.append(scheme)
+                valid_schemes.append(scheme)
         
-        schemes = valid_schemes
-        logger.info(f"After filtering invalid records: {len(schemes)} valid schemes")
+            schemes = valid_schemes
+            st.out = len(schemes)
+            logger.info(f"After filtering invalid records: {len(schemes)} valid schemes")
         # ===============================
         # MINIMUM SCORE FILTER (QUALITY)
         # ===============================
@@ -659,50 +818,58 @@ async def search_msme_schemes(
             min_score = 0.0
 
         if schemes and min_score > 0:
-            before_score_count = len(schemes)
-            dropped_low_score = 0
-            kept = []
-            for s in schemes:
-                score = s.get("score", 0) or 0
-                try:
-                    score = float(score)
-                except Exception:
-                    score = 0.0
-                if score >= min_score:
-                    kept.append(s)
-                else:
-                    dropped_low_score += 1
-            schemes = kept
-            logger.info(
-                f"[MSME] After min score filter (min_score={min_score}): "
-                f"{len(schemes)} schemes (was {before_score_count}). "
-                f"Dropped low score: {dropped_low_score}"
-            )
+            with stage("filter.min_score", len(schemes)) as st:
+                before_score_count = len(schemes)
+                dropped_low_score = 0
+                kept = []
+                for s in schemes:
+                    score = s.get("score", 0) or 0
+                    try:
+                        score = float(score)
+                    except Exception:
+                        score = 0.0
+                    if score >= min_score:
+                        kept.append(s)
+                    else:
+                        dropped_low_score += 1
+                schemes = kept
+                st.out = len(schemes)
+                logger.info(
+                    f"[MSME] After min score filter (min_score={min_score}): "
+                    f"{len(schemes)} schemes (was {before_score_count}). "
+                    f"Dropped low score: {dropped_low_score}"
+                )
     
     # Filter out excluded schemes (for "more schemes" requests)
     if excluded_scheme_names and schemes:
-        filtered_schemes = []
-        for scheme in schemes:
-            scheme_name = scheme.get("name", "").lower()
-            # Check if this scheme name matches any excluded name (partial match)
-            is_excluded = any(
-                excluded_name in scheme_name or scheme_name in excluded_name 
-                for excluded_name in excluded_scheme_names
-            )
-            if not is_excluded:
-                filtered_schemes.append(scheme)
-            else:
-                logger.info(f"Filtered out already-shown scheme: {scheme.get('name')}")
+        with stage("filter.exclude_shown", len(schemes)) as st:
+            filtered_schemes = []
+            for scheme in schemes:
+                scheme_name = scheme.get("name", "").lower()
+                # Check if this scheme name matches any excluded name (partial match)
+                is_excluded = any(
+                    excluded_name in scheme_name or scheme_name in excluded_name 
+                    for excluded_name in excluded_scheme_names
+                )
+                if not is_excluded:
+                    filtered_schemes.append(scheme)
+                else:
+                    logger.info(f"Filtered out already-shown scheme: {scheme.get('name')}")
+            st.out = len(filtered_schemes)
         
+        record_filter_stage("search_msme_schemes", "exclude_shown", len(schemes), len(filtered_schemes))
         schemes = filtered_schemes
         logger.info(f"After excluding shown schemes: {len(schemes)} remaining")
 
     # Filter by high-level support intent (loan/subsidy/training/marketing)
     # This prevents non-loan items (e.g., account opening / generic services) from leaking into loan results.
-    intent = _infer_support_intent(query, loan_amount)
+    intent = _infer_support_intent(query, loan_amount) if settings.enable_support_intent_filter else ""
     if schemes and intent:
         before_intent = len(schemes)
-        schemes, dropped_intent = _apply_support_intent_filter(schemes, intent)
+        with stage("filter.support_intent", before_intent) as st:
+            schemes, dropped_intent = _apply_support_intent_filter(schemes, intent)
+            st.out = len(schemes)
+        record_filter_stage("search_msme_schemes", "support_intent", before_intent, len(schemes))
         logger.info(
             "After support intent filter (intent=%s): %s schemes (was %s). Dropped=%s",
             intent, len(schemes), before_intent, dropped_intent,
@@ -711,29 +878,36 @@ async def search_msme_schemes(
 
     # Strict state filter: show only schemes applicable to the user's state (nameOfState)
     if schemes and state:
-        schemes = _apply_strict_state_filter(schemes, state)
+        before_state = len(schemes)
+        with stage("filter.state", before_state) as st:
+            schemes = _apply_strict_state_filter(schemes, state)
+            st.out = len(schemes)
+        record_filter_stage("search_msme_schemes", "state", before_state, len(schemes))
     
     # Filter by scheme_type (Central/State) if specified
     if scheme_type and schemes:
-        scheme_type_lower = scheme_type.lower().strip()
-        filtered_by_type = []
+        with stage("filter.scheme_type", len(schemes)) as st:
+            scheme_type_lower = scheme_type.lower().strip()
+            filtered_by_type = []
         
-        for scheme in schemes:
-            s_type = str(scheme.get("scheme_type", "")).lower()
+            for scheme in schemes:
+                s_type = str(scheme.get("scheme_type", "")).lower()
             
-            if scheme_type_lower in ["central", "central government", "केंद्र", "केंद्रीय"]:
-                # Match Central Sector Scheme, Centrally Sponsored Scheme, etc.
-                if "central" in s_type:
-                    filtered_by_type.append(scheme)
-            elif scheme_type_lower in ["state", "state government", "राज्य"]:
-                # Match State Sector Scheme, State schemes, etc.
-                if "state" in s_type or (s_type and "central" not in s_type):
+                if scheme_type_lower in ["central", "central government", "केंद्र", "केंद्रीय"]:
+                    # Match Central Sector Scheme, Centrally Sponsored Scheme, etc.
+                    if "central" in s_type:
+                        filtered_by_type.append(scheme)
+                elif scheme_type_lower in ["state", "state government", "राज्य"]:
+                    # Match State Sector Scheme, State schemes, etc.
+                    if "state" in s_type or (s_type and "central" not in s_type):
+                        filtered_by_type.append(scheme)
+                else:
+                    # Unknown type filter - include all
                     filtered_by_type.append(scheme)
-            else:
-                # Unknown type filter - include all
-                filtered_by_type.append(scheme)
+            st.out = len(filtered_by_type)
         
         if filtered_by_type:
+            record_filter_stage("search_msme_schemes", "scheme_type", len(schemes), len(filtered_by_type))
             schemes = filtered_by_type
             logger.info(f"After scheme_type filter ({scheme_type}): {len(schemes)} schemes")
         else:
@@ -744,7 +918,10 @@ async def search_msme_schemes(
     if exclusion_info.get('is_existing_business') and schemes:
         from tools.amount_filter import filter_new_business_only_schemes
         original_count = len(schemes)
-        schemes = filter_new_business_only_schemes(schemes)
+        with stage("filter.new_business_only", original_count) as st:
+            schemes = filter_new_business_only_schemes(schemes)
+            st.out = len(schemes)
+        record_filter_stage("search_msme_schemes", "new_business_only", original_count, len(schemes))
         logger.info(f"After eligibility filter (existing business): {len(schemes)} schemes (was {original_count})")
     
     # STEP 2: Apply amount-based filtering and re-ranking
@@ -752,12 +929,16 @@ async def search_msme_schemes(
     if has_amount_requirement and schemes:
         # Use loan_amount if provided, otherwise extract from query
         filter_query = loan_amount if loan_amount else query
-        schemes, user_amount = filter_and_rank_by_amount(
-            schemes, 
-            filter_query, 
-            min_results=3,
-            profile_exclusions=exclusion_info
-        )
+        before_amount = len(schemes)
+        with stage("filter.amount", before_amount) as st:
+            schemes, user_amount = filter_and_rank_by_amount(
+                schemes, 
+                filter_query, 
+                min_results=3,
+                profile_exclusions=exclusion_info
+            )
+            st.out = len(schemes)
+        record_filter_stage("search_msme_schemes", "amount", before_amount, len(schemes))
         logger.info(f"After amount filter and re-rank: {len(schemes)} schemes (user_amount: {user_amount}L)")
     
     # STEP 3: Apply relevance-based ranking using user profile
@@ -773,12 +954,13 @@ async def search_msme_schemes(
             'business_type': business_type
         }
         
-        schemes = rank_schemes_by_relevance(
-            schemes=schemes,
-            user_profile_text=user_profile,
-            query_params=query_params,
-            exclude_schemes=excluded_scheme_names
-        )
+        with stage("rank.relevance", len(schemes)):
+            schemes = rank_schemes_by_relevance(
+                schemes=schemes,
+                user_profile_text=user_profile,
+                query_params=query_params,
+                exclude_schemes=excluded_scheme_names
+            )
         logger.info(f"After relevance ranking: {len(schemes)} schemes")
 
         # Log top 3 with scores
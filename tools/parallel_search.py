@@ -1,7 +1,9 @@
 import os
+import time
 import concurrent.futures
 from config.settings import settings
 from langchain_google_community import VertexAISearchRetriever
+from utils.tracing import span, submit_with_context
 
 # CONFIGURATION
 # Project ID
@@ -11,6 +13,14 @@ MSME_STRUCTURED_ID = settings.msme_datastore_id
 # Unstructured Datastore 
 MSME_UNSTRUCTURED_ID = settings.msme_unstructured_id
 
+# Shared pool for datastore fetches. It lives for the whole process so that a
+# late call can be abandoned at the deadline instead of being joined on exit
+# (leaving a `with ThreadPoolExecutor` block waits for every straggler).
+_SEARCH_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    max_workers=8,
+    thread_name_prefix="msme-search"
+)
+
 # -OPTIMIZED FETCH FUNCTION 
 def fetch_from_store(store_id, query, is_structured):
     """
@@ -35,7 +45,8 @@ def fetch_from_store(store_id, query, is_structured):
             max_extractive_answer_count=1
         )
         
-        docs = retriever.invoke(query)
+        with span("vertex_search.retrieve", datastore=store_id, structured=is_structured):
+            docs = retriever.invoke(query)
         if not docs:
             return ""
         
@@ -59,6 +70,10 @@ def search_msme_schemes(query: str):
     Structured (CSV/DB) and Unstructured (PDF/Docs) stores simultaneously.
     This ensures we get both specific facts (limits, rates) and 
     descriptive context (process, guidelines).
+
+    Both stores share ONE overall deadline (settings.hybrid_search_timeout_seconds).
+    Whatever has arrived by then is returned; late calls are abandoned and
+    the response lists the sources that timed out.
     """
     print(f"--- [Search] Processing Query: {query} ---")
     
@@ -66,38 +81,59 @@ def search_msme_schemes(query: str):
     if not query or len(query.strip()) < 2:
         return "Please provide more details for your search."
 
-    context = ""
-    
     # PARALLEL EXECUTION BLOCK 
-    # ThreadPoolExecutor runs both fetch functions at the exact same time.
-    # Total Latency = Time taken by the slowest datastore (not the sum of both).
-    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
-        
-        # 1. Submit Tasks (Non-Blocking)
-        # These lines execute instantly
-        future_struct = executor.submit(fetch_from_store, MSME_STRUCTURED_ID, query, True)
-        future_unstruct = executor.submit(fetch_from_store, MSME_UNSTRUCTURED_ID, query, False)
-        
-        # 2. Retrieve Results (Blocking)
-        # We use a timeout to ensure the agent doesn't hang if Vertex AI is slow
-        try:
-            # Get Structured Data
-            res_struct = future_struct.result(timeout=10)
-            if res_struct:
-                context += f"STRUCTURED DATA:\n{res_struct}\n\n"
-        except Exception as e:
-            print(f"Structured Search Failed: {e}")
+    # Both fetches start at the same time on the shared pool.
+    # Total Latency = min(slowest datastore, deadline) - never the sum of both.
+    deadline = time.monotonic() + settings.hybrid_search_timeout_seconds
 
+    # 1. Submit Tasks (Non-Blocking)
+    futures = {
+        "Structured": submit_with_context(_SEARCH_EXECUTOR, fetch_from_store, MSME_STRUCTURED_ID, query, True),
+        "Unstructured": submit_with_context(_SEARCH_EXECUTOR, fetch_from_store, MSME_UNSTRUCTURED_ID, query, False),
+    }
+
+    # 2. Wait for both against the shared deadline (Blocking, bounded)
+    concurrent.futures.wait(
+        futures.values(),
+        timeout=max(0.0, deadline - time.monotonic())
+    )
+
+    # 3. Collect what finished, abandon the rest
+    results = {}
+    timed_out = []
+    for source, future in futures.items():
+        if not future.done():
+            # cancel() only helps if the call never started; a running call is
+            # left to finish on the pool and its result is discarded.
+            future.cancel()
+            timed_out.append(source)
+            print(f"{source} Search timed out after {settings.hybrid_search_timeout_seconds}s")
+            continue
         try:
-            # Get Unstructured Data
-            res_unstruct = future_unstruct.result(timeout=10)
-            if res_unstruct:
-                context += f"UNSTRUCTURED DATA:\n{res_unstruct}\n\n"
+            results[source] = future.result()
         except Exception as e:
-            print(f"Unstructured Search Failed: {e}")
+            print(f"{source} Search Failed: {e}")
+
+    context = ""
+    if results.get("Structured"):
+        context += f"STRUCTURED DATA:\n{results['Structured']}\n\n"
+    if results.get("Unstructured"):
+        context += f"UNSTRUCTURED DATA:\n{results['Unstructured']}\n\n"
+
+    timeout_note = ""
+    if timed_out:
+        timeout_note = (
+            f"NOTE: The following sources timed out and are not included: "
+            f"{', '.join(timed_out)}."
+        )
 
     # Final Check
     if not context:
+        if timeout_note:
+            return f"No specific schemes or documents could be retrieved in time. {timeout_note}"
         return "No specific schemes or documents found for this query in the database."
+
+    if timeout_note:
+        context += f"{timeout_note}\n"
         
-    return context
\ No newline at end of file
+    return context
@@ -1,51 +1,37 @@
 """
 Routing logic for the Master Agent.
+
+check_scheme_and_route is a native async tool: ADK awaits it on the main event
+loop, so a routing call never ties up a worker thread and a slow datastore
+lookup is bounded by settings.routing_timeout_seconds and cancelled.
 """
 import asyncio
-import threading
 import json
+from typing import Any, Dict, Optional, Union
+from config.settings import settings
 from utils import setup_logger
 
 # --- SPECIFIC IMPORTS ---
-try:
-    from tools import search_farmer_schemes
-    from tools.parallel_search import search_msme_schemes
-except ImportError as e:
-    print(f"Import Warning: {e}")
-    async def search_farmer_schemes(**kwargs): return "{}"
-    def search_msme_schemes(**kwargs): return "{}"
+from tools.datastore_tools import get_datastore_client
+from tools.scheme_index import ensure_scheme_index, lookup_scheme_owner
+from utils.metrics import record_cache
 
 logger = setup_logger(__name__)
 
-# --- GLOBAL BACKGROUND LOOP ---
-_search_loop = None
-_search_thread = None
-
-def _start_background_loop(loop):
-    asyncio.set_event_loop(loop)
-    loop.run_forever()
-
-def get_persistent_loop():
-    global _search_loop, _search_thread
-    if _search_loop is None:
-        _search_loop = asyncio.new_event_loop()
-        _search_thread = threading.Thread(target=_start_background_loop, args=(_search_loop,), daemon=True)
-        _search_thread.start()
-    return _search_loop
-
-def run_async_safe(coro):
-    loop = get_persistent_loop()
-    future = asyncio.run_coroutine_threadsafe(coro, loop)
-    return future.result()
+# Number of candidates fetched per datastore for a routing lookup.
+# Routing only needs names, so a small page keeps the round trip cheap.
+ROUTING_PAGE_SIZE = 5
 
 # --- HELPER: VERIFY MATCH ---
-def is_valid_match(search_result_json: str, user_query: str) -> bool:
+def is_valid_match(search_result: Union[str, Dict[str, Any]], user_query: str) -> bool:
     """
     Parses the search result and checks if the scheme name actually matches.
     Prevents vector search from returning irrelevant "similar" results.
+
+    Accepts either the JSON string or the dict returned by the search tools.
     """
     try:
-        data = json.loads(search_result_json)
+        data = json.loads(search_result) if isinstance(search_result, str) else search_result
         schemes = data.get("schemes", [])
         
         if not schemes:
@@ -63,8 +49,65 @@ def is_valid_match(search_result_json: str, user_query: str) -> bool:
     except Exception:
         return False
 
+# --- CONCURRENT LOOKUP ---
+async def _lookup_in_datastore(datastore_id: str, scheme_name: str) -> bool:
+    """
+    Searches one datastore through the async DatastoreClient and reports
+    whether it holds a scheme whose name matches the query.
+    """
+    client = get_datastore_client()
+    schemes = await client.search(
+        query=scheme_name,
+        datastore_id=datastore_id,
+        max_results=ROUTING_PAGE_SIZE
+    )
+    return is_valid_match({"schemes": schemes}, scheme_name)
+
+
+async def find_owning_agent(scheme_name: str) -> Optional[str]:
+    """
+    Looks the scheme up in the Farmer and MSME datastores concurrently.
+
+    Returns as soon as one lookup produces a valid name match and cancels the
+    other. If both finish in the same tick the Farmer store wins, matching the
+    original sequential order.
+
+    Args:
+        scheme_name: The name of the government scheme.
+
+    Returns:
+        'farmer_agent', 'msme_agent', or None if neither store has a match.
+    """
+    lookups = {
+        asyncio.create_task(
+            _lookup_in_datastore(settings.farmer_datastore_id, scheme_name)
+        ): "farmer_agent",
+        asyncio.create_task(
+            _lookup_in_datastore(settings.msme_datastore_id, scheme_name)
+        ): "msme_agent",
+    }
+    priority = ["farmer_agent", "msme_agent"]
+    pending = set(lookups)
+
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=lambda t: priority.index(lookups[t])):
+                agent_name = lookups[task]
+                if task.exception() is not None:
+                    logger.warning(f"Routing lookup for {agent_name} failed: {task.exception()}")
+                    continue
+                if task.result():
+                    return agent_name
+        return None
+    finally:
+        # Cancel whichever lookup is still in flight
+        for task in pending:
+            task.cancel()
+
+
 # --- ROUTING LOGIC ---
-def check_scheme_and_route(scheme_name: str) -> str:
+async def check_scheme_and_route(scheme_name: str) -> str:
     """Determines the correct agent by searching datastores.
 
     Args:
@@ -73,36 +116,44 @@ def check_scheme_and_route(scheme_name: str) -> str:
     Returns:
         Routing instructions for the Master Agent.
     """
-    logger.info(f"Routing Check: Searching for '{scheme_name}' in databases...")
+    # Build / refresh the local name index in the background (never blocks)
+    ensure_scheme_index()
 
-    # 1. CHECK FARMER DATASTORE
-    try:
+    # 1. CHECK THE LOCAL SCHEME-NAME INDEX
+    match = lookup_scheme_owner(scheme_name)
+    record_cache("scheme_index", match is not None)
+    if match:
+        logger.info(
+            f"Routing Check: '{scheme_name}' matched '{match.matched_name}' "
+            f"in local index -> {match.agent} (score={match.score})"
+        )
+        owner = match.agent
+    else:
+        # 2. TRUE MISS: CHECK FARMER AND MSME DATASTORES CONCURRENTLY
+        # Strict Check: a store only "owns" the scheme if the names match
+        logger.info(f"Routing Check: Searching for '{scheme_name}' in databases...")
         try:
-            farmer_result = run_async_safe(search_farmer_schemes(query=scheme_name, state=""))
-        except TypeError:
-            farmer_result = run_async_safe(search_farmer_schemes(query=scheme_name))
-    except Exception:
-        farmer_result = "{}"
-    
-    # Strict Check: Only route if names match
-    is_in_farmer = is_valid_match(farmer_result, scheme_name)
-    
-    if is_in_farmer:
+            # wait_for cancels both lookups if the deadline passes
+            owner = await asyncio.wait_for(
+                find_owning_agent(scheme_name),
+                timeout=settings.routing_timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Routing lookup for '{scheme_name}' timed out after {settings.routing_timeout_seconds}s"
+            )
+            owner = None
+        except Exception as e:
+            logger.error(f"Routing lookup failed: {e}")
+            owner = None
+
+    if owner == "farmer_agent":
         return (
             f"DECISION: The scheme '{scheme_name}' was found in the Agriculture Database. "
             "ACTION: Please transfer the user to the 'farmer_agent' immediately."
         )
 
-    # 2. CHECK MSME DATASTORE
-    try:
-        msme_result = search_msme_schemes(query=scheme_name)
-    except TypeError:
-         msme_result = "{}"
-    
-    # Strict Check: Only route if names match
-    is_in_msme = is_valid_match(msme_result, scheme_name)
-
-    if is_in_msme:
+    if owner == "msme_agent":
         return (
             f"DECISION: The scheme '{scheme_name}' was found in the MSME/Business Database. "
             "ACTION: Please transfer the user to the 'msme_agent' immediately."
@@ -113,4 +164,4 @@ def check_scheme_and_route(scheme_name: str) -> str:
         f"DECISION: I searched both databases and found NO scheme matching '{scheme_name}'. "
         "ACTION: Tell the user you couldn't find that specific scheme. "
         "THEN, immediately ask: 'To help me find the right information for you, could you tell me what's your occupation? if you are a Farmer or a Business Owner?'"
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,417 @@
+"""
+In-memory scheme-name index for the Master Agent's routing step.
+
+Answers "which agent owns scheme X" locally instead of searching the remote
+datastores. Names from the Farmer and MSME catalogs are normalized and indexed
+together with their acronyms (PMEGP, CGTMSE, PM-KISAN). Lookups go through:
+
+1. A Bloom filter pre-check, so names that cannot match are rejected without
+   touching the index.
+2. An exact lookup on the normalized / compact / acronym keys.
+3. A trigram candidate search verified with an edit-distance check, which
+   absorbs common misspellings ("PMGEP", "pm kissan").
+
+A name owned by both catalogs is treated as a miss so the caller can fall back
+to the datastore search.
+"""
+
+import asyncio
+import json
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from config.settings import settings
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+FARMER_AGENT = "farmer_agent"
+MSME_AGENT = "msme_agent"
+
+# Well-known schemes whose acronym cannot be derived from the catalog name
+# (e.g. CGTMSE is not the initials of "Credit Guarantee Fund Trust for Micro
+# and Small Enterprises"). Merged into whatever the catalogs provide.
+KNOWN_SCHEME_ALIASES: Dict[str, List[str]] = {
+    MSME_AGENT: [
+        "PMEGP",
+        "Prime Minister's Employment Generation Programme",
+        "CGTMSE",
+        "Credit Guarantee Fund Trust for Micro and Small Enterprises",
+        "MUDRA",
+        "PMMY",
+        "Pradhan Mantri Mudra Yojana",
+        "Stand-Up India",
+        "PM Vishwakarma",
+        "PMFME",
+        "PM SVANidhi",
+        "ZED Certification",
+    ],
+    FARMER_AGENT: [
+        "PM-KISAN",
+        "Pradhan Mantri Kisan Samman Nidhi",
+        "PMFBY",
+        "Pradhan Mantri Fasal Bima Yojana",
+        "KCC",
+        "Kisan Credit Card",
+        "PMKSY",
+        "Pradhan Mantri Krishi Sinchayee Yojana",
+        "PM-KUSUM",
+        "Soil Health Card",
+        "e-NAM",
+    ],
+}
+
+# Words that carry no identity: "PMEGP scheme" and "PMEGP" are the same name.
+_NOISE_WORDS = {
+    "scheme", "schemes", "yojana", "yojna", "the", "a", "an", "govt",
+    "government", "details", "detail", "info", "about",
+}
+
+# Joining words skipped when deriving an acronym from a full name.
+_ACRONYM_SKIP_WORDS = {"of", "for", "and", "the", "in", "to", "on", "under", "&"}
+
+# Phrase normalizations applied before tokenizing.
+_PHRASE_REPLACEMENTS = [
+    (re.compile(r"\bpradhan\s+mantri\b"), "pm"),
+    (re.compile(r"\bprime\s+minister'?s?\b"), "pm"),
+    (re.compile(r"\bprogram\b"), "programme"),
+]
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+# Fuzzy-match thresholds
+TRIGRAM_MIN_DICE = 0.72
+MAX_FUZZY_CANDIDATES = 25
+
+
+def normalize_scheme_name(name: str) -> str:
+    """
+    Normalize a scheme name for comparison.
+
+    Lowercases, maps "Pradhan Mantri"/"Prime Minister" to "pm", strips
+    punctuation ("PM-KISAN" -> "pm kisan") and drops noise words.
+
+    Args:
+        name: Raw scheme name or user text
+
+    Returns:
+        Normalized name (may be empty)
+    """
+    if not name:
+        return ""
+    text = str(name).lower()
+    for pattern, replacement in _PHRASE_REPLACEMENTS:
+        text = pattern.sub(replacement, text)
+    words = [w for w in _NON_WORD.sub(" ", text).split() if w not in _NOISE_WORDS]
+    return " ".join(words)
+
+
+def derive_acronym(name: str) -> str:
+    """
+    Derive an acronym from the initials of a full scheme name.
+
+    Returns "" for names too short to have a meaningful acronym.
+    """
+    text = str(name or "").lower()
+    for pattern, replacement in _PHRASE_REPLACEMENTS:
+        text = pattern.sub(replacement, text)
+    words = [
+        w for w in _NON_WORD.sub(" ", text).split()
+        if w not in _ACRONYM_SKIP_WORDS and w not in {"scheme", "schemes"}
+    ]
+    if len(words) < 3:
+        return ""
+    # "pm" contributes both letters (PMEGP, PMFBY, PMKSY)
+    return "".join(w if w == "pm" else w[0] for w in words)
+
+
+def _keys_for_name(name: str) -> Set[str]:
+    """All lookup keys a catalog name is reachable by."""
+    keys: Set[str] = set()
+    normalized = normalize_scheme_name(name)
+    if normalized:
+        keys.add(normalized)
+        keys.add(normalized.replace(" ", ""))
+    acronym = derive_acronym(name)
+    if len(acronym) >= 3:
+        keys.add(acronym)
+    # Acronyms already written into the name, e.g. "... Programme (PMEGP)"
+    for inner in re.findall(r"\(([^)]+)\)", str(name or "")):
+        inner_norm = normalize_scheme_name(inner)
+        if inner_norm:
+            keys.add(inner_norm.replace(" ", ""))
+    return keys
+
+
+def _trigrams(key: str) -> Set[str]:
+    """Padded character trigrams of a key."""
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent transposition).
+
+    Stops early and returns limit + 1 once the distance is known to exceed limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev_prev: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        row_min = cur[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev_prev[j - 2] + 1)
+            row_min = min(row_min, cur[j])
+        if row_min > limit:
+            return limit + 1
+        prev_prev, prev = prev, cur
+    return prev[-1]
+
+
+def _edit_budget(key: str) -> int:
+    """Misspellings tolerated for a key of this length."""
+    if len(key) <= 3:
+        return 0
+    if len(key) <= 7:
+        return 1
+    if len(key) <= 15:
+        return 2
+    return 3
+
+
+class BloomFilter:
+    """Compact Bloom filter over strings (double hashing on the built-in hash)."""
+
+    def __init__(self, expected_items: int, false_positive_rate: float = 0.01):
+        import math
+
+        expected_items = max(1, expected_items)
+        self.size = max(64, int(-expected_items * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / expected_items * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> Iterable[int]:
+        h1 = hash(item)
+        h2 = hash((item, 0x9E3779B9)) | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+@dataclass(frozen=True)
+class SchemeMatch:
+    """Result of a successful index lookup."""
+
+    agent: str
+    matched_name: str
+    score: float
+    exact: bool
+
+
+class SchemeNameIndex:
+    """In-memory index from scheme names / acronyms / misspellings to the owning agent."""
+
+    def __init__(self, catalogs: Dict[str, Iterable[str]]):
+        """
+        Build the index.
+
+        Args:
+            catalogs: Mapping of agent name -> scheme names owned by that agent
+        """
+        self._owners: Dict[str, Set[str]] = {}
+        self._display: Dict[str, str] = {}
+
+        for agent, names in catalogs.items():
+            for name in names:
+                for key in _keys_for_name(name):
+                    self._owners.setdefault(key, set()).add(agent)
+                    self._display.setdefault(key, str(name))
+
+        self._keys: List[str] = list(self._owners)
+        self._key_trigrams: List[Set[str]] = [_trigrams(k) for k in self._keys]
+        self._trigram_postings: Dict[str, List[int]] = {}
+        for key_id, grams in enumerate(self._key_trigrams):
+            for gram in grams:
+                self._trigram_postings.setdefault(gram, []).append(key_id)
+
+        # Bloom filter holds both the exact keys and every indexed trigram
+        self._bloom = BloomFilter(len(self._keys) + len(self._trigram_postings))
+        for key in self._keys:
+            self._bloom.add(f"k:{key}")
+        for gram in self._trigram_postings:
+            self._bloom.add(f"t:{gram}")
+
+        self.built_at = time.time()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _owner(self, key: str) -> Optional[str]:
+        owners = self._owners.get(key, set())
+        # Ambiguous names are left to the datastore search
+        return next(iter(owners)) if len(owners) == 1 else None
+
+    def lookup(self, scheme_name: str) -> Optional[SchemeMatch]:
+        """
+        Resolve a user-supplied scheme name to its owning agent.
+
+        Args:
+            scheme_name: Scheme name, acronym or misspelling
+
+        Returns:
+            SchemeMatch, or None on a miss or an ambiguous name
+        """
+        normalized = normalize_scheme_name(scheme_name)
+        if not normalized:
+            return None
+
+        # 1. Exact keys (normalized and compact forms)
+        for key in (normalized, normalized.replace(" ", "")):
+            if f"k:{key}" in self._bloom and key in self._owners:
+                owner = self._owner(key)
+                if owner:
+                    return SchemeMatch(owner, self._display[key], 1.0, True)
+                return None
+
+        # 2. Bloom pre-check: if too few query trigrams can exist in the index,
+        #    no key can reach the similarity threshold
+        query_key = normalized
+        query_grams = _trigrams(query_key)
+        possible = [g for g in query_grams if f"t:{g}" in self._bloom]
+        budget = _edit_budget(query_key.replace(" ", ""))
+        # Best case Dice is 2p / (q + p) for p possibly-present trigrams
+        best_dice = 2.0 * len(possible) / (len(query_grams) + len(possible)) if possible else 0.0
+        if not possible or (budget == 0 and best_dice < TRIGRAM_MIN_DICE):
+            return None
+
+        # 3. Trigram candidates, best shared-trigram count first
+        shared: Dict[int, int] = {}
+        for gram in possible:
+            for key_id in self._trigram_postings.get(gram, ()):
+                shared[key_id] = shared.get(key_id, 0) + 1
+        candidates = sorted(shared.items(), key=lambda kv: kv[1], reverse=True)[:MAX_FUZZY_CANDIDATES]
+
+        best: Optional[Tuple[float, str]] = None
+        compact_query = query_key.replace(" ", "")
+        for key_id, common in candidates:
+            key = self._keys[key_id]
+            dice = 2.0 * common / (len(query_grams) + len(self._key_trigrams[key_id]))
+            score = dice
+            if dice < TRIGRAM_MIN_DICE:
+                # Short names / acronyms lose most trigrams to a single typo,
+                # so verify them by edit distance instead
+                compact_key = key.replace(" ", "")
+                limit = min(_edit_budget(compact_key), budget)
+                if limit == 0:
+                    continue
+                distance = _edit_distance(compact_query, compact_key, limit)
+                if distance > limit:
+                    continue
+                score = 1.0 - distance / max(len(compact_key), len(compact_query))
+            if best is None or score > best[0]:
+                best = (score, key)
+
+        if best is None:
+            return None
+
+        owner = self._owner(best[1])
+        if not owner:
+            return None
+        return SchemeMatch(owner, self._display[best[1]], round(best[0], 3), False)
+
+
+# --- GLOBAL INDEX ---
+_scheme_index: Optional[SchemeNameIndex] = None
+_build_task: Optional["asyncio.Task"] = None
+
+
+def _load_snapshot(path: str) -> Dict[str, List[str]]:
+    """Read a {agent_name: [scheme names]} JSON snapshot."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {agent: [str(n) for n in names] for agent, names in data.items()}
+
+
+async def build_scheme_index() -> SchemeNameIndex:
+    """
+    Build the index from both catalogs plus the known aliases.
+
+    Uses settings.scheme_index_snapshot_path when configured, otherwise lists
+    the Farmer and MSME datastores concurrently.
+    """
+    start_time = time.time()
+    catalogs: Dict[str, List[str]] = {
+        agent: list(names) for agent, names in KNOWN_SCHEME_ALIASES.items()
+    }
+
+    if settings.scheme_index_snapshot_path:
+        snapshot = _load_snapshot(settings.scheme_index_snapshot_path)
+        for agent, names in snapshot.items():
+            catalogs.setdefault(agent, []).extend(names)
+    else:
+        from tools.datastore_tools import get_datastore_client
+
+        client = get_datastore_client()
+        farmer_names, msme_names = await asyncio.gather(
+            client.list_scheme_names(settings.farmer_datastore_id),
+            client.list_scheme_names(settings.msme_datastore_id),
+        )
+        catalogs[FARMER_AGENT].extend(farmer_names)
+        catalogs[MSME_AGENT].extend(msme_names)
+
+    index = SchemeNameIndex(catalogs)
+    logger.info(
+        f"Scheme index built: {len(index)} keys from "
+        f"{sum(len(v) for v in catalogs.values())} names in {(time.time() - start_time) * 1000:.0f}ms"
+    )
+    return index
+
+
+async def _build_and_publish() -> None:
+    global _scheme_index
+    try:
+        _scheme_index = await build_scheme_index()
+    except Exception as e:
+        logger.error(f"Scheme index build failed: {e}")
+
+
+def ensure_scheme_index() -> None:
+    """
+    Start (or refresh) the index build in the background on the running loop.
+
+    Never blocks: until the first build finishes, lookups simply miss and the
+    caller falls back to the datastore search.
+    """
+    global _build_task
+    if not settings.enable_scheme_index:
+        return
+    if _build_task is not None and not _build_task.done():
+        return
+    stale = (
+        _scheme_index is None
+        or time.time() - _scheme_index.built_at > settings.scheme_index_refresh_minutes * 60
+    )
+    if stale:
+        _build_task = asyncio.get_running_loop().create_task(_build_and_publish())
+
+
+def lookup_scheme_owner(scheme_name: str) -> Optional[SchemeMatch]:
+    """Look a scheme up in the current index; None if not built yet or a miss."""
+    if _scheme_index is None:
+        return None
+    return _scheme_index.lookup(scheme_name)
@@ -5,6 +5,7 @@ from config.settings import settings
 from langchain_google_community import VertexAISearchRetriever
 from langchain_google_vertexai import VertexAIEmbeddings
 from langchain_core.tools import tool
+from utils.tracing import span, submit_with_context
 
 # CONFIGURATION
 # Project ID
@@ -26,7 +27,8 @@ def fetch_from_store(store_id, query, is_structured=False):
             engine_data_type=1 if is_structured else 0, # 1=Struct, 0=Unstruct
             get_extractive_answers=False # Speed Optimization
         )
-        docs = retriever.invoke(query)
+        with span("vertex_search.retrieve", datastore=store_id, structured=is_structured):
+            docs = retriever.invoke(query)
         if not docs:
             return ""
         # Format: Add source tag so LLM knows where it came from
@@ -76,7 +78,8 @@ class SemanticRouter:
             
     def get_route(self, query):
         """Calculates Similarity Scores to decide the route"""
-        query_vector = self.embeddings.embed_query(query)
+        with span("embedding.embed_query", query_chars=len(query)):
+            query_vector = self.embeddings.embed_query(query)
         scores = {}
         for category, vectors in self.route_vectors.items():
             # Dot Product = Semantic Similarity
@@ -122,12 +125,12 @@ def search_msme_schemes(query: str):
         # 1. Trigger Structured Search?
         if route in ["structured", "both"]:
             print("--- [Fetch] Querying Structured DB... ---")
-            future_struct = executor.submit(fetch_from_store, MSME_STRUCTURED_ID, query, True)
+            future_struct = submit_with_context(executor, fetch_from_store, MSME_STRUCTURED_ID, query, True)
         
         # 2. Trigger Unstructured Search?
         if route in ["unstructured", "both"]:
             print("--- [Fetch] Querying Document DB... ---")
-            future_unstruct = executor.submit(fetch_from_store, MSME_UNSTRUCTURED_ID, query, False)
+            future_unstruct = submit_with_context(executor, fetch_from_store, MSME_UNSTRUCTURED_ID, query, False)
             
         # 3. Gather Results
         if future_struct:
@@ -1,16 +1,123 @@
 """
 Structured logging configuration using ADK logger and Python logging.
+
+Module loggers only enqueue records; a single background QueueListener
+thread formats them and writes to stdout, so logging never blocks the event
+loop on I/O. Message %-arguments are formatted on that thread too.
 """
 
+import atexit
+import itertools
+import json
 import logging
+import queue
 import sys
-from typing import Any, Dict
+import traceback
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
 from config.settings import settings
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
 # Configure logging based on settings
 LOG_LEVEL = getattr(logging, settings.log_level.upper(), logging.INFO)
 
 
+def _dumps(payload: Dict[str, Any]) -> str:
+    """Serialize a log payload with orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=str).decode('utf-8')
+    return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; message text is escaped properly."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        return _dumps(payload)
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """
+    Enqueue records without formatting them on the caller's thread.
+
+    The stdlib QueueHandler renders the message before enqueueing; here only
+    tracebacks are rendered eagerly (they reference live frames). When the
+    queue is full the record is dropped and counted instead of blocking.
+    """
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info))
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+
+def _build_output_handler() -> logging.Handler:
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setLevel(LOG_LEVEL)
+    
+    # Create formatter
+    if settings.log_format == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        )
+    
+    console_handler.setFormatter(formatter)
+    return console_handler
+
+
+_log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=settings.log_queue_size)
+_queue_handler = _DroppingQueueHandler(_log_queue)
+_queue_handler.setLevel(LOG_LEVEL)
+_listener: Optional[QueueListener] = None
+
+
+def _ensure_listener() -> None:
+    global _listener
+    if _listener is None:
+        _listener = QueueListener(_log_queue, _build_output_handler(), respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the background writer."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_log_records() -> int:
+    """Number of records dropped because the log queue was full."""
+    return _DroppingQueueHandler.dropped
+
+
 def setup_logger(name: str) -> logging.Logger:
     """
     Set up a logger with consistent formatting.
@@ -21,33 +128,70 @@ def setup_logger(name: str) -> logging.Logger:
     Returns:
         Configured logger instance
     """
+    _ensure_listener()
+
     logger = logging.getLogger(name)
     logger.setLevel(LOG_LEVEL)
     
     # Remove existing handlers
     logger.handlers.clear()
     
-    # Create console handler
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(LOG_LEVEL)
-    
-    # Create formatter
-    if settings.log_format == "json":
-        formatter = logging.Formatter(
-            '{"time": "%(asctime)s", "level": "%(levelname)s", '
-            '"logger": "%(name)s", "message": "%(message)s"}'
-        )
-    else:
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
-    
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    logger.addHandler(_queue_handler)
+    # Records are written once, here; the root handler serves library loggers
+    logger.propagate = False
     
     return logger
 
 
+def configure_root_logging(level: int = LOG_LEVEL) -> None:
+    """
+    Route the root logger (ADK, google-cloud, uvicorn propagation) through
+    the same background queue, replacing any synchronous handlers.
+    """
+    _ensure_listener()
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+
+class SampledLogger(logging.LoggerAdapter):
+    """
+    Logger that keeps only 1 in `every` calls.
+
+    The decision is made in isEnabledFor, before a LogRecord is built, so
+    skipped calls cost a counter increment. Guard expensive log-only work
+    with `if sampled.isEnabledFor(logging.INFO):` to sample it as a block.
+    """
+
+    def __init__(self, logger: logging.Logger, every: int):
+        super().__init__(logger, {})
+        self.every = every
+        self._counter = itertools.count()
+
+    def isEnabledFor(self, level: int) -> bool:
+        if not self.logger.isEnabledFor(level):
+            return False
+        return level >= logging.WARNING or next(self._counter) % self.every == 0
+
+    def process(self, msg, kwargs):
+        return msg, kwargs
+
+
+def get_sampled_logger(name: str, every: Optional[int] = None) -> SampledLogger:
+    """
+    Logger for high-volume messages (per stream chunk, per scheme).
+
+    Args:
+        name: Logger name (usually __name__)
+        every: Keep 1 in N records; defaults to settings.log_sample_every
+
+    Returns:
+        SampledLogger writing through the same queue as setup_logger
+    """
+    return SampledLogger(setup_logger(name), every or settings.log_sample_every)
+
+
 def log_agent_event(
     logger: logging.Logger,
     event_type: str,
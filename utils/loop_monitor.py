@@ -0,0 +1,160 @@
+"""
+Event-loop lag and stall detection.
+
+A heartbeat task sleeps for a fixed interval and measures how late it wakes
+up; that scheduling delay is the time every other coroutine on the loop
+(e.g. each open SSE stream) had to wait, and is exported as a histogram.
+
+A watchdog thread notices when the heartbeat has not run for longer than
+the stall threshold, i.e. something is blocking the loop right now, and
+captures the loop thread's current stack with sys._current_frames(). That
+stack points at the coroutine doing synchronous work (blocking network
+calls, heavy regex, future.result() and so on).
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from config.settings import settings
+from utils.logger import setup_logger
+from utils.metrics import EVENT_LOOP_LAG, EVENT_LOOP_STALLS
+
+logger = setup_logger(__name__)
+
+# Stalls kept for /internal/stats
+MAX_RECORDED_STALLS = 20
+
+
+class LoopMonitor:
+    """
+    Heartbeat task plus watchdog thread for one event loop.
+
+    Args:
+        interval: Heartbeat interval in seconds
+        stall_threshold: Lag in seconds beyond which the loop counts as stalled
+    """
+
+    def __init__(self, interval: float, stall_threshold: float):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        # Written by the heartbeat, read by the watchdog
+        self._beats = 0
+        self._last_beat = time.monotonic()
+
+        self._stalls: Deque[Dict[str, Any]] = deque(maxlen=MAX_RECORDED_STALLS)
+        self._stall_count = 0
+        self._max_lag = 0.0
+        self._last_lag = 0.0
+
+    # --- LIFECYCLE ---
+    def start(self) -> None:
+        """Start monitoring the running loop."""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = self._loop.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Loop monitor started (interval {self.interval * 1000:.0f}ms, "
+            f"stall threshold {self.stall_threshold * 1000:.0f}ms)"
+        )
+
+    async def stop(self) -> None:
+        """Stop the heartbeat and the watchdog."""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval * 2)
+            self._thread = None
+
+    # --- HEARTBEAT (on the loop) ---
+    async def _heartbeat(self) -> None:
+        interval = self.interval
+        while True:
+            expected = time.monotonic() + interval
+            self._last_beat = time.monotonic()
+            self._beats += 1
+            await asyncio.sleep(interval)
+            lag = max(0.0, time.monotonic() - expected)
+            self._last_lag = lag
+            self._max_lag = max(self._max_lag, lag)
+            EVENT_LOOP_LAG.observe(lag)
+            if lag > self.stall_threshold:
+                self._stall_count += 1
+                EVENT_LOOP_STALLS.inc()
+                if self._stalls and self._stalls[-1]['beat'] == self._beats:
+                    self._stalls[-1]['stalled_ms'] = round(lag * 1000, 1)
+                logger.warning(f"Event loop blocked for {lag * 1000:.0f}ms")
+
+    # --- WATCHDOG (own thread) ---
+    def _watch(self) -> None:
+        reported_beat = -1
+        while not self._stop.wait(self.interval):
+            beat = self._beats
+            blocked_for = time.monotonic() - self._last_beat - self.interval
+            if blocked_for > self.stall_threshold and beat != reported_beat:
+                reported_beat = beat
+                self._capture_stall(beat, blocked_for)
+
+    def _capture_stall(self, beat: int, blocked_for: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+        task = None
+        try:
+            current = asyncio.current_task(self._loop)
+            task = current.get_name() if current is not None else None
+            if current is not None:
+                task = f"{task} ({current.get_coro().__qualname__})"
+        except Exception:
+            pass
+        self._stalls.append({
+            'beat': beat,
+            'detected_at': time.time(),
+            'stalled_ms': round(blocked_for * 1000, 1),
+            'task': task,
+            'stack': stack,
+        })
+        logger.warning(
+            f"Event loop stalled for {blocked_for * 1000:.0f}ms so far in task {task}; "
+            f"loop thread stack:\n{stack}"
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Lag gauges and the most recent stalls (newest last)."""
+        return {
+            'last_lag_ms': round(self._last_lag * 1000, 2),
+            'max_lag_ms': round(self._max_lag * 1000, 2),
+            'stalls': self._stall_count,
+            'recent_stalls': list(self._stalls),
+        }
+
+
+def create_loop_monitor() -> Optional[LoopMonitor]:
+    """Monitor configured from settings, or None when disabled."""
+    if not settings.enable_loop_monitor:
+        return None
+    return LoopMonitor(
+        interval=settings.loop_monitor_interval_ms / 1000,
+        stall_threshold=settings.loop_stall_threshold_ms / 1000,
+    )
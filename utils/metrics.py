@@ -0,0 +1,258 @@
+"""
+Prometheus metrics for the API, agents and tools.
+
+prometheus_client is optional: without it every metric is a no-op and
+/metrics reports that it is unavailable, so instrumented code never needs
+to check.
+"""
+
+import time
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from config.settings import settings
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _NoopMetric:
+    """Stands in for Counter/Gauge/Histogram when prometheus_client is missing."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def labels(self, *args, **kwargs) -> "_NoopMetric":
+        return self
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def dec(self, amount: float = 1) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+    def set_function(self, fn: Callable[[], float]) -> None:
+        pass
+
+    def observe(self, value: float) -> None:
+        pass
+
+
+if not PROMETHEUS_AVAILABLE:
+    Counter = Gauge = Histogram = _NoopMetric
+
+# Latency buckets (seconds) covering cache hits through multi-call agent turns
+_FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_SLOW_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+
+# --- API ---
+REQUEST_LATENCY = Histogram(
+    "scheme_advisor_request_duration_seconds",
+    "HTTP request latency (until the last body byte for streams)",
+    ["endpoint", "method", "status", "partner"],
+    buckets=_SLOW_BUCKETS,
+)
+TIME_TO_FIRST_TOKEN = Histogram(
+    "scheme_advisor_time_to_first_token_seconds",
+    "Time from request start to the first streamed answer text",
+    ["endpoint", "partner"],
+    buckets=_SLOW_BUCKETS,
+)
+
+# --- Agents ---
+LLM_CALLS = Counter(
+    "scheme_advisor_llm_calls_total",
+    "Model calls made by each agent",
+    ["agent"],
+)
+LLM_LATENCY = Histogram(
+    "scheme_advisor_llm_call_duration_seconds",
+    "Model call latency per agent (until the final response)",
+    ["agent"],
+    buckets=_SLOW_BUCKETS,
+)
+
+# --- Tools ---
+DATASTORE_LATENCY = Histogram(
+    "scheme_advisor_datastore_search_duration_seconds",
+    "Discovery Engine search latency per datastore",
+    ["datastore", "outcome"],
+    buckets=_FAST_BUCKETS,
+)
+FILTER_DROPS = Counter(
+    "scheme_advisor_filter_dropped_total",
+    "Candidate schemes removed by each filter stage",
+    ["tool", "stage"],
+)
+CACHE_REQUESTS = Counter(
+    "scheme_advisor_cache_requests_total",
+    "Cache lookups by result (hit/miss)",
+    ["cache", "result"],
+)
+
+# --- Persistence and sessions ---
+FIRESTORE_WRITE_LATENCY = Histogram(
+    "scheme_advisor_firestore_write_duration_seconds",
+    "Firestore commit latency",
+    ["operation", "outcome"],
+    buckets=_FAST_BUCKETS,
+)
+PERSISTENCE_QUEUE_DEPTH = Gauge(
+    "scheme_advisor_persistence_queue_depth",
+    "Turn records waiting for the write-behind queue",
+)
+RESIDENT_SESSIONS = Gauge(
+    "scheme_advisor_resident_sessions",
+    "Sessions held in this worker's memory",
+)
+RESIDENT_SESSION_BYTES = Gauge(
+    "scheme_advisor_resident_session_bytes",
+    "Approximate serialized size of sessions held in memory",
+)
+IN_FLIGHT_RUNS = Gauge(
+    "scheme_advisor_in_flight_agent_runs",
+    "Agent runs currently admitted",
+)
+
+# --- Event loop ---
+EVENT_LOOP_LAG = Histogram(
+    "scheme_advisor_event_loop_lag_seconds",
+    "How late the loop heartbeat woke up (time other coroutines waited)",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+EVENT_LOOP_STALLS = Counter(
+    "scheme_advisor_event_loop_stalls_total",
+    "Heartbeats delayed beyond the stall threshold",
+)
+
+_seen_partners: Set[str] = set()
+
+
+def partner_label(partner_code: Optional[str]) -> str:
+    """
+    Partner label with bounded cardinality: the first
+    settings.metrics_max_partners distinct codes keep their name, later
+    ones are reported as "other".
+    """
+    partner_code = partner_code or "unknown"
+    if partner_code in _seen_partners:
+        return partner_code
+    if len(_seen_partners) < settings.metrics_max_partners:
+        _seen_partners.add(partner_code)
+        return partner_code
+    return "other"
+
+
+def record_filter_stage(tool: str, stage: str, before: int, after: int) -> None:
+    """Count the candidates a filter stage removed."""
+    if before > after:
+        FILTER_DROPS.labels(tool, stage).inc(before - after)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Count a cache lookup."""
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def metrics_payload() -> Tuple[bytes, str]:
+    """Body and content type for the /metrics endpoint."""
+    if not PROMETHEUS_AVAILABLE:
+        return b"# prometheus_client is not installed\n", CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+# --- ADK model callbacks ---
+
+# Start times of in-progress model calls, keyed by (invocation, agent).
+# Entries are popped on the final response or a model error; a cancelled
+# stream gets neither, so the oldest entries are dropped past the cap.
+_llm_started: Dict[Tuple[str, str], float] = {}
+_LLM_STARTED_MAX = 10000
+
+
+def before_model_metrics(callback_context, llm_request) -> None:
+    """ADK before_model_callback: count the call and start its timer."""
+    agent = callback_context.agent_name
+    LLM_CALLS.labels(agent).inc()
+    key = (callback_context.invocation_id, agent)
+    _llm_started.pop(key, None)
+    _llm_started[key] = time.perf_counter()
+    while len(_llm_started) > _LLM_STARTED_MAX:
+        del _llm_started[next(iter(_llm_started))]
+    return None
+
+
+def after_model_metrics(callback_context, llm_response) -> None:
+    """ADK after_model_callback: observe latency once the final response arrives."""
+    if getattr(llm_response, "partial", False):
+        return None
+    agent = callback_context.agent_name
+    started = _llm_started.pop((callback_context.invocation_id, agent), None)
+    if started is not None:
+        LLM_LATENCY.labels(agent).observe(time.perf_counter() - started)
+    return None
+
+
+def model_error_metrics(callback_context, llm_request, error) -> None:
+    """ADK on_model_error_callback: drop the failed call's timer."""
+    _llm_started.pop((callback_context.invocation_id, callback_context.agent_name), None)
+    return None
+
+
+# --- Request latency middleware ---
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware observing request latency per route and partner.
+
+    The endpoint label is the matched route template (e.g.
+    /agent/search/answer/{user_id}/{session_id}), so ids do not create new
+    series. The timer stops when the response body is complete.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message: Dict[str, Any]):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_LATENCY.labels(
+                _route_label(scope),
+                scope.get("method", ""),
+                str(status["code"]),
+                partner_label(_partner_from_scope(scope)),
+            ).observe(time.perf_counter() - started)
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    endpoint = scope.get("endpoint")
+    return getattr(endpoint, "__name__", "unmatched")
+
+
+def _partner_from_scope(scope) -> Optional[str]:
+    for name, value in scope.get("headers", ()):
+        if name == b"x-partner-code":
+            return value.decode("latin-1").strip().lower() or None
+    return None
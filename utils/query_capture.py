@@ -0,0 +1,191 @@
+"""
+Query capture for offline replay.
+
+With settings.enable_query_capture on, each agent turn picked by
+settings.query_capture_sample_rate is recorded: for every search tool call,
+its arguments, result ids and wall time, plus the raw datastore responses
+it consumed (document struct_data and score, as the search API returned
+them). Turns are appended as JSON lines to settings.query_capture_path:
+
+    {"captured_at": ..., "session_id": ..., "query": ..., "state": ...,
+     "tool_calls": [{"tool": "search_msme_schemes", "args": {...},
+                     "ms": 412.3, "result_ids": [...], "result_names": [...],
+                     "searches": [{"datastore_id": ..., "query": ...,
+                                   "page_size": 15, "fetch_ms": 388.1,
+                                   "results": [{"id": ..., "struct_data": {...},
+                                                "score": 0.82}]}]}]}
+
+`python -m harness.replay` re-runs these turns against the recorded
+responses. Captures hold user profiles and queries; keep the file local.
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from config.settings import settings
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_turn_capture: ContextVar[Optional["TurnCapture"]] = ContextVar("turn_capture", default=None)
+_current_call: ContextVar[Optional[Dict[str, Any]]] = ContextVar("capture_call", default=None)
+_write_lock = threading.Lock()
+
+
+class TurnCapture:
+    """Tool calls and datastore responses recorded during one agent turn."""
+
+    def __init__(self, session_id: str, query: str):
+        self.session_id = session_id
+        self.query = query
+        self.captured_at = datetime.now(timezone.utc).isoformat()
+        self.tool_calls: List[Dict[str, Any]] = []
+
+    def to_dict(self, state: str) -> Dict[str, Any]:
+        return {
+            'captured_at': self.captured_at,
+            'session_id': self.session_id,
+            'query': self.query,
+            'state': state,
+            'tool_calls': self.tool_calls,
+        }
+
+
+def start_turn_capture(session_id: str, query: str) -> Optional[TurnCapture]:
+    """
+    Start capturing the agent turn running in this context, if capture is
+    enabled and the turn is sampled. A turn that is not captured clears any
+    capture left in the context by an earlier turn on the same connection.
+
+    Returns:
+        The TurnCapture to pass to `finish_turn_capture`, or None
+    """
+    if not settings.enable_query_capture or random.random() >= settings.query_capture_sample_rate:
+        _turn_capture.set(None)
+        return None
+    capture = TurnCapture(session_id, query)
+    _turn_capture.set(capture)
+    return capture
+
+
+def capture_active() -> bool:
+    """True when the current context is recording a turn."""
+    return _turn_capture.get() is not None
+
+
+def captured_tool(tool_name: str) -> Callable:
+    """
+    Decorator for async search tools: record the call's arguments, result
+    and wall time in the current turn capture. A no-op outside captured turns.
+    """
+    def decorator(fn: Callable) -> Callable:
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            capture = _turn_capture.get()
+            if capture is None:
+                return await fn(*args, **kwargs)
+
+            call: Dict[str, Any] = {
+                'tool': tool_name,
+                'args': dict(signature.bind_partial(*args, **kwargs).arguments),
+                'searches': [],
+            }
+            capture.tool_calls.append(call)
+            token = _current_call.set(call)
+            started = time.perf_counter()
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                call['error'] = repr(e)
+                raise
+            finally:
+                call['ms'] = round((time.perf_counter() - started) * 1000, 2)
+                _current_call.reset(token)
+            schemes = result.get('schemes', []) if isinstance(result, dict) else []
+            call['result_ids'] = [s.get('id', '') for s in schemes]
+            call['result_names'] = [s.get('name', '') for s in schemes]
+            return result
+        return wrapper
+    return decorator
+
+
+def record_search_response(
+    datastore_id: str,
+    query: str,
+    page_size: int,
+    fetch_ms: float,
+    results: List[Dict[str, Any]]
+) -> None:
+    """
+    Record one raw datastore response for the current tool call.
+
+    Args:
+        datastore_id: Datastore searched
+        query: Query text sent to the datastore
+        page_size: Requested page size
+        fetch_ms: Time the search call took
+        results: JSON-safe results ({"id", "struct_data", "score"})
+    """
+    capture = _turn_capture.get()
+    if capture is None:
+        return
+    search = {
+        'datastore_id': datastore_id,
+        'query': query,
+        'page_size': page_size,
+        'fetch_ms': round(fetch_ms, 2),
+        'results': results,
+    }
+    call = _current_call.get()
+    if call is not None:
+        call['searches'].append(search)
+    else:
+        # Search outside a captured tool (e.g. a shared cached fetch)
+        capture.tool_calls.append({'tool': None, 'args': {}, 'searches': [search]})
+
+
+def _append_line(path: str, line: str) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with _write_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def _write_done(future: "asyncio.Future") -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning(f"Failed to write query capture: {future.exception()}")
+
+
+def finish_turn_capture(capture: Optional[TurnCapture], state: str) -> None:
+    """
+    Append a captured turn to the capture file.
+
+    The write runs in the default executor and is not awaited, so this is
+    safe to call from a cancelled turn's cleanup. Turns without search calls
+    are skipped; errors are logged, never raised.
+    """
+    if capture is not None and _turn_capture.get() is capture:
+        _turn_capture.set(None)
+    if capture is None or not capture.tool_calls:
+        return
+    try:
+        line = json.dumps(capture.to_dict(state), ensure_ascii=False, default=str)
+        future = asyncio.get_running_loop().run_in_executor(
+            None, _append_line, settings.query_capture_path, line
+        )
+        future.add_done_callback(_write_done)
+    except Exception as e:
+        logger.warning(f"Failed to write query capture for session {capture.session_id}: {e}")
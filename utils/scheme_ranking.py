@@ -8,11 +8,14 @@ schemes first based on user profile matching.
 Integrates with existing amount_filter.py and profile_analyzer.py
 """
 
+import logging
 import re
 from typing import Dict, List, Optional, Any, Tuple
-from utils.logger import setup_logger
+from utils.logger import get_sampled_logger, setup_logger
 
 logger = setup_logger(__name__)
+# Ranking results are logged for a sample of calls only
+ranking_logger = get_sampled_logger(__name__)
 
 
 def parse_user_profile(profile_text: str) -> Dict[str, Any]:
@@ -317,17 +320,20 @@ def rank_schemes_by_relevance(
         scheme_copy['_match_reasons'] = reasons
         scored_schemes.append(scheme_copy)
         
-        logger.debug(f"Scheme '{scheme.get('name')}': Score={score}, Reasons={reasons}")
+        logger.debug("Scheme '%s': Score=%s, Reasons=%s", scheme.get('name'), score, reasons)
     
     # Sort by score (highest first)
     scored_schemes.sort(key=lambda x: x.get('_relevance_score', 0), reverse=True)
     
-    # Log top results
-    logger.info("=== Relevance Ranking Results ===")
-    for i, scheme in enumerate(scored_schemes[:5]):
-        logger.info(f"  {i+1}. {scheme.get('name', 'Unknown')} "
-                   f"(Score: {scheme.get('_relevance_score', 0)}) "
-                   f"Reasons: {scheme.get('_match_reasons', [])}")
+    # Log top results (sampled)
+    if ranking_logger.isEnabledFor(logging.INFO):
+        ranking_logger.logger.info("=== Relevance Ranking Results ===")
+        for i, scheme in enumerate(scored_schemes[:5]):
+            ranking_logger.logger.info(
+                "  %d. %s (Score: %s) Reasons: %s",
+                i + 1, scheme.get('name', 'Unknown'),
+                scheme.get('_relevance_score', 0), scheme.get('_match_reasons', [])
+            )
     
     return scored_schemes
 
@@ -0,0 +1,154 @@
+"""
+Per-search stage timings.
+
+Search tools decorated with `traced_tool` collect a StageTrace while they
+run: datastore fetch and parse time, each filter stage's time with its
+candidate counts in and out, and ranking time. The trace is attached to the
+tool result under DEBUG_KEY. The agents' `strip_debug_payload`
+after_tool_callback removes it before the result reaches the model and
+hands it to the turn collector (`start_turn_traces`), so the API can
+persist it with the query record.
+"""
+
+import functools
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.tracing import span
+
+DEBUG_KEY = "_debug"
+
+_current_trace: ContextVar[Optional["StageTrace"]] = ContextVar("stage_trace", default=None)
+_turn_traces: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("turn_stage_traces", default=None)
+
+
+class StageRecord:
+    """Timing and candidate counts of one stage; set `out` inside the block."""
+
+    __slots__ = ("name", "count_in", "out", "ms")
+
+    def __init__(self, name: str, count_in: Optional[int]):
+        self.name = name
+        self.count_in = count_in
+        self.out: Optional[int] = None
+        self.ms = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        entry = {'stage': self.name, 'ms': round(self.ms, 2)}
+        if self.count_in is not None:
+            entry['in'] = self.count_in
+        if self.out is not None:
+            entry['out'] = self.out
+        return entry
+
+
+class StageTrace:
+    """Stages recorded during one tool call, in execution order."""
+
+    def __init__(self, tool: str):
+        self.tool = tool
+        self.stages: List[StageRecord] = []
+        self.meta: Dict[str, Any] = {}
+        self._started = time.perf_counter()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'tool': self.tool,
+            'total_ms': round((time.perf_counter() - self._started) * 1000, 2),
+            'stages': [s.to_dict() for s in self.stages],
+            **self.meta,
+        }
+
+
+class _Stage:
+    """Context manager timing a stage (and wrapping it in a tracing span)."""
+
+    __slots__ = ("_record", "_trace", "_span", "_started")
+
+    def __init__(self, trace: Optional[StageTrace], name: str, count_in: Optional[int]):
+        self._record = StageRecord(name, count_in)
+        self._trace = trace
+        self._span = span(name, candidates=count_in)
+
+    def __enter__(self) -> StageRecord:
+        self._span.__enter__()
+        self._started = time.perf_counter()
+        return self._record
+
+    def __exit__(self, exc_type, exc, tb):
+        self._record.ms = (time.perf_counter() - self._started) * 1000
+        if self._trace is not None:
+            self._trace.stages.append(self._record)
+        return self._span.__exit__(exc_type, exc, tb)
+
+
+def stage(name: str, count_in: Optional[int] = None) -> _Stage:
+    """
+    Time a stage of the current search (e.g. "filter.state").
+
+    Usage:
+        with stage("filter.state", len(schemes)) as st:
+            schemes = _apply_strict_state_filter(schemes, state)
+            st.out = len(schemes)
+
+    Outside a traced tool only the tracing span is recorded.
+    """
+    return _Stage(_current_trace.get(), name, count_in)
+
+
+def annotate(key: str, value: Any) -> None:
+    """Attach a value (e.g. fetch_count) to the current search's trace."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.meta[key] = value
+
+
+def traced_tool(tool_name: str) -> Callable:
+    """
+    Decorator for async search tools: collect a StageTrace while the tool
+    runs and attach it to a dict result under DEBUG_KEY.
+
+    functools.wraps keeps the signature and docstring ADK builds the tool
+    declaration from.
+    """
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            trace = StageTrace(tool_name)
+            token = _current_trace.set(trace)
+            try:
+                result = await fn(*args, **kwargs)
+            finally:
+                _current_trace.reset(token)
+            if isinstance(result, dict):
+                result[DEBUG_KEY] = {'stage_trace': trace.to_dict()}
+            return result
+        return wrapper
+    return decorator
+
+
+def start_turn_traces() -> List[Dict[str, Any]]:
+    """
+    Start collecting stage traces for the agent turn running in this context.
+
+    Returns:
+        The list that `strip_debug_payload` appends each search's trace to
+    """
+    traces: List[Dict[str, Any]] = []
+    _turn_traces.set(traces)
+    return traces
+
+
+def strip_debug_payload(tool, args, tool_context, tool_response):
+    """
+    ADK after_tool_callback: remove DEBUG_KEY from a tool result so the model
+    never sees it, and keep its stage trace for the current turn.
+    """
+    if isinstance(tool_response, dict) and DEBUG_KEY in tool_response:
+        debug = tool_response.pop(DEBUG_KEY)
+        traces = _turn_traces.get()
+        if traces is not None and debug.get('stage_trace'):
+            traces.append(debug['stage_trace'])
+        return tool_response
+    return None
@@ -0,0 +1,206 @@
+"""
+OpenTelemetry tracing, enabled by settings.enable_cloud_trace.
+
+When enabled, a global TracerProvider is installed, so ADK's own spans for
+agent runs, LLM calls and tool calls are exported alongside ours: one root
+span per API request (TracingMiddleware) plus spans around datastore
+searches, embedding calls, filter stages and Firestore commits.
+
+Exporters (settings.trace_exporter):
+    cloud    Cloud Trace (opentelemetry-exporter-gcp-trace)
+    otlp     OTLP/gRPC collector (opentelemetry-exporter-otlp; endpoint from
+             OTEL_EXPORTER_OTLP_ENDPOINT)
+    console  Spans printed to stdout
+    file     JSON lines appended to settings.trace_file_path
+
+When tracing is disabled or OpenTelemetry is not installed, `span()` returns
+a shared no-op context manager.
+
+Span context lives in contextvars, so it follows asyncio tasks and
+asyncio.to_thread automatically; work submitted to a ThreadPoolExecutor
+must go through `submit_with_context`.
+"""
+
+import contextlib
+import contextvars
+import json
+import os
+import threading
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Optional, Sequence
+
+from config.settings import settings
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+try:
+    from opentelemetry import context as otel_context
+    from opentelemetry import propagate, trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import (
+        BatchSpanProcessor,
+        ConsoleSpanExporter,
+        SpanExporter,
+        SpanExportResult,
+    )
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    OTEL_AVAILABLE = True
+except ImportError:
+    OTEL_AVAILABLE = False
+    SpanExporter = object
+
+_NOOP_SPAN = contextlib.nullcontext()
+_tracer = None
+
+
+if OTEL_AVAILABLE:
+    class FileSpanExporter(SpanExporter):
+        """Append finished spans to a local file, one JSON object per line."""
+
+        def __init__(self, path: str):
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._path = path
+            self._lock = threading.Lock()
+
+        def export(self, spans: Sequence[Any]) -> "SpanExportResult":
+            lines = [json.dumps(json.loads(s.to_json()), separators=(',', ':')) for s in spans]
+            with self._lock, open(self._path, 'a', encoding='utf-8') as f:
+                f.write("\n".join(lines) + "\n")
+            return SpanExportResult.SUCCESS
+
+        def shutdown(self) -> None:
+            pass
+
+
+def _build_exporter(kind: str):
+    if kind == "console":
+        return ConsoleSpanExporter()
+    if kind == "file":
+        return FileSpanExporter(settings.trace_file_path)
+    if kind == "otlp":
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    from opentelemetry.exporter.cloud_trace import CloudTraceSpanExporter
+    return CloudTraceSpanExporter(project_id=settings.google_cloud_project)
+
+
+def setup_tracing() -> bool:
+    """
+    Install the global tracer provider if tracing is enabled.
+
+    Returns:
+        True if spans are being recorded
+    """
+    global _tracer
+    if not settings.enable_cloud_trace:
+        return False
+    if not OTEL_AVAILABLE:
+        logger.warning("enable_cloud_trace is set but opentelemetry-sdk is not installed; tracing disabled")
+        return False
+    if _tracer is not None:
+        return True
+
+    try:
+        exporter = _build_exporter(settings.trace_exporter.lower())
+    except ImportError as e:
+        logger.warning(f"Trace exporter '{settings.trace_exporter}' unavailable ({e}); tracing disabled")
+        return False
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": "scheme-advisor"}),
+        sampler=ParentBased(TraceIdRatioBased(settings.trace_sample_ratio)),
+    )
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("scheme_advisor")
+    logger.info(f"Tracing enabled with {settings.trace_exporter} exporter")
+    return True
+
+
+def span(name: str, **attributes: Any):
+    """
+    Context manager for a child span of the current one.
+
+    Yields the span (or None when tracing is off). None-valued attributes
+    are skipped.
+    """
+    if _tracer is None:
+        return _NOOP_SPAN
+    return _tracer.start_as_current_span(
+        name, attributes={k: v for k, v in attributes.items() if v is not None}
+    )
+
+
+def current_span_context() -> Optional[Any]:
+    """SpanContext of the active span, for linking deferred work back to it."""
+    if _tracer is None:
+        return None
+    context = trace.get_current_span().get_span_context()
+    return context if context.is_valid else None
+
+
+def linked_span(name: str, span_contexts: Sequence[Any], **attributes: Any):
+    """Span for deferred work (e.g. a batched write) linked to the requests it serves."""
+    if _tracer is None:
+        return _NOOP_SPAN
+    links = [trace.Link(c) for c in span_contexts if c is not None]
+    return _tracer.start_as_current_span(
+        name, links=links, attributes={k: v for k, v in attributes.items() if v is not None}
+    )
+
+
+def submit_with_context(executor: Executor, fn: Callable, *args, **kwargs) -> Future:
+    """executor.submit that runs `fn` in a copy of the caller's context (keeps the active span)."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware opening the root span for each HTTP request or
+    WebSocket, continuing any incoming W3C traceparent. The span is renamed
+    to the matched route template once routing has happened.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if _tracer is None or scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        carrier = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", ())}
+        token = otel_context.attach(propagate.extract(carrier))
+        method = scope.get("method", "WS")
+        status = {}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            with _tracer.start_as_current_span(
+                f"{method} {scope['path']}",
+                kind=trace.SpanKind.SERVER,
+                attributes={
+                    "http.method": method,
+                    "http.target": scope["path"],
+                    "partner.code": carrier.get("x-partner-code", "unknown"),
+                },
+            ) as root:
+                try:
+                    await self.app(scope, receive, send_wrapper)
+                finally:
+                    route = scope.get("route")
+                    if route is not None and getattr(route, "path", None):
+                        root.update_name(f"{method} {route.path}")
+                        root.set_attribute("http.route", route.path)
+                    if "code" in status:
+                        root.set_attribute("http.status_code", status["code"])
+        finally:
+            otel_context.detach(token)